@@ -1,4 +1,58 @@
 from django.contrib import admin
-from .models import Country
+from django.utils.html import format_html
+
+from .models import APIToken, Country, Currency, Language, RegionStats, RequestProfile, SubregionStats
 
 admin.site.register(Country)
+admin.site.register(Language)
+admin.site.register(Currency)
+admin.site.register(RegionStats)
+admin.site.register(SubregionStats)
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms', 'query_count', 'trigger', 'user')
+    list_filter = ('trigger', 'route', 'status_code')
+    search_fields = ('path', '=request_id')
+    date_hierarchy = 'created_at'
+    fields = (
+        'created_at', 'request_id', 'method', 'path', 'route', 'status_code', 'user', 'trigger',
+        'duration_ms', 'query_count', 'query_ms', 'profile', 'sql',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Profile')
+    def profile(self, obj):
+        return format_html('<pre>{}</pre>', obj.stats)
+
+    @admin.display(description='SQL')
+    def sql(self, obj):
+        return format_html('<pre>{}</pre>', '\n\n'.join(
+            f"{query['ms']} ms{' (many)' if query['many'] else ''}\n{query['sql']}\n{query['params']}"
+            for query in obj.queries
+        ))
+
+
+@admin.register(APIToken)
+class APITokenAdmin(admin.ModelAdmin):
+    """Tokens are created with the api_token command, which is the only place their key is shown"""
+    list_display = ('prefix', 'user', 'name', 'created_at', 'expires_at', 'last_used_at', 'revoked_at')
+    list_filter = ('revoked_at',)
+    search_fields = ('prefix', 'name', 'user__username')
+    readonly_fields = ('user', 'prefix', 'key_hash', 'created_at', 'last_used_at', 'revoked_at')
+    actions = ['revoke']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Revoke selected tokens')
+    def revoke(self, request, queryset):
+        for token in queryset.filter(revoked_at__isnull=True):
+            token.revoke()
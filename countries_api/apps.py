@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CountriesApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'countries_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,98 @@
+"""
+API token authentication.
+
+Clients send `Authorization: Token <key>`. The SHA-256 digest of the key is
+looked up in the database once; the token and its user are then kept in a
+per-process cache for COUNTRIES_TOKEN_CACHE_TTL seconds, so most requests
+authenticate with one digest and a dictionary lookup. Revoking or deleting a
+token, or saving or deleting its user, evicts it from the cache of the process
+making the change; other processes drop it when its TTL runs out.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .models import APIToken
+
+# Tokens cached per process; the oldest is dropped beyond this
+MAX_CACHED_TOKENS = 10000
+
+
+class TokenCache:
+    """Tokens and their users by key digest, each kept for a fixed time"""
+
+    def __init__(self):
+        self._entries = {}  # key digest -> (token, user, monotonic time the entry expires)
+        self._lock = threading.Lock()
+
+    def get(self, key_hash):
+        entry = self._entries.get(key_hash)
+        if entry is None or entry[2] <= time.monotonic():
+            return None
+        return entry[0], entry[1]
+
+    def set(self, key_hash, token, user, ttl):
+        with self._lock:
+            self._entries.pop(key_hash, None)
+            if len(self._entries) >= MAX_CACHED_TOKENS:
+                del self._entries[next(iter(self._entries))]
+            self._entries[key_hash] = (token, user, time.monotonic() + ttl)
+
+    def evict(self, token_id=None, user_id=None):
+        """Drop the entries of a token or of every token of a user"""
+        with self._lock:
+            for key_hash, (token, _, _) in list(self._entries.items()):
+                if token.pk == token_id or token.user_id == user_id:
+                    del self._entries[key_hash]
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+token_cache = TokenCache()
+
+
+class APITokenAuthentication(BaseAuthentication):
+    """Authenticate `Authorization: Token <key>` requests against APIToken"""
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header. The header must be "Token <key>".')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise AuthenticationFailed('Invalid token header. The key contains invalid characters.')
+        return self.authenticate_key(key)
+
+    def authenticate_key(self, key):
+        key_hash = APIToken.hash_key(key)
+        cached = token_cache.get(key_hash)
+        if cached is None:
+            token = APIToken.objects.select_related('user').filter(key_hash=key_hash).first()
+            if token is None or not token.user.is_active:
+                raise AuthenticationFailed('Invalid token.')
+            if token.revoked_at is not None:
+                raise AuthenticationFailed('Token has been revoked.')
+            # last_used_at is refreshed once per cache period rather than on every request
+            token.last_used_at = timezone.now()
+            APIToken.objects.filter(pk=token.pk).update(last_used_at=token.last_used_at)
+            cached = token, token.user
+            token_cache.set(key_hash, token, token.user, getattr(settings, 'COUNTRIES_TOKEN_CACHE_TTL', 60))
+        token, user = cached
+        if token.expires_at is not None and token.expires_at <= timezone.now():
+            raise AuthenticationFailed('Token has expired.')
+        # Each request gets its own user instance, as a database lookup would give it
+        return copy.copy(user), token
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,119 @@
+"""
+Typeahead suggestions for country names.
+
+The index is a sorted array of accent- and case-folded terms, each pointing to
+a country: its name, official name, codes and alternate spellings, its native
+and translated names (the CountryName table), and every later word of its
+name and official name ("kingdom" finds "United Kingdom"). A prefix is answered
+by bisecting to the first term starting with it and walking the run of terms
+that do; the matching countries are ranked by population. Like the border
+graph, the index is held per process under the dataset version it was built
+from, and the answers to recent prefixes are memoized on it.
+"""
+import bisect
+import heapq
+import threading
+
+from .cache import get_dataset_version
+from .models import Country, CountryName
+from .search import normalize
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# Memoized suggestion lists kept per index
+MEMO_SIZE = 4096
+
+# Kinds of indexed terms, in the order preferred when several terms of a country match
+NAME, OFFICIAL_NAME, CODE, ALT_SPELLING, NATIVE_NAME, TRANSLATION = range(6)
+
+
+class AutocompleteIndex:
+    """Sorted (term, kind, country id, label) entries over the countries' names"""
+
+    def __init__(self, countries, entries):
+        """countries maps an id to its suggestion; entries are (kind, id, text) tuples"""
+        self.countries = countries
+        terms = {}
+        for kind, country_id, text in entries:
+            term = normalize(text)
+            if term:
+                key = (term, country_id)
+                if key not in terms or kind < terms[key][0]:
+                    terms[key] = (kind, text)
+        rows = sorted((term, kind, country_id, text) for (term, country_id), (kind, text) in terms.items())
+        self.terms = [row[0] for row in rows]
+        self.kinds = [row[1] for row in rows]
+        self.ids = [row[2] for row in rows]
+        self.labels = [row[3] for row in rows]
+        self._memo = {}
+
+    @classmethod
+    def build(cls):
+        """Build an index from the database"""
+        countries, entries = {}, []
+        for country_id, name, official_name, cca2, cca3, alt_spellings, flag, population in (
+            Country.objects.order_by().values_list(
+                'id', 'name', 'official_name', 'cca2', 'cca3', 'alt_spellings', 'flag', 'population'
+            )
+        ):
+            countries[country_id] = {
+                'id': country_id, 'name': name, 'cca2': cca2, 'cca3': cca3, 'flag': flag, 'population': population,
+            }
+            entries += [(NAME, country_id, name), (OFFICIAL_NAME, country_id, official_name)]
+            entries += [(CODE, country_id, code) for code in (cca2, cca3) if code]
+            entries += [(ALT_SPELLING, country_id, spelling) for spelling in alt_spellings or []]
+            for kind, text in ((NAME, name), (OFFICIAL_NAME, official_name)):
+                words = text.split()
+                entries += [(kind, country_id, ' '.join(words[start:])) for start in range(1, len(words))]
+        kinds = {CountryName.NATIVE: NATIVE_NAME, CountryName.TRANSLATION: TRANSLATION}
+        for country_id, kind, common, official in CountryName.objects.order_by().values_list(
+            'country_id', 'kind', 'common', 'official'
+        ):
+            if country_id in countries:
+                entries += [(kinds[kind], country_id, text) for text in (common, official) if text]
+        return cls(countries, entries)
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """Return up to limit suggestions for countries with a term starting with prefix, most populous first"""
+        term = normalize(prefix)
+        if not term:
+            return []
+        key = (term, limit)
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        # The preferred matching term of each country, by kind then term order
+        matches = {}
+        position = bisect.bisect_left(self.terms, term)
+        while position < len(self.terms) and self.terms[position].startswith(term):
+            country_id = self.ids[position]
+            if country_id not in matches or self.kinds[position] < self.kinds[matches[country_id]]:
+                matches[country_id] = position
+            position += 1
+        best = heapq.nsmallest(
+            limit, matches,
+            key=lambda country_id: (-self.countries[country_id]['population'], self.countries[country_id]['name']),
+        )
+        result = [dict(self.countries[country_id], match=self.labels[matches[country_id]]) for country_id in best]
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
+
+
+_current = None  # (dataset version, index), replaced as a whole
+_lock = threading.Lock()
+
+
+def get_autocomplete_index():
+    """Return the process-wide autocomplete index, rebuilding it when the dataset version changed"""
+    global _current
+    version = get_dataset_version()
+    current = _current
+    if current is not None and current[0] == version:
+        return current[1]
+    with _lock:
+        if _current is None or _current[0] != version:
+            _current = (version, AutocompleteIndex.build())
+        return _current[1]
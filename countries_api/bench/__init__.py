@@ -0,0 +1,20 @@
+"""
+Performance benchmarks for the countries app.
+
+Each benchmark module exposes ``run(rows, seed=0)`` returning a JSON-serializable
+dict. They are run by the ``bench`` management command against a throwaway
+test database.
+"""
+from . import auth, concurrency, endpoints, export, graph, ingest, search, serialize, storage
+
+BENCHMARKS = {
+    'ingest': ingest.run,
+    'serialize': serialize.run,
+    'endpoints': endpoints.run,
+    'search': search.run,
+    'export': export.run,
+    'storage': storage.run,
+    'graph': graph.run,
+    'concurrency': concurrency.run,
+    'auth': auth.run,
+}
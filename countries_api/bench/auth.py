@@ -0,0 +1,64 @@
+"""Benchmark of API request latency under each authentication method and session engine."""
+import base64
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from ..authentication import APITokenAuthentication, token_cache
+from ..models import APIToken
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+URL = '/api/countries/'
+PASSWORD = 'bench-password'
+REPEAT = 20
+# Basic authentication hashes the password on every request, so it gets fewer rounds
+BASIC_REPEAT = 5
+SESSION_ENGINES = ('db', 'cached_db', 'signed_cookies')
+
+
+def _measure(client, repeat=REPEAT, **headers):
+    # The first request fills the response cache, so the rest mostly time authentication
+    client.get(URL, **headers)
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(URL, **headers)
+            timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {URL} answered {response.status_code}")
+    return {'ms': statistics.median(timings) * 1000, 'queries': len(queries)}
+
+
+def run(rows, seed=0):
+    """Report the median latency and query count of a cached API response per authentication method"""
+    store_countries(generate_countries(rows, seed=seed))
+    user, _ = User.objects.get_or_create(username='bench')
+    user.set_password(PASSWORD)
+    user.save()
+    _, key = APIToken.create_token(user, name='bench')
+    token_cache.clear()
+    client = Client(HTTP_HOST='localhost')
+
+    credentials = base64.b64encode(f"bench:{PASSWORD}".encode()).decode()
+    results = {
+        'basic': _measure(client, BASIC_REPEAT, HTTP_AUTHORIZATION=f"Basic {credentials}"),
+        'token': _measure(client, HTTP_AUTHORIZATION=f"Token {key}"),
+    }
+    for engine in SESSION_ENGINES:
+        with override_settings(SESSION_ENGINE=f"django.contrib.sessions.backends.{engine}"):
+            session_client = Client(HTTP_HOST='localhost')
+            session_client.force_login(user)
+            results[f"session_{engine}"] = _measure(session_client)
+
+    authentication = APITokenAuthentication()
+    start = time.perf_counter()
+    for _ in range(1000):
+        authentication.authenticate_key(key)
+    results['token_authenticate_us'] = (time.perf_counter() - start) * 1000
+    return results
@@ -0,0 +1,51 @@
+"""
+Comparison of two bench result files.
+
+Every numeric leaf of the results is a metric named by its dotted path.
+Timings (`_ms`, `_us`, `seconds`), query counts and sizes are better when
+lower, throughputs and speedups when higher; other numbers, such as row
+counts, are reported by the benchmarks for context and not compared.
+"""
+LOWER_IS_BETTER = ('_ms', '_us', 'seconds', '_queries', '_bytes')
+HIGHER_IS_BETTER = ('per_second', 'speedup')
+
+
+def metrics(results, prefix=''):
+    """Yield (dotted path, value) for every numeric leaf of a result tree"""
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from metrics(value, f"{path}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def direction(path):
+    """Return -1 for metrics that should go down, 1 for those that should go up, 0 for the rest"""
+    name = path.rsplit('.', 1)[-1]
+    if name.endswith(LOWER_IS_BETTER):
+        return -1
+    if name.endswith(HIGHER_IS_BETTER):
+        return 1
+    return 0
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Return one row per metric present in both runs, with its relative change
+    and whether it got worse by more than threshold (a fraction).
+    """
+    baseline_metrics = dict(metrics(baseline.get('results', baseline)))
+    rows = []
+    for path, value in metrics(current.get('results', current)):
+        sign = direction(path)
+        if not sign or path not in baseline_metrics:
+            continue
+        before = baseline_metrics[path]
+        change = (value - before) / before if before else None
+        if change is None:
+            worse = value != before and (value > before) == (sign < 0)
+        else:
+            worse = change * sign < -threshold
+        rows.append({'metric': path, 'baseline': before, 'current': value, 'change': change, 'regression': worse})
+    return rows
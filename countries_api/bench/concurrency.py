@@ -0,0 +1,171 @@
+"""
+Benchmark of concurrent API throughput under WSGI and ASGI.
+
+The DRF list endpoint is served by a threaded WSGI server with a fixed number
+of workers, as a gunicorn sync deployment would be, and by uvicorn on a single
+event loop, which runs the view in a worker thread. Both are loaded by many
+concurrent clients in two scenarios: fast clients only, and fast clients mixed
+with slow ones that trickle their request headers in. A slow client holds a
+WSGI worker for its whole upload, so the fast clients queue behind it; the
+event loop keeps reading the other connections.
+"""
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.test import Client
+
+from ..models import Country
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+# Worker threads of the WSGI server
+WSGI_WORKERS = 4
+# Concurrent clients, and requests sent by each
+CLIENTS = 64
+REQUESTS_PER_CLIENT = 8
+# Slow clients added in the mixed scenario; each sends its request in this many chunks, this many seconds apart
+SLOW_CLIENTS = 16
+SLOW_CHUNKS = 5
+SLOW_DELAY = 0.05
+
+ENDPOINT = '/api/countries/'
+
+
+class _PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server handling connections on a bounded pool of worker threads"""
+    request_queue_size = CLIENTS
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _start_wsgi():
+    server = make_server('127.0.0.1', 0, get_wsgi_application(), server_class=_PooledWSGIServer,
+                         handler_class=_QuietHandler)
+    server.pool = ThreadPoolExecutor(max_workers=WSGI_WORKERS)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def stop():
+        server.shutdown()
+        server.pool.shutdown()
+        server.server_close()
+
+    return server.server_address[1], stop
+
+
+def _start_asgi():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(get_asgi_application(), log_level='warning', lifespan='off'))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+        thread.join()
+        sock.close()
+
+    return sock.getsockname()[1], stop
+
+
+async def _request(port, request, slow):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        if slow:
+            size = -(-len(request) // SLOW_CHUNKS)
+            for offset in range(0, len(request), size):
+                writer.write(request[offset:offset + size])
+                await writer.drain()
+                await asyncio.sleep(SLOW_DELAY)
+        else:
+            writer.write(request)
+        response = await reader.read()
+    finally:
+        writer.close()
+    if not response.startswith(b'HTTP/1.1 200') and not response.startswith(b'HTTP/1.0 200'):
+        raise RuntimeError(response.split(b'\r\n', 1)[0].decode())
+
+
+def _get(path, cookie, page):
+    return (
+        f"GET {path}?page={page} HTTP/1.1\r\nHost: localhost\r\n"
+        f"Cookie: {settings.SESSION_COOKIE_NAME}={cookie}\r\nConnection: close\r\n\r\n"
+    ).encode('ascii')
+
+
+async def _load(port, path, cookie, pages, slow_clients=0):
+    """Return the throughput and latency percentiles of the fast clients"""
+    latencies = []
+    done = asyncio.Event()
+
+    async def slow_client(index):
+        while not done.is_set():
+            await _request(port, _get(path, cookie, index % pages + 1), slow=True)
+
+    async def client(index):
+        for number in range(REQUESTS_PER_CLIENT):
+            page = (index * REQUESTS_PER_CLIENT + number) % pages + 1
+            start = time.perf_counter()
+            await _request(port, _get(path, cookie, page), slow=False)
+            latencies.append(time.perf_counter() - start)
+
+    slow = [asyncio.create_task(slow_client(index)) for index in range(slow_clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(CLIENTS)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await asyncio.gather(*slow)
+    latencies.sort()
+    return {
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+    }
+
+
+def run(rows, seed=0):
+    """Report throughput and latency percentiles of the list endpoint under WSGI and ASGI"""
+    if uvicorn is None:
+        return {'skipped': 'uvicorn is not installed'}
+    store_countries(generate_countries(rows, seed=seed))
+    pages = max(1, -(-Country.objects.count() // settings.REST_FRAMEWORK['PAGE_SIZE']))
+    client = Client()
+    client.force_login(User.objects.get_or_create(username='bench')[0])
+    cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    results = {
+        'wsgi_workers': WSGI_WORKERS, 'clients': CLIENTS, 'slow_clients': SLOW_CLIENTS,
+        'requests': CLIENTS * REQUESTS_PER_CLIENT,
+    }
+    for name, start_server in (('wsgi', _start_wsgi), ('asgi', _start_asgi)):
+        port, stop = start_server()
+        try:
+            for scenario, slow_clients in (('fast_clients', 0), ('with_slow_clients', SLOW_CLIENTS)):
+                results.setdefault(scenario, {})[name] = asyncio.run(
+                    _load(port, ENDPOINT, cookie, pages, slow_clients)
+                )
+        finally:
+            stop()
+    return results
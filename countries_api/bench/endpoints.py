@@ -0,0 +1,75 @@
+"""Microbenchmarks of every read endpoint of the API and the HTML pages."""
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..models import Country
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+REPEAT = 10
+
+
+def _endpoints(rows):
+    first = Country.objects.order_by('id').first()
+    last = Country.objects.order_by('-id').first()
+    return {
+        'list': '/api/countries/',
+        'list_last_page': f"/api/countries/?page={-(-rows // 10)}",
+        'list_cursor': '/api/countries/?pagination=cursor',
+        'list_search': '/api/countries/?search=republic',
+        'retrieve': f"/api/countries/{first.id}/",
+        'same_region': f"/api/countries/{first.id}/same_region/",
+        'by_language': '/api/countries/by_language/?language=english&format=json',
+        'by_currency': '/api/countries/by_currency/?currency=euro&format=json',
+        'search': f"/api/countries/search/?q={first.name[:4]}",
+        'autocomplete': f"/api/countries/autocomplete/?q={first.name[:2]}",
+        'neighbours': f"/api/countries/{first.id}/neighbours/?depth=2",
+        'path': f"/api/countries/path/?from={first.cca3}&to={last.cca3}",
+        'components': '/api/countries/components/?min_size=2',
+        'regions': '/api/regions/',
+        'subregions': '/api/subregions/',
+        'html_list': '/countries/',
+        'html_detail': f"/countries/{first.id}/",
+    }
+
+
+def _measure(client, url, cold):
+    timings = []
+    for index in range(REPEAT):
+        # An unused parameter gives every cold request its own response cache key
+        request_url = f"{url}{'&' if '?' in url else '?'}_bench={index}" if cold else url
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(request_url)
+            timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} answered {response.status_code}")
+    return statistics.median(timings) * 1000, len(queries)
+
+
+def run(rows, seed=0):
+    """Report the median latency and query count of each endpoint, with a cold and a warm response cache"""
+    store_countries(generate_countries(rows, seed=seed))
+    client = APIClient(HTTP_HOST='localhost')
+    user, _ = User.objects.get_or_create(username='bench')
+    client.force_authenticate(user=user)
+    client.force_login(user)
+
+    # Build the search index and the border graph before timing anything
+    client.get('/api/countries/search/?q=a')
+    client.get('/api/countries/components/')
+
+    results = {}
+    for name, url in _endpoints(rows).items():
+        cold_ms, cold_queries = _measure(client, url, cold=True)
+        warm_ms, warm_queries = _measure(client, url, cold=False)
+        results[name] = {
+            'cold_ms': cold_ms, 'cold_queries': cold_queries,
+            'warm_ms': warm_ms, 'warm_queries': warm_queries,
+        }
+    return results
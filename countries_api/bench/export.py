@@ -0,0 +1,51 @@
+"""Benchmark of the streaming export against walking the paginated list."""
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from ..models import Country
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+# List pages walked for the comparison; the full walk is extrapolated from them
+LIST_PAGES = 50
+
+
+def _consume(client, url):
+    return sum(len(chunk) for chunk in client.get(url).streaming_content)
+
+
+def _stream(client, url):
+    """Consume a streamed response twice: timed, then traced, returning (seconds, bytes, peak memory)"""
+    start = time.perf_counter()
+    size = _consume(client, url)
+    seconds = time.perf_counter() - start
+    # Tracing slows allocation down, so memory is measured on a separate pass
+    tracemalloc.start()
+    _consume(client, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, size, peak
+
+
+def run(rows, seed=0):
+    """Time full NDJSON and CSV exports, with their peak memory, and the paginated list walk"""
+    store_countries(generate_countries(rows, seed=seed))
+    count = Country.objects.count()
+    client = APIClient(HTTP_HOST='localhost')
+    client.force_authenticate(user=User.objects.get_or_create(username='bench')[0])
+
+    results = {'rows': count}
+    for name, url in (('ndjson', '/api/countries/export/'), ('csv', '/api/countries/export/?format=csv')):
+        seconds, size, peak = _stream(client, url)
+        results[name] = {'seconds': seconds, 'response_bytes': size, 'peak_memory_bytes': peak}
+
+    pages = min(LIST_PAGES, -(-count // 10))
+    start = time.perf_counter()
+    for page in range(1, pages + 1):
+        client.get(f"/api/countries/?page={page}&_bench={page}")
+    per_page = (time.perf_counter() - start) / pages
+    results['paginated_list'] = {'requests': -(-count // 10), 'estimated_seconds': per_page * -(-count // 10)}
+    return results
@@ -0,0 +1,44 @@
+"""Benchmark of the in-memory border graph."""
+import random
+import statistics
+import time
+
+from ..graph import BorderGraph
+from ..models import Country
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+QUERIES = 200
+
+
+def _median_us(func, args):
+    timings = []
+    for arg in args:
+        start = time.perf_counter()
+        func(*arg)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def run(rows, seed=0):
+    """Time a graph build and cold and memoized neighbourhood and path queries"""
+    store_countries(generate_countries(rows, seed=seed))
+
+    start = time.perf_counter()
+    graph = BorderGraph.build(Country.objects.order_by().values_list('id', 'name', 'cca3', 'borders'))
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    ids = list(graph.nodes)
+    singles = [(rng.choice(ids),) for _ in range(QUERIES)]
+    pairs = [(rng.choice(ids), rng.choice(ids)) for _ in range(QUERIES)]
+    return {
+        'nodes': len(graph.nodes),
+        'edges': sum(len(neighbours) for neighbours in graph.adjacency.values()) // 2,
+        'components': len(graph.components),
+        'build_seconds': build_seconds,
+        'neighbours_depth_1_us': _median_us(lambda node: graph.neighbours(node, 1), singles),
+        'neighbours_depth_3_us': _median_us(lambda node: graph.neighbours(node, 3), singles),
+        'path_us': _median_us(graph.path, pairs),
+        'path_memoized_us': _median_us(graph.path, pairs),
+    }
@@ -0,0 +1,47 @@
+"""Benchmark of the batched sync pipeline on a synthetic payload."""
+import time
+
+from django.core.management.color import no_style
+from django.db import connection
+
+from ..models import Country, CountryName, CountryRawData, Currency, Language, RegionStats, SubregionStats
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+# Models a sync writes, emptied before the cold run
+SYNCED_MODELS = [
+    Country, Country.spoken_languages.through, Country.used_currencies.through, Country.neighbours.through,
+    CountryName, CountryRawData, Language, Currency, RegionStats, SubregionStats,
+]
+
+
+def _flush():
+    """Empty the synced tables, which earlier benchmarks on the same database may have filled"""
+    tables = [model._meta.db_table for model in SYNCED_MODELS]
+    connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables, reset_sequences=True))
+    filled = [model.__name__ for model in SYNCED_MODELS if model.objects.exists()]
+    if filled:
+        raise RuntimeError(f"Cold sync needs empty tables, but {', '.join(filled)} still have rows")
+
+
+def run(rows, seed=0):
+    """Time a cold sync, an unchanged re-sync and a re-sync with 1% of rows changed"""
+    records = list(generate_countries(rows, seed=seed))
+    results = {}
+
+    _flush()
+    start = time.perf_counter()
+    results['cold'] = store_countries(records)
+    results['cold']['seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results['unchanged'] = store_countries(records)
+    results['unchanged']['seconds'] = time.perf_counter() - start
+
+    for record in records[::100]:
+        record['population'] += 1
+    start = time.perf_counter()
+    results['partial'] = store_countries(records)
+    results['partial']['seconds'] = time.perf_counter() - start
+
+    return results
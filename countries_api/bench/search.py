@@ -0,0 +1,90 @@
+"""Benchmark of the in-process search index and ranked querysets."""
+import random
+import statistics
+import time
+
+from ..models import Country
+from ..search import (
+    SearchIndex,
+    _index_rows,
+    edit_distance,
+    get_index,
+    max_edits,
+    normalize,
+    rank_queryset,
+    ranked_ids_all_terms,
+)
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+QUERIES = 100
+# A linear scan takes seconds per query at scale, so it is only timed on a few
+SCAN_QUERIES = 5
+
+
+def _median_us(func, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def _typo(name, rng):
+    """Swap two adjacent letters of a name, like a fast typist would"""
+    position = rng.randrange(1, len(name) - 2)
+    return name[:position] + name[position + 1] + name[position] + name[position + 2:]
+
+
+def _fuzzy_scan(index, query):
+    """Verify the query against every fuzzy term, as a baseline for the candidate index"""
+    term = normalize(query)
+    limit = max_edits(term)
+    return [candidate for candidate in index.fuzzy_term_ids if edit_distance(term, candidate, limit) <= limit]
+
+
+def run(rows, seed=0):
+    """Time an index build and the median latency of each kind of query"""
+    store_countries(generate_countries(rows, seed=seed))
+    index_rows = list(_index_rows())
+
+    start = time.perf_counter()
+    index = SearchIndex.build(index_rows)
+    build_seconds = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    sample = rng.sample(list(index.documents), min(QUERIES, len(index.documents)))
+    names = [index.documents[country_id]['sort_name'] for country_id in sample]
+    queries = {
+        'exact': names,
+        'prefix': [name[:4] for name in names],
+        'short_prefix': [name[:2] for name in names],
+        'substring': [name[2:6] for name in names],
+        'no_match': [f"{name}zzq" for name in names],
+        # Synthetic translations are "<name>-<language>"
+        'translated': [f"{name} fra" for name in names],
+    }
+    results = {'documents': len(index.documents), 'build_seconds': build_seconds}
+    for kind, terms in queries.items():
+        results[f"{kind}_us"] = _median_us(index.search, terms)
+        results[f"{kind}_matches"] = statistics.median(len(index.search(term)) for term in terms)
+
+    typos = [_typo(name, rng) for name in names]
+    results['fuzzy_terms'] = len(index.fuzzy_term_ids)
+    results['fuzzy_us'] = _median_us(index.fuzzy_search, typos)
+    results['fuzzy_matches'] = statistics.median(len(index.fuzzy_search(typo)) for typo in typos)
+    results['fuzzy_recall'] = statistics.mean(
+        country_id in index.fuzzy_search(typo) for country_id, typo in zip(sample, typos)
+    )
+    results['fuzzy_scan_us'] = _median_us(lambda typo: _fuzzy_scan(index, typo), typos[:SCAN_QUERIES])
+
+    # The process-wide index serves the API; build it before timing the paths that use it
+    get_index()
+    results['ranked_page_us'] = _median_us(
+        lambda term: list(rank_queryset(Country.objects.all(), index.search(term))[:10]), queries['prefix']
+    )
+    results['all_terms_us'] = _median_us(
+        ranked_ids_all_terms, [['republic', name[:3]] for name in names]
+    )
+    return results
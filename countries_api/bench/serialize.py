@@ -0,0 +1,33 @@
+"""Benchmark of CountryListSerializer against the values() fast path."""
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from ..models import Country
+from ..serializers import CountryListSerializer, country_list_values
+from ..utils import store_countries
+from .synthetic import generate_countries
+
+
+def _timed(build):
+    start = time.perf_counter()
+    data = build()
+    return data, time.perf_counter() - start
+
+
+def run(rows, seed=0):
+    """Serialize every stored country both ways and compare cost and rendered output"""
+    store_countries(generate_countries(rows, seed=seed))
+    queryset = Country.objects.all()
+    count = queryset.count()
+
+    slow, slow_seconds = _timed(lambda: CountryListSerializer(queryset.all(), many=True).data)
+    fast, fast_seconds = _timed(lambda: list(country_list_values(queryset)))
+
+    return {
+        'rows': count,
+        'serializer': {'seconds': slow_seconds, 'per_row_us': slow_seconds / count * 1e6},
+        'fast_path': {'seconds': fast_seconds, 'per_row_us': fast_seconds / count * 1e6},
+        'speedup': slow_seconds / fast_seconds,
+        'identical': JSONRenderer().render(slow) == JSONRenderer().render(fast),
+    }
@@ -0,0 +1,70 @@
+"""Benchmark of the country table footprint and country_list_view latency."""
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory
+
+from ..models import Country
+from ..utils import store_countries
+from ..views import country_list_view
+from .synthetic import generate_countries
+
+COUNTRY_TABLES = ('countries_api_country', 'countries_api_countryrawdata')
+REPEAT = 20
+
+
+def table_sizes():
+    """Return the on-disk size in bytes of each country table that exists"""
+    tables = [table for table in COUNTRY_TABLES if table in connection.introspection.table_names()]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            sizes = {}
+            for table in tables:
+                cursor.execute('SELECT pg_relation_size(%s), pg_total_relation_size(%s)', [table, table])
+                table_bytes, total_bytes = cursor.fetchone()
+                sizes[table] = {'table_bytes': table_bytes, 'total_bytes': total_bytes}
+            return sizes
+        if connection.vendor == 'sqlite':
+            sizes = {}
+            for table in tables:
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+                sizes[table] = {'table_bytes': cursor.fetchone()[0]}
+            return sizes
+    return {}
+
+
+def _median_ms(func, repeat=REPEAT):
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run(rows, seed=0):
+    """Report table sizes and the median latency of list pages, end to end and in SQL only"""
+    store_countries(generate_countries(rows, seed=seed))
+    count = Country.objects.count()
+    factory = RequestFactory()
+    user = type('BenchUser', (AnonymousUser,), {'is_authenticated': True})()
+
+    def view(params):
+        request = factory.get('/countries/', params)
+        request.user = user
+        return lambda: country_list_view(request)
+
+    def page_query(offset):
+        return lambda: (Country.objects.count(), list(Country.objects.all()[offset:offset + 10]))
+
+    pages = {'first': 0, 'middle': count // 20 * 10, 'last': (count - 1) // 10 * 10}
+    latency = {}
+    for label, offset in pages.items():
+        latency[f"{label}_page_ms"] = _median_ms(view({'page': offset // 10 + 1}))
+        latency[f"{label}_page_sql_ms"] = _median_ms(page_query(offset))
+    latency['first_cursor_page_ms'] = _median_ms(view({'pagination': 'cursor'}))
+
+    return {'rows': count, 'tables': table_sizes(), 'country_list_view': latency}
@@ -0,0 +1,99 @@
+"""
+Deterministic generator of REST Countries-shaped records for scale testing.
+
+The real dataset has ~250 countries. Records produced here follow the same
+structure as https://restcountries.com/v3.1/all so they can be fed straight
+into the sync pipeline, with codes drawn from a wide alphabet so that the
+unique cca2/cca3 columns still hold hundreds of thousands of rows.
+"""
+import random
+
+SYLLABLES = [
+    'ba', 'lo', 'mi', 'ra', 'to', 'ne', 'sa', 'qu', 'di', 'va', 'ko', 'ri',
+    'an', 'el', 'or', 'un', 'is', 'ta', 'ga', 'po', 'ze', 'lu', 'mo', 'fi',
+]
+SUFFIXES = ['ia', 'land', 'stan', 'ora', 'ovia', 'esh', 'ica', 'mark', 'ana', 'ey']
+REGIONS = {
+    'Africa': ['Northern Africa', 'Eastern Africa', 'Middle Africa', 'Southern Africa', 'Western Africa'],
+    'Americas': ['North America', 'Central America', 'Caribbean', 'South America'],
+    'Asia': ['Central Asia', 'Eastern Asia', 'South-Eastern Asia', 'Southern Asia', 'Western Asia'],
+    'Europe': ['Northern Europe', 'Western Europe', 'Eastern Europe', 'Southern Europe', 'Central Europe'],
+    'Oceania': ['Australia and New Zealand', 'Melanesia', 'Micronesia', 'Polynesia'],
+    'Antarctic': [],
+}
+LANGUAGES = {
+    'eng': 'English', 'fra': 'French', 'spa': 'Spanish', 'por': 'Portuguese',
+    'ara': 'Arabic', 'deu': 'German', 'rus': 'Russian', 'zho': 'Chinese',
+    'hin': 'Hindi', 'swa': 'Swahili', 'ben': 'Bengali', 'ita': 'Italian',
+}
+CURRENCIES = {
+    'USD': ('United States dollar', '$'), 'EUR': ('Euro', '€'),
+    'GBP': ('British pound', '£'), 'XOF': ('West African CFA franc', 'Fr'),
+    'INR': ('Indian rupee', '₹'), 'JPY': ('Japanese yen', '¥'),
+    'BRL': ('Brazilian real', 'R$'), 'ZAR': ('South African rand', 'R'),
+}
+TRANSLATION_LANGUAGES = ['deu', 'fra', 'spa', 'ita', 'por', 'rus']
+
+# CJK unified ideographs give a 20k-symbol alphabet for synthetic codes
+CODE_ALPHABET_START = 0x4E00
+CODE_ALPHABET_SIZE = 0x9FFF - 0x4E00
+
+
+def synthetic_code(index, length):
+    """Return a unique code of the given length for a row index"""
+    chars = []
+    for _ in range(length):
+        index, remainder = divmod(index, CODE_ALPHABET_SIZE)
+        chars.append(chr(CODE_ALPHABET_START + remainder))
+    return ''.join(reversed(chars))
+
+
+def synthetic_name(rng):
+    """Return a pronounceable country-like name"""
+    parts = [rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))]
+    return (''.join(parts) + rng.choice(SUFFIXES)).capitalize()
+
+
+def generate_countries(count, seed=0):
+    """Yield `count` deterministic country records"""
+    rng = random.Random(seed)
+    codes = [synthetic_code(index, 3) for index in range(count)]
+    for index in range(count):
+        name = synthetic_name(rng)
+        region = rng.choice(list(REGIONS))
+        subregions = REGIONS[region]
+        language_codes = rng.sample(list(LANGUAGES), rng.randint(1, 3))
+        currency_codes = rng.sample(list(CURRENCIES), rng.randint(0, 2))
+        borders = sorted({codes[rng.randrange(count)] for _ in range(rng.randint(0, 6))} - {codes[index]})
+        yield {
+            'name': {
+                'common': name,
+                'official': f"Republic of {name}",
+                'nativeName': {
+                    code: {'official': f"Republic of {name}", 'common': name}
+                    for code in language_codes
+                },
+            },
+            'cca2': synthetic_code(index, 2),
+            'cca3': codes[index],
+            'altSpellings': [name[:2].upper(), f"Republic of {name}"],
+            'region': region,
+            'subregion': rng.choice(subregions) if subregions else '',
+            'languages': {code: LANGUAGES[code] for code in language_codes},
+            'currencies': {
+                code: {'name': CURRENCIES[code][0], 'symbol': CURRENCIES[code][1]}
+                for code in currency_codes
+            },
+            'translations': {
+                code: {'official': f"{name} ({code})", 'common': f"{name}-{code}"}
+                for code in TRANSLATION_LANGUAGES
+            },
+            'population': rng.randint(1000, 1_500_000_000),
+            'capital': [f"{name} City"],
+            'timezones': [f"UTC{rng.choice(['+', '-'])}{rng.randint(0, 12):02d}:00"],
+            'borders': borders,
+            'flags': {
+                'png': f"https://flags.example.com/w320/{index}.png",
+                'svg': f"https://flags.example.com/{index}.svg",
+            },
+        }
@@ -0,0 +1,202 @@
+"""
+Versioned response cache for the country API.
+
+Cached responses are keyed by endpoint, query parameters and a global dataset
+version. Any write (API create/update/destroy, a saved or deleted Country, or
+a sync) bumps the version, which makes every previously cached response
+unreachable at once; stale entries then age out through the backend's TTL and
+LRU eviction.
+
+The version is a DatasetVersion row, so every worker and the sync command see
+the same one; DatasetStateMiddleware has a request read it once, under WSGI
+or ASGI. Responses are stored in the Django cache
+named by COUNTRIES_CACHE_ALIAS, so the backend is pluggable through
+settings.CACHES: local memory (per process), file-based or Redis (shared
+between processes).
+"""
+import hashlib
+import threading
+import time
+from contextvars import ContextVar
+from urllib.parse import urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from rest_framework.response import Response
+
+from . import metrics
+from .models import DatasetVersion
+
+# {'state': (version, modified)} while a request is being handled, otherwise None
+_request_state = ContextVar('countries_dataset_state', default=None)
+
+
+class DatasetStateMiddleware:
+    """Read the dataset state at most once per request, in either handler mode"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _request_state.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+    async def __acall__(self, request):
+        # Worker threads run in a copy of this context, so they fill the same memo
+        token = _request_state.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_state.reset(token)
+
+
+def get_cache():
+    return caches[getattr(settings, 'COUNTRIES_CACHE_ALIAS', 'default')]
+
+
+def _new_version():
+    # Time based, so a version rolled back with its transaction is never reused
+    return int(time.time() * 1000)
+
+
+def get_dataset_state():
+    """Return (version, Unix time of the last change) of the dataset"""
+    memo = _request_state.get()
+    if memo is not None and 'state' in memo:
+        return memo['state']
+    row = DatasetVersion.objects.filter(pk=1).values_list('version', 'modified').first()
+    if row is None:
+        row = DatasetVersion.objects.get_or_create(pk=1, defaults={'version': _new_version()})[0]
+        row = (row.version, row.modified)
+    state = (row[0], int(row[1].timestamp()))
+    if memo is not None:
+        memo['state'] = state
+    return state
+
+
+def get_dataset_version():
+    """Return the current dataset version"""
+    return get_dataset_state()[0]
+
+
+def get_dataset_last_modified():
+    """Return the Unix time of the last dataset change"""
+    return get_dataset_state()[1]
+
+
+def bump_dataset_version():
+    """Invalidate every cached response by moving to a new dataset version"""
+    memo = _request_state.get()
+    if memo is not None:
+        memo.pop('state', None)
+    bump = {'version': Greatest(F('version') + 1, Value(_new_version())), 'modified': timezone.now()}
+    if not DatasetVersion.objects.filter(pk=1).update(**bump):
+        if not DatasetVersion.objects.get_or_create(pk=1, defaults={'version': _new_version()})[1]:
+            DatasetVersion.objects.filter(pk=1).update(**bump)
+    return DatasetVersion.objects.values_list('version', flat=True).get(pk=1)
+
+
+def bump_dataset_version_on_commit():
+    """
+    Bump the version in the current transaction, so that other processes see it
+    together with the changed rows, and again once it commits, after the
+    on-commit refreshes of derived tables such as the region stats.
+    """
+    bump_dataset_version()
+    transaction.on_commit(bump_dataset_version)
+
+
+class CacheStats:
+    """Thread-safe hit/miss counters"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def response_cache_key(endpoint, request):
+    """Build the cache key of a request to endpoint under the current dataset version"""
+    params = urlencode(sorted(request.GET.lists()), doseq=True)
+    digest = hashlib.sha256(f"{request.path}?{params}".encode('utf-8')).hexdigest()
+    return f"countries:response:{get_dataset_version()}:{endpoint}:{digest}"
+
+
+def cached_response(endpoint, request, build):
+    """Return the cached response data for request, or build, cache and return it"""
+    cache = get_cache()
+    key = response_cache_key(endpoint, request)
+    cached = cache.get(key)
+    if cached is not None:
+        stats.record(hit=True)
+        metrics.record_cache(hit=True)
+        return Response(cached)
+    stats.record(hit=False)
+    metrics.record_cache(hit=False)
+    response = build()
+    if response.status_code == 200:
+        cache.set(key, response.data, timeout=getattr(settings, 'COUNTRIES_CACHE_TIMEOUT', 300))
+    return response
+
+
+class CachedResponseMixin:
+    """Serve list and retrieve from the versioned cache and invalidate it on writes"""
+
+    def list(self, request, *args, **kwargs):
+        return cached_response('list', request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            'retrieve', request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        bump_dataset_version_on_commit()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        bump_dataset_version_on_commit()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        bump_dataset_version_on_commit()
@@ -0,0 +1,262 @@
+"""
+Read-only in-process snapshot of every country.
+
+The catalog holds one compact record per country, indexed by id, cca2, cca3,
+region, subregion, language and currency, so the detail and same-region
+pages, the country list and the language and currency filters are answered
+without SQL. It is built in four queries and held per process under the
+dataset version it was built from. A write or a sync bumps the version (and a
+saved or deleted country drops this process's catalog at once); the next
+reader builds a new catalog and swaps it in, while requests already holding
+the old one keep a consistent view of it.
+
+Records are shared between requests and must not be modified. Countries are
+kept in the (name, id) order the database returns them in, so lists and
+cursors agree with the database path whatever its collation. Set
+COUNTRIES_CATALOG = False to read from the database instead, e.g. for datasets
+too large to hold in every worker.
+"""
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.fields import DateTimeField
+
+from .cache import get_dataset_version
+from .models import Country
+
+# Country columns held in each record
+RECORD_FIELDS = (
+    'id', 'name', 'official_name', 'cca2', 'cca3', 'flag', 'region', 'subregion', 'population',
+    'languages', 'timezones', 'capitals', 'currencies', 'borders', 'alt_spellings', 'created_at', 'updated_at',
+)
+
+_datetime = DateTimeField()
+
+
+class CountryRecord:
+    """A country as stored, with the accessors that templates call on Country"""
+    __slots__ = RECORD_FIELDS + ('spoken_languages', 'used_currencies', 'neighbours')
+
+    def __init__(self, values, spoken_languages=(), used_currencies=(), neighbours=()):
+        for name, value in zip(RECORD_FIELDS, values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, 'spoken_languages', spoken_languages)  # ({'code', 'name'}, ...) by name
+        object.__setattr__(self, 'used_currencies', used_currencies)  # ({'code', 'name', 'symbol'}, ...) by code
+        object.__setattr__(self, 'neighbours', neighbours)  # ({'id', 'name', 'cca3'}, ...) by name
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Catalog records are read-only')
+
+    def __repr__(self):
+        return f"<CountryRecord {self.id}: {self.name}>"
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_capital(self):
+        return self.capitals[0] if self.capitals else 'N/A'
+
+    def get_primary_timezone(self):
+        return self.timezones[0] if self.timezones else 'N/A'
+
+    def list_data(self):
+        """Return the CountryListSerializer representation"""
+        return {
+            'id': self.id, 'name': self.name, 'cca2': self.cca2, 'flag': self.flag, 'region': self.region,
+            'population': self.population, 'capital': self.get_capital(),
+        }
+
+    def detail_data(self):
+        """Return the CountrySerializer representation"""
+        return {
+            'id': self.id, 'name': self.name, 'official_name': self.official_name, 'cca2': self.cca2,
+            'cca3': self.cca3, 'flag': self.flag, 'region': self.region, 'subregion': self.subregion,
+            'population': self.population, 'capital': self.get_capital(),
+            'primary_timezone': self.get_primary_timezone(), 'languages': self.languages,
+            'currencies': self.currencies, 'borders': self.borders, 'timezones': self.timezones,
+            'capitals': self.capitals, 'spoken_languages': list(self.spoken_languages),
+            'used_currencies': list(self.used_currencies), 'neighbours': list(self.neighbours),
+            'created_at': _datetime.to_representation(self.created_at),
+            'updated_at': _datetime.to_representation(self.updated_at),
+        }
+
+
+class CountryCatalog:
+    """Immutable snapshot of all countries in the database's (name, id) order, with lookup indexes"""
+    mapped = False  # True for a catalog read from a snapshot file
+
+    def __init__(self, records, language_keys=None, currency_keys=None):
+        """
+        records come in the database's (name, id) order; language_keys and currency_keys map a
+        country id to the lookup keys of its languages and currencies
+        """
+        language_keys = language_keys or {}
+        currency_keys = currency_keys or {}
+        self.records = tuple(records)
+        self.keys = [(record.name, record.id) for record in self.records]
+        self.positions = {record.id: position for position, record in enumerate(self.records)}
+        self.by_id = {record.id: record for record in self.records}
+        self.by_cca2 = {record.cca2.upper(): record for record in self.records}
+        self.by_cca3 = {record.cca3.upper(): record for record in self.records}
+        self.by_region = _group(self.records, lambda record: [record.region])
+        self.by_subregion = _group(self.records, lambda record: [record.subregion] if record.subregion else [])
+        self.by_language = _group(self.records, lambda record: language_keys.get(record.id, ()))
+        self.by_currency = _group(self.records, lambda record: currency_keys.get(record.id, ()))
+
+    @classmethod
+    def build(cls):
+        """Build a catalog from the database"""
+        languages, language_keys = {}, {}
+        for country_id, code, name, name_key in Country.spoken_languages.through.objects.order_by(
+            'language__name', 'language__code'
+        ).values_list('country_id', 'language__code', 'language__name', 'language__name_key'):
+            languages.setdefault(country_id, []).append({'code': code, 'name': name})
+            # Codes and names are stored lower-cased
+            language_keys.setdefault(country_id, set()).update((code, name_key))
+        currencies, currency_keys = {}, {}
+        for country_id, code, name, name_key, symbol in Country.used_currencies.through.objects.order_by(
+            'currency__code'
+        ).values_list('country_id', 'currency__code', 'currency__name', 'currency__name_key', 'currency__symbol'):
+            currencies.setdefault(country_id, []).append({'code': code, 'name': name, 'symbol': symbol})
+            # Codes are stored upper-cased and names lower-cased
+            currency_keys.setdefault(country_id, set()).update((code, name_key))
+        neighbours = {}
+        for country_id, neighbour_id, name, cca3 in Country.neighbours.through.objects.order_by(
+            'to_country__name', 'to_country_id'
+        ).values_list('from_country_id', 'to_country_id', 'to_country__name', 'to_country__cca3'):
+            neighbours.setdefault(country_id, []).append({'id': neighbour_id, 'name': name, 'cca3': cca3})
+
+        records = (
+            CountryRecord(
+                values,
+                spoken_languages=tuple(languages.get(values[0], ())),
+                used_currencies=tuple(currencies.get(values[0], ())),
+                neighbours=tuple(neighbours.get(values[0], ())),
+            )
+            for values in Country.objects.order_by('name', 'id').values_list(*RECORD_FIELDS)
+        )
+        return cls(records, language_keys, currency_keys)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def get(self, country_id):
+        """Return the record of a country id (an int or a numeric string), or None"""
+        try:
+            return self.by_id.get(int(country_id))
+        except (TypeError, ValueError):
+            return None
+
+    def position(self, country_id):
+        """Return the index of a country id's record in the catalog, or None"""
+        return self.positions.get(country_id)
+
+    def get_by_code(self, code):
+        """Return the record of a cca2 or cca3 code, or None"""
+        code = code.strip().upper()
+        return self.by_cca2.get(code) if len(code) == 2 else self.by_cca3.get(code)
+
+    def in_region(self, region):
+        return self.by_region.get(region, ())
+
+    def in_subregion(self, subregion):
+        return self.by_subregion.get(subregion, ())
+
+    def speaking(self, language):
+        """Countries speaking a language given by code or name, like Country.get_countries_by_language"""
+        return self.by_language.get(language.strip().lower(), ())
+
+    def using(self, currency):
+        """Countries using a currency given by code or name, like Country.get_countries_by_currency"""
+        term = currency.strip()
+        by_code = self.by_currency.get(term.upper(), ())
+        by_name = self.by_currency.get(term.lower(), ())
+        if not by_name or by_name is by_code:
+            return by_code
+        if not by_code:
+            return by_name
+        records = {record.id: record for record in by_code + by_name}
+        return tuple(sorted(records.values(), key=lambda record: self.position(record.id)))
+
+
+def _group(records, keys):
+    """Return {key: (record, ...)} in record order, for every key that keys(record) yields"""
+    groups = {}
+    for record in records:
+        for key in keys(record):
+            groups.setdefault(key, []).append(record)
+    return {key: tuple(group) for key, group in groups.items()}
+
+
+# Seconds between looks for a snapshot file of the current dataset version while serving a catalog built here
+SNAPSHOT_CHECK_INTERVAL = 5
+
+_current = None  # (dataset version, catalog, monotonic time it was loaded), replaced as a whole
+_dropped_version = None  # Version whose snapshot file predates a write made in this process
+_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the process-wide catalog: the COUNTRIES_SNAPSHOT_PATH snapshot when it
+    was written for the current dataset version, otherwise one built from the
+    database, rebuilt when the version changes.
+    """
+    global _current
+    version = get_dataset_version()
+    current = _current
+    if current is not None and current[0] == version and not _snapshot_due(current):
+        return current[1]
+    with _lock:
+        current = _current
+        if current is None or current[0] != version or _snapshot_due(current):
+            catalog = _open_snapshot(version)
+            if catalog is None:
+                catalog = current[1] if current is not None and current[0] == version else CountryCatalog.build()
+            _current = (version, catalog, time.monotonic())
+        return _current[1]
+
+
+def _snapshot_due(current):
+    return (
+        not current[1].mapped and getattr(settings, 'COUNTRIES_SNAPSHOT_PATH', '')
+        and time.monotonic() - current[2] >= SNAPSHOT_CHECK_INTERVAL
+    )
+
+
+def _open_snapshot(version):
+    """Return the mapped snapshot file if it was written for version, else None"""
+    from .snapshot import CountrySnapshot, SnapshotError, read_version
+    path = getattr(settings, 'COUNTRIES_SNAPSHOT_PATH', '')
+    if not path or version == _dropped_version or read_version(path) != version:
+        return None
+    try:
+        snapshot = CountrySnapshot(path)
+    except (OSError, SnapshotError):
+        return None
+    # The file may have been replaced since its version was read
+    return snapshot if snapshot.version == version else None
+
+
+def active_catalog():
+    """Return the catalog, or None when COUNTRIES_CATALOG is off"""
+    if not getattr(settings, 'COUNTRIES_CATALOG', True):
+        return None
+    return get_catalog()
+
+
+def invalidate_catalog():
+    """Drop this process's catalog, so the next reader rebuilds it from the database"""
+    global _current, _dropped_version
+    with _lock:
+        if _current is not None:
+            _dropped_version = _current[0]
+        _current = None
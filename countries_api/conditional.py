@@ -0,0 +1,51 @@
+"""
+HTTP conditional GET support for country pages and API endpoints.
+
+Validators come from the shared dataset version, so an ETag or Last-Modified
+check costs one primary-key lookup, shared with the rest of the request.
+Matching If-None-Match / If-Modified-Since requests are answered with 304
+before the view queries, serializes or renders anything.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.http import HttpResponseBase
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+
+from .cache import get_dataset_last_modified, get_dataset_version
+
+
+def dataset_etag(request, *args, **kwargs):
+    """Strong ETag of a page: dataset version, URL, negotiated representation and user"""
+    user = getattr(request, 'user', None)
+    key = '|'.join([
+        str(get_dataset_version()),
+        request.get_full_path(),
+        request.META.get('HTTP_ACCEPT', ''),
+        str(getattr(user, 'pk', '')),
+    ])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+
+def dataset_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(get_dataset_last_modified(), tz=timezone.utc)
+
+
+def dataset_condition(view_func):
+    """Decorate a GET view so it emits ETag/Last-Modified and answers revalidations with 304"""
+    conditional_view = condition(etag_func=dataset_etag, last_modified_func=dataset_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = conditional_view(request, *args, **kwargs)
+        if isinstance(response, HttpResponseBase):
+            patch_vary_headers(response, ['Accept'])
+            if response.status_code >= 400:
+                # An error is not a representation of the dataset, so must not be revalidated as one
+                del response['ETag']
+                del response['Last-Modified']
+        return response
+
+    return wrapper
@@ -0,0 +1,171 @@
+"""
+In-memory land border graph.
+
+The graph is built from the `borders` codes of every country, treated as
+undirected, and held per process under the dataset version it was built from.
+A write or a sync bumps the version, so the next query rebuilds the graph and
+drops every memoized result. Neighbourhood, shortest path and landmass queries
+then run as breadth-first searches in memory instead of one query per hop.
+"""
+import threading
+from collections import deque
+
+from .cache import get_dataset_version
+from .models import Country
+
+# Largest neighbourhood depth accepted by the API
+MAX_DEPTH = 10
+# Memoized query results kept per graph
+MEMO_SIZE = 4096
+
+
+class BorderGraph:
+    """Undirected graph of countries keyed by id, linked by shared land borders"""
+
+    def __init__(self, nodes, adjacency):
+        self.nodes = nodes
+        # Neighbours in name order, so that ties between equally short paths resolve the same way every time
+        self.adjacency = {
+            country_id: tuple(sorted(neighbours, key=lambda node: nodes[node]['name']))
+            for country_id, neighbours in adjacency.items()
+        }
+        self.ids_by_code = {node['cca3']: country_id for country_id, node in nodes.items()}
+        self.components = self._find_components()
+        self.component_index = {
+            country_id: index for index, component in enumerate(self.components) for country_id in component
+        }
+        self._memo = {}
+
+    @classmethod
+    def build(cls, rows):
+        """Build a graph from (id, name, cca3, borders) rows; unknown border codes are ignored"""
+        rows = list(rows)
+        nodes = {country_id: {'id': country_id, 'name': name, 'cca3': cca3} for country_id, name, cca3, _ in rows}
+        ids_by_code = {cca3: country_id for country_id, _, cca3, _ in rows}
+        adjacency = {country_id: set() for country_id in nodes}
+        for country_id, _, _, borders in rows:
+            for code in borders or []:
+                neighbour_id = ids_by_code.get(code)
+                if neighbour_id is not None and neighbour_id != country_id:
+                    adjacency[country_id].add(neighbour_id)
+                    adjacency[neighbour_id].add(country_id)
+        return cls(nodes, adjacency)
+
+    def __contains__(self, country_id):
+        return country_id in self.nodes
+
+    def neighbours(self, country_id, depth=1):
+        """Return {id: distance} of the countries at most depth border crossings away"""
+        return self._memoized(('neighbours', country_id, depth), lambda: self._bfs(country_id, depth))
+
+    def path(self, source_id, target_id):
+        """Return the ids on a route with the fewest border crossings, or None if there is no land route"""
+        return self._memoized(('path', source_id, target_id), lambda: self._shortest_path(source_id, target_id))
+
+    def component(self, country_id):
+        """Return the ids of the landmass a country belongs to"""
+        return self.components[self.component_index[country_id]]
+
+    def _memoized(self, key, compute):
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        result = compute()
+        if len(self._memo) >= MEMO_SIZE:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
+
+    def _bfs(self, country_id, depth):
+        distances = {country_id: 0}
+        frontier = [country_id]
+        for distance in range(1, depth + 1):
+            next_frontier = []
+            for current in frontier:
+                for neighbour in self.adjacency[current]:
+                    if neighbour not in distances:
+                        distances[neighbour] = distance
+                        next_frontier.append(neighbour)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        del distances[country_id]
+        return distances
+
+    def _shortest_path(self, source_id, target_id):
+        if self.component_index[source_id] != self.component_index[target_id]:
+            return None
+        if source_id == target_id:
+            return [source_id]
+        # Bidirectional search: grow the smaller frontier until the two searches meet
+        forward, backward = {source_id: None}, {target_id: None}
+        forward_frontier, backward_frontier = [source_id], [target_id]
+        while True:
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meeting = self._expand(forward_frontier, forward, backward)
+            else:
+                backward_frontier, meeting = self._expand(backward_frontier, backward, forward)
+            if meeting is not None:
+                break
+        route = []
+        node = meeting
+        while node is not None:
+            route.append(node)
+            node = forward[node]
+        route.reverse()
+        node = backward[meeting]
+        while node is not None:
+            route.append(node)
+            node = backward[node]
+        return route
+
+    def _expand(self, frontier, parents, other_parents):
+        next_frontier = []
+        for current in frontier:
+            for neighbour in self.adjacency[current]:
+                if neighbour not in parents:
+                    parents[neighbour] = current
+                    if neighbour in other_parents:
+                        return next_frontier, neighbour
+                    next_frontier.append(neighbour)
+        return next_frontier, None
+
+    def _find_components(self):
+        seen = set()
+        components = []
+        for start in self.nodes:
+            if start in seen:
+                continue
+            seen.add(start)
+            component = []
+            queue = deque([start])
+            while queue:
+                current = queue.popleft()
+                component.append(current)
+                for neighbour in self.adjacency[current]:
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        queue.append(neighbour)
+            component.sort(key=lambda node: self.nodes[node]['name'])
+            components.append(component)
+        components.sort(key=lambda component: (-len(component), self.nodes[component[0]]['name']))
+        return components
+
+
+_current = None  # (dataset version, graph), replaced as a whole
+_lock = threading.Lock()
+
+
+def get_graph():
+    """Return the process-wide border graph, rebuilding it when the dataset version changed"""
+    global _current
+    version = get_dataset_version()
+    current = _current
+    if current is not None and current[0] == version:
+        return current[1]
+    with _lock:
+        if _current is None or _current[0] != version:
+            graph = BorderGraph.build(Country.objects.order_by().values_list('id', 'name', 'cca3', 'borders'))
+            _current = (version, graph)
+        return _current[1]
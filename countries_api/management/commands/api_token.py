@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from countries_api.models import APIToken
+
+
+class Command(BaseCommand):
+    help = 'Create, list and revoke API tokens'
+
+    def add_arguments(self, parser):
+        subcommands = parser.add_subparsers(dest='action', required=True)
+        create = subcommands.add_parser('create', help='Create a token and print its key')
+        create.add_argument('username')
+        create.add_argument('--name', default='', help='Label telling the token apart')
+        create.add_argument('--days', type=int, help='Days until the token expires (default: never)')
+        listing = subcommands.add_parser('list', help='List tokens')
+        listing.add_argument('username', nargs='?')
+        revoke = subcommands.add_parser('revoke', help='Revoke the tokens whose keys start with a prefix')
+        revoke.add_argument('prefix')
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])(options)
+
+    def create(self, options):
+        try:
+            user = get_user_model().objects.get_by_natural_key(options['username'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user named {options['username']}")
+        expires_at = timezone.now() + timedelta(days=options['days']) if options['days'] else None
+        token, key = APIToken.create_token(user, name=options['name'], expires_at=expires_at)
+        self.stdout.write(self.style.SUCCESS(f"Created token {token.prefix} for {user}; it will not be shown again:"))
+        self.stdout.write(key)
+
+    def list(self, options):
+        tokens = APIToken.objects.select_related('user')
+        if options['username']:
+            tokens = tokens.filter(user__username=options['username'])
+        for token in tokens:
+            status = 'active' if token.is_active else 'revoked' if token.revoked_at else 'expired'
+            last_used = token.last_used_at.isoformat(timespec='seconds') if token.last_used_at else 'never'
+            self.stdout.write(f"{token.prefix}  {token.user}  {token.name or '-'}  {status}  last used {last_used}")
+
+    def revoke(self, options):
+        tokens = APIToken.objects.filter(prefix=options['prefix'], revoked_at__isnull=True)
+        if not tokens:
+            raise CommandError(f"No active token starts with {options['prefix']}")
+        for token in tokens:
+            token.revoke()
+        self.stdout.write(self.style.SUCCESS(f"Revoked {len(tokens)} token(s)"))
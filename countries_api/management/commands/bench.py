@@ -0,0 +1,94 @@
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from countries_api.bench import BENCHMARKS
+from countries_api.bench.compare import compare
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = 'Run performance benchmarks against a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('benchmarks', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+        parser.add_argument('--rows', type=int, default=10000, help='Number of synthetic countries')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data generator')
+        parser.add_argument('--output', help='Also write the results to this JSON file')
+        parser.add_argument('--compare', help='Results file of an earlier run to compare against')
+        parser.add_argument('--threshold', type=float, default=10,
+                            help='Percentage by which a metric may get worse before it counts as a regression')
+
+    def handle(self, *args, **options):
+        names = options['benchmarks'] or list(BENCHMARKS)
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(unknown)}")
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        vendor = connection.vendor
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = {}
+            for name in names:
+                self.stderr.write(f"Running {name} with {options['rows']} rows...")
+                results[name] = BENCHMARKS[name](rows=options['rows'], seed=options['seed'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'meta': {
+                'commit': _git_commit(),
+                'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'rows': options['rows'],
+                'seed': options['seed'],
+                'database': vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+
+        if baseline is not None:
+            self._report_comparison(baseline, report, options['threshold'])
+
+    def _report_comparison(self, baseline, report, threshold):
+        meta = baseline.get('meta', {})
+        if meta.get('rows', report['meta']['rows']) != report['meta']['rows']:
+            self.stderr.write(self.style.WARNING(
+                f"Baseline ran with {meta['rows']} rows, this run with {report['meta']['rows']}"
+            ))
+        rows = compare(baseline, report, threshold=threshold / 100)
+        regressions = [row for row in rows if row['regression']]
+        for row in rows:
+            change = 'n/a' if row['change'] is None else f"{row['change'] * 100:+.1f}%"
+            line = f"{row['metric']:<50} {row['baseline']:>14.4g} {row['current']:>14.4g} {change:>9}"
+            self.stderr.write(self.style.ERROR(line) if row['regression'] else line)
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} of {len(rows)} metrics regressed by more than {threshold:g}% "
+                f"against {meta.get('commit') or 'the baseline'}"
+            )
+        self.stderr.write(self.style.SUCCESS(f"No regressions in {len(rows)} metrics"))
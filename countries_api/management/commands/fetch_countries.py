@@ -1,18 +1,77 @@
-
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from countries_api.utils import fetch_and_store_countries
+
+from countries_api.cache import get_dataset_version
+from countries_api.snapshot import read_version, write_current_snapshot
+from countries_api.utils import (
+    API_URL,
+    BATCH_SIZE,
+    REGION_URL,
+    fetch_and_store_countries,
+    fetch_and_store_regions,
+    load_countries_from_file,
+)
 
 class Command(BaseCommand):
-    help = 'Fetch countries data from the REST Countries API and store in the database'
+    help = 'Fetch countries data from the REST Countries API (or a local dump) and store in the database'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--url', default=API_URL, help='URL serving a JSON array of countries')
+        source.add_argument('--file', help='Path to a JSON array of countries')
+        source.add_argument('--ndjson', help='Path to a newline-delimited JSON file of countries')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Countries written per batch')
+        parser.add_argument('--force', action='store_true', help='Reprocess the payload even if upstream has not changed')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Fetch region endpoints, or parse chunks of an NDJSON file, in parallel')
+        parser.add_argument('--region-url', default=REGION_URL,
+                            help='URL template of the region endpoints fetched when --workers is above 1')
+        parser.add_argument('--snapshot', default=settings.COUNTRIES_SNAPSHOT_PATH,
+                            help='Path to write the memory-mapped country snapshot to (default: COUNTRIES_SNAPSHOT_PATH)')
+
+    def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Fetching countries data...'))
         
         try:
-            result = fetch_and_store_countries()
+            if options['file']:
+                result = load_countries_from_file(
+                    options['file'], batch_size=options['batch_size'], workers=options['workers']
+                )
+            elif options['ndjson']:
+                result = load_countries_from_file(
+                    options['ndjson'], ndjson=True, batch_size=options['batch_size'], workers=options['workers']
+                )
+            elif options['workers'] > 1:
+                result = fetch_and_store_regions(
+                    url_template=options['region_url'], workers=options['workers'], batch_size=options['batch_size'],
+                    force=options['force'],
+                )
+            else:
+                result = fetch_and_store_countries(
+                    options['url'], batch_size=options['batch_size'], force=options['force']
+                )
+            if result['status'] != 'synced':
+                self.stdout.write(self.style.SUCCESS(
+                    f"Countries data unchanged upstream ({result['status']}), nothing to do"
+                ))
+                # A snapshot is still due if the dataset changed through the API since it was written
+                if options['snapshot'] and read_version(options['snapshot']) != get_dataset_version():
+                    self.write_snapshot(options['snapshot'])
+                return
             self.stdout.write(self.style.SUCCESS(
                 f"Successfully processed countries data: {result['created']} created, "
-                f"{result['updated']} updated, {result['total']} total"
+                f"{result['updated']} updated, {result['unchanged']} unchanged, "
+                f"{result['removed']} removed, {result['total']} total"
             ))
+            for name, error in result.get('failed', {}).items():
+                self.stdout.write(self.style.WARNING(
+                    f"Partition {name} failed ({error}); countries missing from this sync were kept"
+                ))
+            if options['snapshot']:
+                self.write_snapshot(options['snapshot'])
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
+
+    def write_snapshot(self, path):
+        size = write_current_snapshot(path)
+        self.stdout.write(self.style.SUCCESS(f"Wrote country snapshot to {path} ({size} bytes)"))
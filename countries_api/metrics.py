@@ -0,0 +1,395 @@
+"""
+Request metrics in the Prometheus text format.
+
+MetricsMiddleware records for every request:
+- its latency, in a histogram per route;
+- the number and duration of its SQL queries, through an execute wrapper on every
+  database connection, so the queries of views run in sync_to_async threads count;
+- the time spent serializing, rendering and in templates;
+- its response cache hits and misses.
+
+The /metrics view publishes these in the Prometheus text format.
+
+Each thread aggregates into its own shard, so recording takes no lock; a
+scrape sums the shards, and the shards of threads that have exited are folded
+into one, so thread-per-request servers do not grow the registry. Routes are
+labelled by URL name, never by raw path, which keeps the number of series
+bounded. The middleware runs in the handler's mode, so it never moves ASGI
+requests onto a worker thread.
+"""
+import bisect
+import contextvars
+import hmac
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+# Upper bounds of the request latency (seconds) and query count histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative-on-export histogram with fixed bucket bounds"""
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+
+class Shard:
+    """Metrics recorded by a single thread"""
+
+    def __init__(self):
+        self.requests = defaultdict(int)  # (route, method, status) -> count
+        self.durations = {}  # route -> Histogram of seconds
+        self.queries = {}  # route -> Histogram of queries per request
+        self.query_seconds = defaultdict(float)  # route -> seconds
+        self.phase_seconds = defaultdict(float)  # (route, phase) -> seconds
+        self.cache = defaultdict(int)  # (route, 'hit' or 'miss') -> count
+
+    def merge(self, other):
+        """Add the metrics of another shard to this one"""
+        # Copies are atomic under the GIL, so recording threads never have to wait for a scrape
+        for key, value in list(other.requests.items()):
+            self.requests[key] += value
+        for target, source in ((self.durations, other.durations), (self.queries, other.queries)):
+            for route, histogram in list(source.items()):
+                if route not in target:
+                    target[route] = Histogram(histogram.buckets)
+                target[route].merge(histogram)
+        for key, value in list(other.query_seconds.items()):
+            self.query_seconds[key] += value
+        for key, value in list(other.phase_seconds.items()):
+            self.phase_seconds[key] += value
+        for key, value in list(other.cache.items()):
+            self.cache[key] += value
+
+
+class Registry:
+    """Per-thread shards of request metrics, summed when exported"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = {}  # Thread -> Shard
+        self._retired = Shard()  # Sum of the shards of threads that have exited
+        self._lock = threading.Lock()
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = Shard()
+            with self._lock:
+                self._retire_exited_threads()
+                self._shards[threading.current_thread()] = shard
+        return shard
+
+    def _retire_exited_threads(self):
+        # An exited thread records nothing more, so its shard can be folded without racing it
+        for thread in [thread for thread in self._shards if not thread.is_alive()]:
+            self._retired.merge(self._shards.pop(thread))
+
+    def record(self, route, method, status, seconds, request_record):
+        shard = self.shard()
+        shard.requests[(route, method, status)] += 1
+        if route not in shard.durations:
+            shard.durations[route] = Histogram(DURATION_BUCKETS)
+            shard.queries[route] = Histogram(QUERY_BUCKETS)
+        shard.durations[route].observe(seconds)
+        shard.queries[route].observe(request_record.queries)
+        shard.query_seconds[route] += request_record.query_seconds
+        for phase, phase_seconds in request_record.phases.items():
+            shard.phase_seconds[(route, phase)] += phase_seconds
+        for result, count in request_record.cache.items():
+            shard.cache[(route, result)] += count
+
+    def collect(self):
+        """Return a Shard holding the sum of every thread's metrics"""
+        total = Shard()
+        with self._lock:
+            self._retire_exited_threads()
+            total.merge(self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            total.merge(shard)
+        return total
+
+    def reset(self):
+        with self._lock:
+            self._shards = {}
+            self._retired = Shard()
+        self._local = threading.local()
+
+
+registry = Registry()
+
+
+class RequestRecord:
+    """Figures of the request being handled"""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.phases = defaultdict(float)
+        self.cache = defaultdict(int)
+
+    def execute(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - start
+
+
+_current = contextvars.ContextVar('countries_request_record', default=None)
+
+# Execute wrappers installed on every database connection, whichever thread opens it
+_execute_wrappers = []
+
+
+def add_execute_wrapper(wrapper):
+    """
+    Run wrapper around the queries of every database connection. Under ASGI a
+    view's queries run on worker threads with their own connections, so a
+    wrapper that follows a request looks it up in a ContextVar, which
+    sync_to_async carries into those threads.
+    """
+    _execute_wrappers.append(wrapper)
+    for alias in connections:
+        _install_execute_wrappers(connection=connections[alias])
+
+
+def _install_execute_wrappers(connection, **kwargs):
+    for wrapper in _execute_wrappers:
+        if wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(wrapper)
+
+
+connection_created.connect(_install_execute_wrappers)
+
+
+def _record_query(execute, sql, params, many, context):
+    record = _current.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    return record.execute(execute, sql, params, many, context)
+
+
+add_execute_wrapper(_record_query)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the named phase of the current request"""
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.phases[name] += time.perf_counter() - start
+
+
+def record_cache(hit):
+    """Count a response cache hit or miss for the current request"""
+    record = _current.get()
+    if record is not None:
+        record.cache['hit' if hit else 'miss'] += 1
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match.route
+
+
+class MetricsMiddleware:
+    """Record the latency, queries and phase timings of every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COUNTRIES_METRICS', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # A coroutine hook keeps Django from running it through sync_to_async
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with self._recording() as record:
+            response = self.get_response(request)
+        registry.record(route_name(request), request.method, response.status_code, time.perf_counter() - start, record)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with self._recording() as record:
+            response = await self.get_response(request)
+        registry.record(route_name(request), request.method, response.status_code, time.perf_counter() - start, record)
+        return response
+
+    @contextmanager
+    def _recording(self):
+        record = RequestRecord()
+        token = _current.set(record)
+        try:
+            yield record
+        finally:
+            _current.reset(token)
+
+    async def _aprocess_template_response(self, request, response):
+        return self._time_render(response)
+
+    def process_template_response(self, request, response):
+        return self._time_render(response)
+
+    def _time_render(self, response):
+        # DRF responses are rendered right after this hook; time them until the post-render callback
+        record = _current.get()
+        if record is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                record.phases['render'] += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+
+class TimedTemplates(DjangoTemplates):
+    """Django template backend that records template render time in the request metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with phase('template'):
+            return self.template.render(context, request)
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram_lines(name, histograms):
+    lines = []
+    for route, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{{{_labels(route=route, le=bound)}}} {cumulative}")
+        lines.append(f"{name}_sum{{{_labels(route=route)}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{_labels(route=route)}}} {histogram.count}")
+    return lines
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text exposition format"""
+    total = registry.collect()
+    lines = [
+        '# HELP countries_requests_total Requests handled, by route, method and status.',
+        '# TYPE countries_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(total.requests.items()):
+        lines.append(f"countries_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}")
+    lines += [
+        '# HELP countries_request_duration_seconds Request latency, by route.',
+        '# TYPE countries_request_duration_seconds histogram',
+    ]
+    lines += _histogram_lines('countries_request_duration_seconds', total.durations)
+    lines += [
+        '# HELP countries_request_queries SQL queries issued per request, by route.',
+        '# TYPE countries_request_queries histogram',
+    ]
+    lines += _histogram_lines('countries_request_queries', total.queries)
+    lines += [
+        '# HELP countries_request_query_seconds_total Time spent in SQL queries, by route.',
+        '# TYPE countries_request_query_seconds_total counter',
+    ]
+    for route, seconds in sorted(total.query_seconds.items()):
+        lines.append(f"countries_request_query_seconds_total{{{_labels(route=route)}}} {seconds}")
+    lines += [
+        '# HELP countries_request_phase_seconds_total Time spent serializing, rendering and in templates, by route.',
+        '# TYPE countries_request_phase_seconds_total counter',
+    ]
+    for (route, name), seconds in sorted(total.phase_seconds.items()):
+        lines.append(f"countries_request_phase_seconds_total{{{_labels(route=route, phase=name)}}} {seconds}")
+    lines += [
+        '# HELP countries_response_cache_requests_total Response cache lookups, by route and result.',
+        '# TYPE countries_response_cache_requests_total counter',
+    ]
+    for (route, result), count in sorted(total.cache.items()):
+        lines.append(f"countries_response_cache_requests_total{{{_labels(route=route, result=result)}}} {count}")
+    hits = sum(count for (_, result), count in total.cache.items() if result == 'hit')
+    lookups = sum(total.cache.values())
+    lines += [
+        '# HELP countries_response_cache_hit_ratio Share of response cache lookups that hit, since start.',
+        '# TYPE countries_response_cache_hit_ratio gauge',
+        f"countries_response_cache_hit_ratio {hits / lookups if lookups else 0.0}",
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Serve the metrics to a scraper presenting COUNTRIES_METRICS_TOKEN as a
+    bearer token, or, when no token is configured, to staff users.
+    """
+    token = getattr(settings, 'COUNTRIES_METRICS_TOKEN', '')
+    if token:
+        allowed = hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f"Bearer {token}")
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponse('Forbidden\n', status=403, content_type=CONTENT_TYPE)
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
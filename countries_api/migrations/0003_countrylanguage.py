@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-17 17:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_language_index(apps, schema_editor):
+    Country = apps.get_model('countries_api', 'Country')
+    CountryLanguage = apps.get_model('countries_api', 'CountryLanguage')
+    entries = []
+    for country in Country.objects.only('id', 'languages').iterator():
+        terms = set()
+        for code, name in (country.languages or {}).items():
+            for term in (code, name):
+                if isinstance(term, str) and term.strip():
+                    terms.add(term.strip().lower())
+        entries.extend(CountryLanguage(country_id=country.id, term=term) for term in terms)
+    CountryLanguage.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0002_country_countries_a_region_0c4425_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryLanguage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=100)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='language_terms', to='countries_api.country')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'country'], name='countries_a_term_fa49a3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('country', 'term'), name='unique_country_language_term')],
+            },
+        ),
+        migrations.RunPython(build_language_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0003_countrylanguage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
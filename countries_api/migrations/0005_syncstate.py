@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-17 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0004_country_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True)),
+                ('etag', models.CharField(blank=True, default='', max_length=255)),
+                ('last_modified', models.CharField(blank=True, default='', max_length=64)),
+                ('body_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('synced_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
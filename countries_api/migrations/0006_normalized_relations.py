@@ -0,0 +1,111 @@
+# Generated by Django 5.2 on 2026-10-17 17:56
+
+from django.db import migrations, models
+
+
+def build_relations(apps, schema_editor):
+    Country = apps.get_model('countries_api', 'Country')
+    Language = apps.get_model('countries_api', 'Language')
+    Currency = apps.get_model('countries_api', 'Currency')
+    countries = list(Country.objects.only('id', 'cca3', 'languages', 'currencies', 'borders'))
+    code_to_id = {country.cca3: country.id for country in countries}
+
+    languages = {}
+    currencies = {}
+    for country in countries:
+        for code, name in (country.languages or {}).items():
+            if isinstance(name, str):
+                languages[code.strip().lower()] = name.strip()
+        for code, details in (country.currencies or {}).items():
+            details = details if isinstance(details, dict) else {}
+            currencies[code.strip().upper()] = (details.get('name', ''), details.get('symbol', ''))
+
+    Language.objects.bulk_create(
+        [Language(code=code, name=name, name_key=name.lower()) for code, name in languages.items()]
+    )
+    Currency.objects.bulk_create([
+        Currency(code=code, name=name, name_key=name.lower(), symbol=symbol)
+        for code, (name, symbol) in currencies.items()
+    ])
+    language_ids = dict(Language.objects.values_list('code', 'id'))
+    currency_ids = dict(Currency.objects.values_list('code', 'id'))
+
+    LanguageLink = Country.spoken_languages.through
+    CurrencyLink = Country.used_currencies.through
+    BorderLink = Country.neighbours.through
+    language_links, currency_links, border_links = [], [], []
+    for country in countries:
+        for code, name in (country.languages or {}).items():
+            if isinstance(name, str):
+                language_links.append(LanguageLink(country_id=country.id, language_id=language_ids[code.strip().lower()]))
+        for code in (country.currencies or {}):
+            currency_links.append(CurrencyLink(country_id=country.id, currency_id=currency_ids[code.strip().upper()]))
+        for code in dict.fromkeys(country.borders or []):
+            if code in code_to_id and code_to_id[code] != country.id:
+                border_links.append(BorderLink(from_country_id=country.id, to_country_id=code_to_id[code]))
+    LanguageLink.objects.bulk_create(language_links, batch_size=1000)
+    CurrencyLink.objects.bulk_create(currency_links, batch_size=1000)
+    BorderLink.objects.bulk_create(border_links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0005_syncstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Currency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('name_key', models.CharField(db_index=True, max_length=100)),
+                ('symbol', models.CharField(blank=True, default='', max_length=20)),
+            ],
+            options={
+                'verbose_name_plural': 'Currencies',
+                'ordering': ['code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Language',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=10, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('name_key', models.CharField(db_index=True, max_length=100)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='country',
+            name='countries_a_languag_a79839_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='country',
+            name='countries_a_borders_c36b63_idx',
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='neighbours',
+            field=models.ManyToManyField(blank=True, related_name='neighbour_of', to='countries_api.country'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='used_currencies',
+            field=models.ManyToManyField(blank=True, related_name='countries', to='countries_api.currency'),
+        ),
+        migrations.AddField(
+            model_name='country',
+            name='spoken_languages',
+            field=models.ManyToManyField(blank=True, related_name='countries', to='countries_api.language'),
+        ),
+        migrations.RunPython(build_relations, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='CountryLanguage',
+        ),
+    ]
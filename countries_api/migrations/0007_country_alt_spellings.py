@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 17:59
+
+from django.db import migrations, models
+
+
+def extract_alt_spellings(apps, schema_editor):
+    Country = apps.get_model('countries_api', 'Country')
+    countries = []
+    for country in Country.objects.only('id', 'raw_data').iterator():
+        country.alt_spellings = (country.raw_data or {}).get('altSpellings', [])
+        countries.append(country)
+    Country.objects.bulk_update(countries, ['alt_spellings'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0006_normalized_relations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='country',
+            name='alt_spellings',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(extract_alt_spellings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0007_country_alt_spellings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='country',
+            index=models.Index(fields=['name', 'id'], name='countries_a_name_a97b64_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-17 18:19
+
+import json
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def move_raw_data(apps, schema_editor):
+    Country = apps.get_model('countries_api', 'Country')
+    CountryRawData = apps.get_model('countries_api', 'CountryRawData')
+    batch = []
+    for country_id, raw_data in Country.objects.values_list('id', 'raw_data').iterator(chunk_size=BATCH_SIZE):
+        document = json.dumps(raw_data or {}, ensure_ascii=False, separators=(',', ':'))
+        batch.append(CountryRawData(country_id=country_id, compressed=zlib.compress(document.encode('utf-8'))))
+        if len(batch) >= BATCH_SIZE:
+            CountryRawData.objects.bulk_create(batch)
+            batch = []
+    CountryRawData.objects.bulk_create(batch)
+
+
+def restore_raw_data(apps, schema_editor):
+    Country = apps.get_model('countries_api', 'Country')
+    CountryRawData = apps.get_model('countries_api', 'CountryRawData')
+    for country_id, compressed in CountryRawData.objects.values_list('country_id', 'compressed').iterator(chunk_size=BATCH_SIZE):
+        raw_data = json.loads(zlib.decompress(compressed).decode('utf-8'))
+        Country.objects.filter(id=country_id).update(raw_data=raw_data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0008_country_name_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryRawData',
+            fields=[
+                ('country', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='raw_document', serialize=False, to='countries_api.country')),
+                ('compressed', models.BinaryField()),
+            ],
+            options={
+                'verbose_name_plural': 'Country raw data',
+            },
+        ),
+        migrations.RunPython(move_raw_data, restore_raw_data),
+        migrations.RemoveField(
+            model_name='country',
+            name='raw_data',
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2 on 2026-10-17 18:34
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    Country = apps.get_model('countries_api', 'Country')
+    RegionStats = apps.get_model('countries_api', 'RegionStats')
+    SubregionStats = apps.get_model('countries_api', 'SubregionStats')
+    languages = defaultdict(set)
+    for country_id, language_id in Country.spoken_languages.through.objects.values_list('country_id', 'language_id'):
+        languages[country_id].add(language_id)
+    currencies = defaultdict(set)
+    for country_id, currency_id in Country.used_currencies.through.objects.values_list('country_id', 'currency_id'):
+        currencies[country_id].add(currency_id)
+
+    groups = defaultdict(lambda: {'countries': 0, 'population': 0, 'languages': set(), 'currencies': set()})
+    for country_id, region, subregion, population in Country.objects.values_list(
+        'id', 'region', 'subregion', 'population'
+    ):
+        for key in ((region,), (region, subregion or '')):
+            group = groups[key]
+            group['countries'] += 1
+            group['population'] += population
+            group['languages'] |= languages[country_id]
+            group['currencies'] |= currencies[country_id]
+
+    def figures(group):
+        return {
+            'country_count': group['countries'],
+            'total_population': group['population'],
+            'average_population': group['population'] / group['countries'],
+            'language_count': len(group['languages']),
+            'currency_count': len(group['currencies']),
+        }
+
+    RegionStats.objects.bulk_create([
+        RegionStats(region=key[0], **figures(group)) for key, group in groups.items() if len(key) == 1
+    ])
+    SubregionStats.objects.bulk_create([
+        SubregionStats(region=key[0], subregion=key[1], **figures(group)) for key, group in groups.items() if len(key) == 2
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0009_country_raw_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country_count', models.PositiveIntegerField(default=0)),
+                ('total_population', models.BigIntegerField(default=0)),
+                ('average_population', models.FloatField(default=0)),
+                ('language_count', models.PositiveIntegerField(default=0)),
+                ('currency_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('region', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Region stats',
+                'ordering': ['region'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SubregionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country_count', models.PositiveIntegerField(default=0)),
+                ('total_population', models.BigIntegerField(default=0)),
+                ('average_population', models.FloatField(default=0)),
+                ('language_count', models.PositiveIntegerField(default=0)),
+                ('currency_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('region', models.CharField(max_length=100)),
+                ('subregion', models.CharField(blank=True, max_length=100)),
+            ],
+            options={
+                'verbose_name_plural': 'Subregion stats',
+                'ordering': ['region', 'subregion'],
+                'constraints': [models.UniqueConstraint(fields=('region', 'subregion'), name='unique_subregion_stats')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2 on 2026-10-17 19:53
+
+import json
+import unicodedata
+import zlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+# Frozen copies of countries_api.search.normalize and countries_api.models.country_names
+# as of this migration, so later changes to them do not change what it writes
+def normalize(text):
+    text = unicodedata.normalize('NFKD', str(text or '')).casefold()
+    chars = [char if char.isalnum() else ' ' for char in text if not unicodedata.combining(char)]
+    return ' '.join(''.join(chars).split())
+
+
+def country_names(document):
+    name = document.get('name') if isinstance(document, dict) else None
+    native = name.get('nativeName') if isinstance(name, dict) else None
+    translations = document.get('translations') if isinstance(document, dict) else None
+    for kind, names in (('native', native), ('translation', translations)):
+        for language, entry in (names if isinstance(names, dict) else {}).items():
+            if not isinstance(language, str) or not isinstance(entry, dict):
+                continue
+            common = entry.get('common') if isinstance(entry.get('common'), str) else ''
+            official = entry.get('official') if isinstance(entry.get('official'), str) else ''
+            if common.strip() or official.strip():
+                yield language.strip().lower(), kind, (common or official).strip(), official.strip()
+
+
+def extract_names(apps, schema_editor):
+    CountryRawData = apps.get_model('countries_api', 'CountryRawData')
+    CountryName = apps.get_model('countries_api', 'CountryName')
+    batch = []
+    for country_id, compressed in CountryRawData.objects.values_list('country_id', 'compressed').iterator(chunk_size=BATCH_SIZE):
+        document = json.loads(zlib.decompress(compressed).decode('utf-8'))
+        batch += [
+            CountryName(
+                country_id=country_id, language=language[:10], kind=kind, common=common[:255],
+                official=official[:255], name_key=normalize(common)[:255],
+            )
+            for language, kind, common, official in country_names(document)
+        ]
+        if len(batch) >= BATCH_SIZE:
+            CountryName.objects.bulk_create(batch)
+            batch = []
+    CountryName.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0012_api_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryName',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10)),
+                ('kind', models.CharField(choices=[('native', 'Native name'), ('translation', 'Translation')], max_length=12)),
+                ('common', models.CharField(max_length=255)),
+                ('official', models.CharField(blank=True, default='', max_length=255)),
+                ('name_key', models.CharField(db_index=True, max_length=255)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='names', to='countries_api.country')),
+            ],
+            options={
+                'ordering': ['country', 'language', 'kind'],
+                'indexes': [models.Index(fields=['language', 'country'], name='countries_a_languag_183707_idx')],
+                'constraints': [models.UniqueConstraint(fields=('country', 'language', 'kind'), name='unique_country_name')],
+            },
+        ),
+        migrations.RunPython(extract_names, migrations.RunPython.noop),
+    ]
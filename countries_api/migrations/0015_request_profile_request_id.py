@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0014_dataset_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestprofile',
+            name='request_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 20:43
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('countries_api', '0015_request_profile_request_id'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='countryname',
+            name='name_key',
+        ),
+    ]
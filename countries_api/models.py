@@ -1,6 +1,59 @@
+import hashlib
+import json
+import secrets
+import zlib
+
+from django.conf import settings
 from django.db import models
 from django.db.models import JSONField
 from django.db.models import Q
+from django.utils import timezone
+
+
+def normalize_languages(languages):
+    """Return {code: name} with lower-cased codes from a REST Countries languages dict"""
+    normalized = {}
+    for code, name in (languages or {}).items():
+        if isinstance(code, str) and code.strip() and isinstance(name, str):
+            normalized[code.strip().lower()] = name.strip()
+    return normalized
+
+
+def normalize_currencies(currencies):
+    """Return {code: (name, symbol)} with upper-cased codes from a REST Countries currencies dict"""
+    normalized = {}
+    for code, details in (currencies or {}).items():
+        if isinstance(code, str) and code.strip():
+            details = details if isinstance(details, dict) else {}
+            normalized[code.strip().upper()] = (details.get('name', ''), details.get('symbol', ''))
+    return normalized
+
+
+class Language(models.Model):
+    code = models.CharField(max_length=10, unique=True)  # ISO 639-3, lower-cased
+    name = models.CharField(max_length=100)
+    name_key = models.CharField(max_length=100, db_index=True)  # Lower-cased name for lookups
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class Currency(models.Model):
+    code = models.CharField(max_length=10, unique=True)  # ISO 4217, upper-cased
+    name = models.CharField(max_length=100)
+    name_key = models.CharField(max_length=100, db_index=True)  # Lower-cased name for lookups
+    symbol = models.CharField(max_length=20, blank=True, default='')
+
+    class Meta:
+        ordering = ['code']
+        verbose_name_plural = 'Currencies'
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
 
 class Country(models.Model):
     name = models.CharField(max_length=255)  # Common name
@@ -18,9 +71,15 @@ class Country(models.Model):
     capitals = models.JSONField(default=list, blank=True, null=True)
     currencies = models.JSONField(default=dict, blank=True, null=True)
     borders = models.JSONField(default=list, blank=True, null=True)
+    alt_spellings = models.JSONField(default=list, blank=True)
     
-    # Store full JSON data for reference
-    raw_data = models.JSONField(default=dict)
+    # Normalized relations kept in sync with the JSON fields above
+    spoken_languages = models.ManyToManyField(Language, related_name='countries', blank=True)
+    used_currencies = models.ManyToManyField(Currency, related_name='countries', blank=True)
+    neighbours = models.ManyToManyField('self', symmetrical=False, related_name='neighbour_of', blank=True)
+    
+    # Hash of raw_data, used by the sync to skip unchanged countries
+    content_hash = models.CharField(max_length=64, blank=True, default='')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -31,13 +90,41 @@ class Country(models.Model):
         # Adding indexes to frequently filtered fields
         indexes = [
             models.Index(fields=['region']),
-            models.Index(fields=['languages']),
-            models.Index(fields=['borders']),
+            # Keyset pagination walks (name, id)
+            models.Index(fields=['name', 'id']),
         ]
         
     def __str__(self):
         return self.name
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored region so that moving a country refreshes the stats of both regions
+        instance._loaded_region = instance.__dict__.get('region')
+        return instance
+    
+    @property
+    def raw_data(self):
+        """Full upstream JSON document, loaded from CountryRawData on first access"""
+        if not hasattr(self, '_raw_data'):
+            try:
+                self._raw_data = self.raw_document.data if self.pk else {}
+            except CountryRawData.DoesNotExist:
+                self._raw_data = {}
+        return self._raw_data
+    
+    @raw_data.setter
+    def raw_data(self, value):
+        self._raw_data = value
+        self._raw_data_changed = True
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if getattr(self, '_raw_data_changed', False):
+            CountryRawData.objects.update_or_create(country=self, defaults={'data': self._raw_data})
+            self._raw_data_changed = False
+    
     def get_capital(self):
         """Return the primary capital or first capital if many"""
         if self.capitals and len(self.capitals) > 0:
@@ -50,10 +137,32 @@ class Country(models.Model):
             return self.timezones[0]
         return "N/A"
     
+    def refresh_relations(self):
+        """Rebuild the language, currency and border relations from the JSON fields"""
+        from .cache import bump_dataset_version_on_commit
+        from .catalog import invalidate_catalog
+        from .stats import refresh_region_stats_on_commit
+        refresh_country_relations([self])
+        refresh_region_stats_on_commit([self.region])
+        # The relations are written after post_save, so readers may have rebuilt derived data without them
+        invalidate_catalog()
+        bump_dataset_version_on_commit()
+    
     @classmethod
     def get_countries_by_language(cls, language):
-        """Return countries that speak the given language"""
-        return cls.objects.filter(languages__contains={language.lower(): True})
+        """Return countries that speak the given language (name or code)"""
+        term = language.strip().lower()
+        return cls.objects.filter(
+            Q(spoken_languages__code=term) | Q(spoken_languages__name_key=term)
+        )
+    
+    @classmethod
+    def get_countries_by_currency(cls, currency):
+        """Return countries that use the given currency (name or code)"""
+        term = currency.strip()
+        return cls.objects.filter(
+            Q(used_currencies__code=term.upper()) | Q(used_currencies__name_key=term.lower())
+        )
     
     @classmethod
     def get_countries_in_same_region(cls, region):
@@ -61,13 +170,358 @@ class Country(models.Model):
         return cls.objects.filter(region=region)
     
     @classmethod
-    def search_countries(cls, query):
-        """Search for countries by name (partial match)"""
-        return cls.objects.filter(
-            Q(name__icontains=query) | Q(official_name__icontains=query)
-        )
+    def search_countries(cls, query, fuzzy=False):
+        """Search for countries by name, official name, code or alternate spelling, best match first"""
+        from .search import search_countries
+        return search_countries(query, cls.objects.all(), fuzzy=fuzzy)
     
     @classmethod
     def get_countries_with_borders(cls, borders):
-        """Return countries that share borders with the given list of countries"""
-        return cls.objects.filter(borders__overlap=borders)
+        """Return countries that share borders with the given list of countries (cca3 codes)"""
+        return cls.objects.filter(neighbours__cca3__in=borders).distinct()
+
+
+def compress_document(data):
+    """Return the zlib-compressed UTF-8 JSON of a document"""
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+def decompress_document(blob):
+    """Return the document stored by compress_document"""
+    return json.loads(zlib.decompress(blob).decode('utf-8'))
+
+
+class CountryRawData(models.Model):
+    """
+    Full upstream JSON of a country, compressed and kept out of the Country row
+    so that list, search and detail queries never read it.
+    """
+    country = models.OneToOneField(Country, on_delete=models.CASCADE, primary_key=True, related_name='raw_document')
+    compressed = models.BinaryField()
+    
+    class Meta:
+        verbose_name_plural = 'Country raw data'
+    
+    def __str__(self):
+        return f"Raw data of country {self.country_id}"
+    
+    @property
+    def data(self):
+        return decompress_document(self.compressed)
+    
+    @data.setter
+    def data(self, value):
+        self.compressed = compress_document(value)
+
+
+def country_names(document):
+    """Yield (language, kind, common, official) for the native and translated names of a REST Countries document"""
+    name = document.get('name') if isinstance(document, dict) else None
+    native = name.get('nativeName') if isinstance(name, dict) else None
+    translations = document.get('translations') if isinstance(document, dict) else None
+    for kind, names in ((CountryName.NATIVE, native), (CountryName.TRANSLATION, translations)):
+        for language, entry in (names if isinstance(names, dict) else {}).items():
+            if not isinstance(language, str) or not isinstance(entry, dict):
+                continue
+            common = entry.get('common') if isinstance(entry.get('common'), str) else ''
+            official = entry.get('official') if isinstance(entry.get('official'), str) else ''
+            if common.strip() or official.strip():
+                yield language.strip().lower(), kind, (common or official).strip(), official.strip()
+
+
+class CountryName(models.Model):
+    """
+    A native or translated name of a country, extracted from its upstream
+    document when the country is stored.
+    """
+    NATIVE = 'native'
+    TRANSLATION = 'translation'
+    KIND_CHOICES = [(NATIVE, 'Native name'), (TRANSLATION, 'Translation')]
+    
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='names')
+    language = models.CharField(max_length=10)  # ISO 639-3, lower-cased
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES)
+    common = models.CharField(max_length=255)
+    official = models.CharField(max_length=255, blank=True, default='')
+    
+    class Meta:
+        ordering = ['country', 'language', 'kind']
+        constraints = [
+            models.UniqueConstraint(fields=['country', 'language', 'kind'], name='unique_country_name'),
+        ]
+        indexes = [
+            # Localized names are fetched for a page of countries in one language
+            models.Index(fields=['language', 'country']),
+        ]
+    
+    def __str__(self):
+        return f"{self.common} ({self.language})"
+    
+    @classmethod
+    def localized(cls, country_ids, language):
+        """Return {country_id: common name} in a language, preferring translations over native names"""
+        names = {}
+        for country_id, kind, common in cls.objects.filter(
+            country_id__in=country_ids, language=language.strip().lower()
+        ).order_by().values_list('country_id', 'kind', 'common'):
+            if kind == cls.TRANSLATION or country_id not in names:
+                names[country_id] = common
+        return names
+
+
+def refresh_country_names(countries):
+    """
+    Make the native and translated names of saved countries those of their upstream
+    documents, writing only the names that were added, changed or dropped
+    """
+    wanted = {
+        (country.pk, language[:10], kind): (common[:255], official[:255])
+        for country in countries
+        for language, kind, common, official in country_names(country.raw_data)
+    }
+    stale, changed = [], []
+    for name in CountryName.objects.filter(country_id__in=[country.pk for country in countries]).order_by():
+        key = (name.country_id, name.language, name.kind)
+        if key not in wanted:
+            stale.append(name.pk)
+        elif (name.common, name.official) != wanted[key]:
+            name.common, name.official = wanted.pop(key)
+            changed.append(name)
+        else:
+            del wanted[key]
+    if stale:
+        CountryName.objects.filter(pk__in=stale).delete()
+    if changed:
+        CountryName.objects.bulk_update(changed, ['common', 'official'])
+    CountryName.objects.bulk_create([
+        CountryName(country_id=country_id, language=language, kind=kind, common=common, official=official)
+        for (country_id, language, kind), (common, official) in wanted.items()
+    ])
+
+
+def _upsert_codes(model, fields, values):
+    """
+    Create or update rows of a model keyed by code from {code: (value of each of fields, ...)},
+    writing only those that are new or differ, and return {code: id}
+    """
+    ids, stored = {}, {}
+    for code, pk, *row in model.objects.filter(code__in=values).values_list('code', 'id', *fields):
+        ids[code], stored[code] = pk, tuple(row)
+    changed = [
+        model(code=code, **dict(zip(fields, row))) for code, row in values.items() if stored.get(code) != row
+    ]
+    if changed:
+        model.objects.bulk_create(changed, update_conflicts=True, unique_fields=['code'], update_fields=fields)
+        if any(obj.code not in ids for obj in changed):
+            return dict(model.objects.filter(code__in=values).values_list('code', 'id'))
+    return ids
+
+
+def _link(through, source, target, wanted):
+    """
+    Make the links in a through table from each source id of wanted {source_id: {target_id, ...}}
+    exactly its targets, deleting and inserting only the links that differ
+    """
+    stale = []
+    missing = {source_id: set(targets) for source_id, targets in wanted.items()}
+    for link_id, source_id, target_id in through.objects.filter(
+        **{f"{source}__in": list(wanted)}
+    ).values_list('id', source, target):
+        if target_id in missing[source_id]:
+            missing[source_id].discard(target_id)
+        else:
+            stale.append(link_id)
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    through.objects.bulk_create([
+        through(**{source: source_id, target: target_id})
+        for source_id, targets in missing.items()
+        for target_id in targets
+    ])
+
+
+def refresh_country_relations(countries, borders=True):
+    """
+    Bring the language, currency, localized name and (optionally) border relations
+    of saved countries in line with their JSON fields, using a constant number of
+    queries and writing only the rows that changed.
+    """
+    languages = {}
+    currencies = {}
+    for country in countries:
+        languages.update(normalize_languages(country.languages))
+        currencies.update(normalize_currencies(country.currencies))
+
+    language_ids = _upsert_codes(
+        Language, ['name', 'name_key'], {code: (name, name.lower()) for code, name in languages.items()}
+    )
+    _link(Country.spoken_languages.through, 'country_id', 'language_id', {
+        country.pk: {language_ids[code] for code in normalize_languages(country.languages)}
+        for country in countries
+    })
+
+    currency_ids = _upsert_codes(Currency, ['name', 'name_key', 'symbol'], {
+        code: (name, name.lower(), symbol) for code, (name, symbol) in currencies.items()
+    })
+    _link(Country.used_currencies.through, 'country_id', 'currency_id', {
+        country.pk: {currency_ids[code] for code in normalize_currencies(country.currencies)}
+        for country in countries
+    })
+
+    refresh_country_names(countries)
+
+    if borders:
+        link_borders({country.pk: country.borders for country in countries})
+
+
+def link_borders(country_borders, code_to_id=None):
+    """
+    Make the neighbour links of countries given as {country_id: [cca3, ...]} those
+    borders. Border codes that do not match a stored country are ignored.
+    """
+    if code_to_id is None:
+        codes = {code for borders in country_borders.values() for code in borders or []}
+        code_to_id = dict(Country.objects.filter(cca3__in=codes).values_list('cca3', 'id'))
+    _link(Country.neighbours.through, 'from_country_id', 'to_country_id', {
+        country_id: {code_to_id[code] for code in borders or [] if code_to_id.get(code, country_id) != country_id}
+        for country_id, borders in country_borders.items()
+    })
+
+
+class SyncState(models.Model):
+    """Validators of the last successful sync from an upstream source"""
+    source = models.CharField(max_length=500, unique=True)
+    etag = models.CharField(max_length=255, blank=True, default='')
+    last_modified = models.CharField(max_length=64, blank=True, default='')
+    body_hash = models.CharField(max_length=64, blank=True, default='')
+    synced_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.source
+
+
+class DatasetVersion(models.Model):
+    """
+    Version of the country dataset, a single row shared by every process. Writes
+    bump it in their own transaction; cached responses, HTTP validators and the
+    per-process catalog and indexes are keyed on it.
+    """
+    version = models.BigIntegerField(default=0)
+    modified = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Dataset version {self.version}"
+
+
+class PopulationStats(models.Model):
+    """Precomputed figures of a group of countries, kept current by stats.refresh_region_stats"""
+    country_count = models.PositiveIntegerField(default=0)
+    total_population = models.BigIntegerField(default=0)
+    average_population = models.FloatField(default=0)
+    language_count = models.PositiveIntegerField(default=0)  # Distinct languages spoken
+    currency_count = models.PositiveIntegerField(default=0)  # Distinct currencies used
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+
+class RegionStats(PopulationStats):
+    region = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ['region']
+        verbose_name_plural = 'Region stats'
+
+    def __str__(self):
+        return self.region
+
+
+class SubregionStats(PopulationStats):
+    region = models.CharField(max_length=100)
+    subregion = models.CharField(max_length=100, blank=True)
+
+    class Meta:
+        ordering = ['region', 'subregion']
+        verbose_name_plural = 'Subregion stats'
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'subregion'], name='unique_subregion_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.region} / {self.subregion}"
+
+
+class RequestProfile(models.Model):
+    """cProfile statistics and SQL trace of one profiled request, recorded by ProfilingMiddleware"""
+    TRIGGER_CHOICES = [
+        ('header', 'X-Profile header'),
+        ('query', 'Query flag'),
+        ('sample', 'Sampled'),
+    ]
+    
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Sent in X-Profile-Id before the profile is stored; empty for profiles recorded before it existed
+    request_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    route = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    query_ms = models.FloatField(default=0)
+    stats = models.TextField()  # pstats report, sorted by cumulative time
+    queries = JSONField(default=list)  # [{'sql', 'params', 'ms', 'many'}] in execution order
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class APIToken(models.Model):
+    """
+    API key of a user. Only the SHA-256 digest of the key is stored: keys are
+    random and long, so a fast digest is as safe as a password hash here and
+    costs microseconds to check.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, blank=True)
+    prefix = models.CharField(max_length=8, db_index=True)  # Start of the key, to tell keys apart
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'API token'
+    
+    def __str__(self):
+        return f"{self.prefix}... ({self.user})"
+    
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+    
+    @classmethod
+    def create_token(cls, user, name='', expires_at=None):
+        """Create a token for user and return it with its key, which is not stored and cannot be shown again"""
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(
+            user=user, name=name, prefix=key[:8], key_hash=cls.hash_key(key), expires_at=expires_at,
+        )
+        return token, key
+    
+    @property
+    def is_active(self):
+        return self.revoked_at is None and (self.expires_at is None or self.expires_at > timezone.now())
+    
+    def revoke(self):
+        if self.revoked_at is None:
+            self.revoked_at = timezone.now()
+            self.save(update_fields=['revoked_at'])
@@ -0,0 +1,192 @@
+"""
+Pagination for the country API and the HTML country list.
+
+Page-number pagination runs a COUNT(*) and an OFFSET scan that grows with the
+page number. Keyset (cursor) pagination instead continues after the
+(name, id) of the last row shown, which the composite index on those columns
+answers directly, so every page costs the same as the first.
+
+Keyset pagination is opt-in: set COUNTRIES_PAGINATION = 'cursor' or pass
+?pagination=cursor. Cursors are opaque, and the total count is only computed
+when ?count=true is given. Search results keep page numbers, because they are
+ordered by relevance rather than by name.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .catalog import CountryCatalog
+from .models import Country
+
+MODE_PARAM = 'pagination'
+CURSOR_PARAM = 'cursor'
+COUNT_PARAM = 'count'
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(name, pk, reverse=False):
+    """Return the opaque cursor of the position just after (or before, if reverse) a row"""
+    payload = json.dumps([name, pk, int(reverse)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (name, pk, reverse) from a cursor, raising InvalidCursor if it is malformed"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        name, pk, reverse = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if not isinstance(name, str) or not isinstance(pk, int) or reverse not in (0, 1):
+        raise InvalidCursor(cursor)
+    return name, pk, bool(reverse)
+
+
+def cursor_mode(params):
+    """Return True when keyset pagination was requested through params or settings"""
+    if params.get(CURSOR_PARAM):
+        return True
+    mode = params.get(MODE_PARAM) or getattr(settings, 'COUNTRIES_PAGINATION', 'page')
+    return mode == 'cursor'
+
+
+def wants_count(params):
+    return params.get(COUNT_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+class KeysetPage:
+    """A page of rows with the cursors of its neighbouring pages"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _position(row):
+    """Return the (name, pk) of a model instance or a values() row"""
+    if isinstance(row, dict):
+        return row['name'], row['id']
+    return row.name, row.pk
+
+
+def keyset_page(queryset, cursor=None, page_size=10, with_count=False):
+    """Return the page of queryset, or of a CountryCatalog, ordered by (name, id), that starts at cursor"""
+    if isinstance(queryset, CountryCatalog):
+        return _catalog_keyset_page(queryset, cursor, page_size, with_count)
+    count = queryset.count() if with_count else None
+    if not cursor:
+        rows = list(queryset.order_by('name', 'id')[:page_size + 1])
+        has_next, has_previous, reverse = len(rows) > page_size, False, False
+    else:
+        name, pk, reverse = decode_cursor(cursor)
+        if reverse:
+            queryset = queryset.filter(Q(name__lt=name) | Q(name=name, id__lt=pk)).order_by('-name', '-id')
+        else:
+            queryset = queryset.filter(Q(name__gt=name) | Q(name=name, id__gt=pk)).order_by('name', 'id')
+        rows = list(queryset[:page_size + 1])
+        # The page we came from is always there; whether there is one beyond is what the extra row tells
+        has_more = len(rows) > page_size
+        has_next, has_previous = (True, has_more) if reverse else (has_more, True)
+    rows = rows[:page_size]
+    if reverse:
+        rows.reverse()
+    return _keyset_page(rows, has_next, has_previous, count)
+
+
+def _catalog_keyset_page(catalog, cursor, page_size, with_count):
+    """keyset_page over the rows of the catalog, which are in the database's (name, id) order"""
+    count = len(catalog) if with_count else None
+    if not cursor:
+        start, end = 0, page_size
+        has_next, has_previous = len(catalog) > page_size, False
+    else:
+        name, pk, reverse = decode_cursor(cursor)
+        position = catalog.position(pk)
+        if position is None or catalog.keys[position] != (name, pk):
+            # The row was renamed or deleted; only the database collation can place its key among the others
+            position = Country.objects.filter(Q(name__lt=name) | Q(name=name, id__lt=pk)).count()
+        elif not reverse:
+            position += 1
+        if reverse:
+            end = position
+            start = max(0, end - page_size)
+            has_next, has_previous = True, start > 0
+        else:
+            start = position
+            end = start + page_size
+            has_next, has_previous = end < len(catalog), True
+    return _keyset_page(list(catalog.records[start:end]), has_next, has_previous, count)
+
+
+def _keyset_page(rows, has_next, has_previous, count):
+    if not rows:
+        return KeysetPage(rows, count=count)
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(*_position(rows[-1])) if has_next else None,
+        previous_cursor=encode_cursor(*_position(rows[0]), reverse=True) if has_previous else None,
+        count=count,
+    )
+
+
+class CountryPagination(PageNumberPagination):
+    """Page-number pagination with an opt-in keyset mode"""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        self.keyset = cursor_mode(params) and not params.get('search')
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        try:
+            self.page = keyset_page(
+                queryset, params.get(CURSOR_PARAM), self.get_page_size(request), with_count=wants_count(params)
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor.')
+        return list(self.page)
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        response = {}
+        if self.page.count is not None:
+            response['count'] = self.page.count
+        response['next'] = self.get_cursor_link(self.page.next_cursor)
+        response['previous'] = self.get_cursor_link(self.page.previous_cursor)
+        response['results'] = data
+        return Response(response)
+
+    def get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, CURSOR_PARAM, cursor)
@@ -0,0 +1,237 @@
+"""
+On-demand request profiling.
+
+ProfilingMiddleware runs a request under cProfile and records its SQL
+queries. A staff user triggers it for one request by sending an `X-Profile: 1`
+header or adding `?_profile=1`; it can also profile one request in every
+COUNTRIES_PROFILE_SAMPLE_RATE. The result is stored as a RequestProfile,
+browsable in the Django admin, and its id is returned in the X-Profile-Id
+header; only the latest COUNTRIES_PROFILE_KEEP profiles are kept. A request
+that is not profiled costs a header and query string lookup and, with
+sampling on, a counter increment.
+
+Staff users are recognized through the API's authentication classes, so a
+token works as well as a session. The report is formatted and stored when the
+server closes the response, once it has been sent, not while the client waits
+for it.
+
+The middleware runs in the handler's mode. Under ASGI it runs the view itself
+from process_view, so the view is profiled in the worker thread it runs on;
+only the view is profiled there, not the middleware below this one. Queries are traced on every
+connection, whichever thread runs them.
+"""
+import cProfile
+import io
+import itertools
+import pstats
+import time
+import uuid
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .metrics import add_execute_wrapper, route_name
+from .models import RequestProfile
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+# Functions listed in a stored report
+STATS_LINES = 80
+# SQL statements, and characters of each, kept in a stored trace
+MAX_QUERIES = 500
+MAX_SQL_LENGTH = 5000
+
+
+class SQLTrace:
+    """Database execute wrapper keeping each query's SQL, parameters and duration"""
+
+    def __init__(self):
+        self.queries = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.queries) < MAX_QUERIES:
+                self.queries.append({
+                    'sql': sql[:MAX_SQL_LENGTH],
+                    'params': repr(params)[:MAX_SQL_LENGTH],
+                    'ms': round(elapsed * 1000, 3),
+                    'many': many,
+                })
+
+
+def stats_report(profiler):
+    """Return the pstats report of a profiler, most cumulative time first"""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(STATS_LINES)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """Profile requests flagged by a staff user, and a sample of all requests"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'COUNTRIES_PROFILE_SAMPLE_RATE', 0)
+        self.keep = getattr(settings, 'COUNTRIES_PROFILE_KEEP', 500)
+        self.counter = itertools.count(1)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # The view runs in a worker thread, so it is profiled there
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        trigger, user = self.trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        trace = SQLTrace()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        token = _trace.set(trace)
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            _trace.reset(token)
+        return self.finish(request, response, trigger, user, profiler, trace, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        trigger = self.flag(request)
+        # Resolving the user may query the database, so only flagged requests pay for a thread hop
+        user = await sync_to_async(staff_user)(request) if trigger is not None else None
+        if user is None:
+            trigger = self.sample()
+        if trigger is None:
+            return await self.get_response(request)
+
+        trace = SQLTrace()
+        request._profiler = profiler = cProfile.Profile()
+        start = time.perf_counter()
+        token = _trace.set(trace)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _trace.reset(token)
+        return self.finish(request, response, trigger, user, profiler, trace, time.perf_counter() - start)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        """Call the view of a profiled request under its profiler, in the thread the view runs on"""
+        profiler = getattr(request, '_profiler', None)
+        if profiler is None:
+            return None
+        return await sync_to_async(profiler.runcall)(view_func, request, *view_args, **view_kwargs)
+
+    def finish(self, request, response, trigger, user, profiler, trace, duration):
+        """Tag the response with the profile id and store the profile when the server closes the response"""
+        request_id = uuid.uuid4()
+        close = response.close
+
+        # Servers close a response once it is sent: WSGI in its thread, ASGI through sync_to_async
+        def store_and_close():
+            try:
+                self.store(request, response.status_code, request_id, trigger, user, profiler, trace, duration)
+            finally:
+                close()
+
+        response.close = store_and_close
+        response['X-Profile-Id'] = str(request_id)
+        return response
+
+    def store(self, request, status_code, request_id, trigger, user, profiler, trace, duration):
+        """Save a profile and prune the old ones"""
+        if user is None:
+            user = getattr(request, 'user', None)
+        RequestProfile.objects.create(
+            request_id=request_id,
+            method=request.method,
+            path=request.get_full_path()[:2000],
+            route=route_name(request)[:200],
+            status_code=status_code,
+            user=user if user is not None and user.is_authenticated else None,
+            trigger=trigger,
+            duration_ms=duration * 1000,
+            query_count=trace.count,
+            query_ms=trace.seconds * 1000,
+            stats=stats_report(profiler),
+            queries=trace.queries,
+        )
+        self.prune()
+
+    def prune(self):
+        """Delete all but the latest COUNTRIES_PROFILE_KEEP profiles"""
+        stale = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[self.keep:self.keep + 1]
+        if stale:
+            RequestProfile.objects.filter(id__lte=stale[0]).delete()
+
+    def flag(self, request):
+        """Return the trigger a request asks for, or None"""
+        if request.META.get(PROFILE_HEADER) == '1':
+            return 'header'
+        if request.GET.get(PROFILE_PARAM) == '1':
+            return 'query'
+        return None
+
+    def sample(self):
+        """Return 'sample' for one request in every COUNTRIES_PROFILE_SAMPLE_RATE, else None"""
+        if self.sample_rate and next(self.counter) % self.sample_rate == 0:
+            return 'sample'
+        return None
+
+    def trigger(self, request):
+        """Return why this request is profiled, or None, and the staff user who asked for it"""
+        trigger = self.flag(request)
+        user = staff_user(request) if trigger is not None else None
+        if user is None:
+            return self.sample(), None
+        return trigger, user
+
+
+def staff_user(request):
+    """Return the staff user making a request, authenticated like the API would, or None"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        # Token and basic authentication only run inside DRF views, after this middleware
+        user = None
+        api_request = Request(request)
+        for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+            try:
+                authenticated = authentication().authenticate(api_request)
+            except APIException:
+                return None
+            if authenticated is not None:
+                user = authenticated[0]
+                break
+    return user if user is not None and user.is_authenticated and user.is_staff else None
+
+
+# SQL trace of the request being profiled
+_trace = ContextVar('countries_sql_trace', default=None)
+
+
+def _trace_query(execute, sql, params, many, context):
+    trace = _trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    return trace(execute, sql, params, many, context)
+
+
+add_execute_wrapper(_trace_query)
+
@@ -0,0 +1,423 @@
+"""
+In-process ranked search over country names and codes.
+
+The index keeps accent- and case-folded copies of each country's name,
+official name, codes, alternate spellings and native and translated names
+(the CountryName table), with a trigram inverted index
+for substring matches and a sorted token list for short prefix queries.
+Results are ranked exact match > prefix > word prefix > substring, weighted by
+the field that matched, instead of the alphabetical order of an icontains
+query.
+
+The process keeps one index per dataset version (see cache.py), built on
+first use after the version changes and published as a (version, index)
+pair, so a search never waits on a lock or on another thread's rebuild.
+"""
+import bisect
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import filters
+
+from .cache import get_dataset_version
+from .models import Country, CountryName
+
+# Fields searched by the search action and the HTML list view
+NAME_FIELDS = ('codes', 'name', 'official_name', 'alt_spellings', 'translations')
+# Fields searched by the API SearchFilter (?search=...)
+ALL_FIELDS = NAME_FIELDS + ('region', 'subregion')
+
+# Score of an (exact, prefix, word prefix, substring) match per field
+FIELD_WEIGHTS = {
+    'codes': (100, 0, 0, 0),
+    'name': (90, 60, 40, 20),
+    'official_name': (80, 50, 30, 10),
+    'alt_spellings': (70, 45, 25, 8),
+    'translations': (65, 42, 22, 7),
+    'region': (15, 6, 5, 2),
+    'subregion': (15, 6, 5, 2),
+}
+
+# Fields whose values, and the words of whose values, fuzzy search matches
+FUZZY_FIELDS = ('name', 'alt_spellings')
+# Shortest term or name word fuzzy search matches
+MIN_FUZZY_LENGTH = 4
+FUZZY_PARAM = 'fuzzy'
+
+# Most ranked ids sent to the database in one query
+RANK_WINDOW = 500
+
+
+def normalize(text):
+    """Case-fold, strip accents and collapse punctuation to single spaces"""
+    text = unicodedata.normalize('NFKD', str(text or '')).casefold()
+    chars = [char if char.isalnum() else ' ' for char in text if not unicodedata.combining(char)]
+    return ' '.join(''.join(chars).split())
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def padded_trigrams(text):
+    """Trigrams of text padded with two markers on each side, with repeats"""
+    padded = f"$${text}$$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def max_edits(term):
+    """Edits fuzzy search tolerates in a query: none below 4 characters, 1 below 9, else 2"""
+    if len(term) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(term) < 9 else 2
+
+
+def edit_distance(a, b, limit):
+    """Damerau-Levenshtein (optimal string alignment) distance of a and b, or limit + 1 if it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Common prefixes and suffixes never change the distance, and typos leave most of a name alone
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end = 0
+    while end < len(a) - start and end < len(b) - start and a[-1 - end] == b[-1 - end]:
+        end += 1
+    a, b = a[start:len(a) - end], b[start:len(b) - end]
+    if not a or not b:
+        return len(a) + len(b)
+    # Only cells within limit of the diagonal can stay within limit
+    over = limit + 1
+    before, previous = None, [min(j, over) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, before[j - 2] + 1)
+            current[j] = distance
+        if min(current) > limit:
+            return over
+        before, previous = previous, current
+    return min(previous[-1], over)
+
+
+def wants_fuzzy(params):
+    return params.get(FUZZY_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+class SearchIndex:
+    """Inverted index of countries keyed by id, not changed once build() returns it"""
+
+    def __init__(self):
+        self.documents = {}
+        self.trigram_postings = defaultdict(set)
+        self.token_postings = defaultdict(set)
+        self._sorted_tokens = None
+        self.fuzzy_term_ids = defaultdict(set)
+        self.fuzzy_postings = defaultdict(set)
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Build an index from (id, name, official_name, cca2, cca3, alt_spellings, region, subregion[, translations])
+        rows, translations being the native and translated names of the country
+        """
+        index = cls()
+        for row in rows:
+            index.add(*row)
+        index._sorted_tokens = sorted(index.token_postings)
+        return index
+
+    def add(self, country_id, name, official_name, cca2, cca3, alt_spellings=(), region='', subregion='',
+            translations=()):
+        """Index a country, replacing any previous version of it"""
+        document = {
+            'sort_name': normalize(name),
+            'codes': [normalize(code) for code in (cca2, cca3) if code],
+            'name': [normalize(name)],
+            'official_name': [normalize(official_name)],
+            'alt_spellings': [normalize(spelling) for spelling in alt_spellings or []],
+            'region': [normalize(region)],
+            'subregion': [normalize(subregion)],
+            'translations': list(dict.fromkeys(filter(None, map(normalize, translations or [])))),
+        }
+        self.remove(country_id)
+        self.documents[country_id] = document
+        for value in self._values(document):
+            for trigram in trigrams(value):
+                self.trigram_postings[trigram].add(country_id)
+            for token in value.split():
+                self.token_postings[token].add(country_id)
+        for term in self._fuzzy_terms(document):
+            if not self.fuzzy_term_ids[term]:
+                for trigram in padded_trigrams(term):
+                    self.fuzzy_postings[trigram].add(term)
+            self.fuzzy_term_ids[term].add(country_id)
+        self._sorted_tokens = None
+
+    def remove(self, country_id):
+        """Drop a country from the index"""
+        document = self.documents.pop(country_id, None)
+        if document is None:
+            return
+        for value in self._values(document):
+            for trigram in trigrams(value):
+                self._discard(self.trigram_postings, trigram, country_id)
+            for token in value.split():
+                self._discard(self.token_postings, token, country_id)
+        for term in self._fuzzy_terms(document):
+            self._discard(self.fuzzy_term_ids, term, country_id)
+            if term not in self.fuzzy_term_ids:
+                for trigram in padded_trigrams(term):
+                    self._discard(self.fuzzy_postings, trigram, term)
+        self._sorted_tokens = None
+
+    def search(self, query, fields=NAME_FIELDS):
+        """Return matching country ids, best match first"""
+        term = normalize(query)
+        if not term:
+            return []
+        scores = {}
+        for country_id in self._candidates(term):
+            document = self.documents[country_id]
+            score = max((self._score(document[field], term, field) for field in fields), default=0)
+            if score:
+                scores[country_id] = score
+        return sorted(scores, key=lambda country_id: (-scores[country_id], self.documents[country_id]['sort_name']))
+
+    def fuzzy_search(self, query):
+        """Return ids of countries with a name (or name word) or alternate spelling near query, closest first"""
+        term = normalize(query)
+        limit = max_edits(term)
+        if not limit:
+            return []
+        grams = padded_trigrams(term)
+        rarest = sorted(grams, key=lambda trigram: len(self.fuzzy_postings.get(trigram, ())))
+        candidates = set().union(*(self.fuzzy_postings.get(trigram, ()) for trigram in rarest[:4 * limit + 1]))
+        # Count filter: a term within limit edits still has all but 4 * limit of the query's trigrams
+        query_grams = set(grams)
+        shared = len(query_grams) - 4 * limit
+        distances = {}
+        for candidate in candidates:
+            if abs(len(candidate) - len(term)) > limit:
+                continue
+            if len(query_grams.intersection(padded_trigrams(candidate))) < shared:
+                continue
+            distance = edit_distance(term, candidate, limit)
+            if distance <= limit:
+                for country_id in self.fuzzy_term_ids[candidate]:
+                    distances[country_id] = min(distance, distances.get(country_id, distance))
+        return sorted(
+            distances, key=lambda country_id: (distances[country_id], self.documents[country_id]['sort_name'])
+        )
+
+    def _candidates(self, term):
+        if len(term) >= 3:
+            postings = [self.trigram_postings.get(trigram) for trigram in trigrams(term)]
+            if not all(postings):
+                return set()
+            postings.sort(key=len)
+            return set(postings[0]).intersection(*postings[1:])
+        # Too short for trigrams: match tokens starting with the term
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.token_postings)
+        candidates = set()
+        position = bisect.bisect_left(self._sorted_tokens, term)
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(term):
+            candidates |= self.token_postings[self._sorted_tokens[position]]
+            position += 1
+        return candidates
+
+    @staticmethod
+    def _score(values, term, field):
+        exact, prefix, word_prefix, substring = FIELD_WEIGHTS[field]
+        best = 0
+        for value in values:
+            if value == term:
+                return exact
+            if value.startswith(term):
+                best = max(best, prefix)
+            elif f" {term}" in f" {value}":
+                best = max(best, word_prefix)
+            elif len(term) >= 3 and term in value:
+                best = max(best, substring)
+        return best
+
+    @staticmethod
+    def _values(document):
+        for field in FIELD_WEIGHTS:
+            yield from document[field]
+
+    @staticmethod
+    def _fuzzy_terms(document):
+        terms = set()
+        for field in FUZZY_FIELDS:
+            for value in document[field]:
+                terms.add(value)
+                terms.update(value.split())
+        return {term for term in terms if len(term) >= MIN_FUZZY_LENGTH}
+
+    @staticmethod
+    def _discard(postings, key, country_id):
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(country_id)
+            if not ids:
+                del postings[key]
+
+
+_current = None  # (dataset version, index), replaced as a whole
+_lock = threading.Lock()
+
+
+def _translations():
+    """Return {country_id: [name, ...]} of the native and translated names of countries"""
+    translations = defaultdict(list)
+    for country_id, common, official in CountryName.objects.order_by().values_list('country_id', 'common', 'official'):
+        translations[country_id] += [common, official]
+    return translations
+
+
+def _index_rows():
+    translations = _translations()
+    for row in Country.objects.order_by().values_list(
+        'id', 'name', 'official_name', 'cca2', 'cca3', 'alt_spellings', 'region', 'subregion'
+    ):
+        yield row + (translations.get(row[0], ()),)
+
+
+def get_index():
+    """Return the process-wide index, rebuilding it when the dataset version changed"""
+    global _current
+    version = get_dataset_version()
+    current = _current
+    if current is not None and current[0] == version:
+        return current[1]
+    with _lock:
+        if _current is None or _current[0] != version:
+            _current = (version, SearchIndex.build(_index_rows()))
+        return _current[1]
+
+
+def invalidate_index():
+    """Force a rebuild on next use"""
+    global _current
+    _current = None
+
+
+def ranked_ids(query, fields=NAME_FIELDS, fuzzy=False):
+    """Return the ids of countries matching query, best match first, then with fuzzy the near misses"""
+    index = get_index()
+    ids = index.search(query, fields)
+    if fuzzy:
+        found = set(ids)
+        ids += [country_id for country_id in index.fuzzy_search(query) if country_id not in found]
+    return ids
+
+
+class RankedResults:
+    """
+    The countries of a queryset in the order of a list of ranked ids.
+
+    Counting and slicing work on the ids in Python, so a page of results only
+    queries the ids on it, and iterating queries RANK_WINDOW ids at a time;
+    the database never receives the whole list of matches. map() transforms
+    the underlying queryset.
+    """
+
+    def __init__(self, queryset, ids):
+        self.queryset = queryset
+        self.ids = list(ids)
+        self._result_cache = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def count(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return RankedResults(self.queryset, self.ids[key])
+        rows = list(RankedResults(self.queryset, [self.ids[key]]))
+        if not rows:
+            raise IndexError(key)
+        return rows[0]
+
+    def map(self, function):
+        """Return these results with function applied to their queryset, e.g. country_list_values"""
+        return RankedResults(function(self.queryset), self.ids)
+
+    def __iter__(self):
+        if self._result_cache is None:
+            self._result_cache = [row for ids in self._windows() for row in self._ranked(ids, self._window(ids))]
+        return iter(self._result_cache)
+
+    def _windows(self):
+        for start in range(0, len(self.ids), RANK_WINDOW):
+            yield self.ids[start:start + RANK_WINDOW]
+
+    def _window(self, ids):
+        return self.queryset.filter(id__in=ids).order_by()
+
+    @staticmethod
+    def _ranked(ids, rows):
+        positions = {country_id: position for position, country_id in enumerate(ids)}
+        return sorted(rows, key=lambda row: positions[row['id'] if isinstance(row, dict) else row.pk])
+
+
+def rank_queryset(queryset, ids):
+    """Return the countries of queryset with the given ids, in the order of the list"""
+    return RankedResults(queryset, ids)
+
+
+def search_countries(query, queryset=None, fields=NAME_FIELDS, fuzzy=False):
+    """Return a queryset of countries matching query, ordered by relevance"""
+    queryset = Country.objects.all() if queryset is None else queryset
+    return rank_queryset(queryset, ranked_ids(query, fields, fuzzy))
+
+
+def ranked_ids_all_terms(terms, fields=ALL_FIELDS):
+    """Return the ids of countries matching every term, best combined rank first"""
+    index = get_index()
+    ids = None
+    scores = {}
+    for term in terms:
+        matches = index.search(term, fields)
+        for position, country_id in enumerate(matches):
+            scores[country_id] = scores.get(country_id, 0) + position
+        ids = set(matches) if ids is None else ids & set(matches)
+    return sorted(ids, key=scores.get)
+
+
+class RankedSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the in-process index; every search term must match.
+    The view's search_fields name the index fields searched (see FIELD_WEIGHTS),
+    ALL_FIELDS when it has none; DRF lookup prefixes are ignored, as every
+    field is ranked. The list action gets RankedResults, other actions a
+    queryset of the matching countries.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        ids = ranked_ids_all_terms(terms, self.get_index_fields(view, request))
+        if getattr(view, 'action', None) != 'list':
+            # Actions that filter further (export) or look up one country need a queryset, not a ranking
+            return queryset.filter(id__in=ids)
+        return rank_queryset(queryset, ids)
+
+    def get_index_fields(self, view, request):
+        fields = [field.lstrip('^=@$') for field in self.get_search_fields(view, request) or ALL_FIELDS]
+        unknown = [field for field in fields if field not in FIELD_WEIGHTS]
+        if unknown:
+            raise ImproperlyConfigured(f"{type(view).__name__}.search_fields names fields the search index "
+                                       f"does not have: {', '.join(unknown)}")
+        return tuple(fields)
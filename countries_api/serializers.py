@@ -1,9 +1,51 @@
+from django.db.models import TextField, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
-from .models import Country
+from .metrics import phase
+from .models import Country, CountryName, Currency, Language, RegionStats, SubregionStats
+from .search import RankedResults
 
-class CountrySerializer(serializers.ModelSerializer):
+# Query parameter selecting the ISO 639-3 language of localized_name
+LANG_PARAM = 'lang'
+
+class TimedListSerializer(serializers.ListSerializer):
+    """ListSerializer that records the time spent building .data in the request metrics"""
+    
+    @property
+    def data(self):
+        with phase('serialize'):
+            return super().data
+
+class TimedSerializerMixin:
+    """Record the time spent building .data in the request metrics"""
+    
+    @property
+    def data(self):
+        with phase('serialize'):
+            return super().data
+
+class LanguageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Language
+        fields = ['code', 'name']
+
+class CurrencySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Currency
+        fields = ['code', 'name', 'symbol']
+
+class NeighbourSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Country
+        fields = ['id', 'name', 'cca3']
+
+class CountrySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     capital = serializers.SerializerMethodField()
     primary_timezone = serializers.SerializerMethodField()
+    spoken_languages = LanguageSerializer(many=True, read_only=True)
+    used_currencies = CurrencySerializer(many=True, read_only=True)
+    neighbours = NeighbourSerializer(many=True, read_only=True)
     
     class Meta:
         model = Country
@@ -11,6 +53,7 @@ class CountrySerializer(serializers.ModelSerializer):
             'id', 'name', 'official_name', 'cca2', 'cca3', 'flag',
             'region', 'subregion', 'population', 'capital', 'primary_timezone',
             'languages', 'currencies', 'borders', 'timezones', 'capitals',
+            'spoken_languages', 'used_currencies', 'neighbours',
             'created_at', 'updated_at'
         ]
     
@@ -25,11 +68,34 @@ class CountryListSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Country
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name', 'cca2', 'flag', 'region', 'population', 'capital']
     
     def get_capital(self, obj):
         return obj.get_capital()
 
+# Keys of CountryListSerializer output, in order
+COUNTRY_LIST_FIELDS = ('id', 'name', 'cca2', 'flag', 'region', 'population', 'capital')
+
+def country_list_values(queryset):
+    """
+    Fast equivalent of CountryListSerializer(queryset, many=True).data: selects
+    only the listed columns as values() dicts, with Country.get_capital()
+    computed by the database, so no model instances or field callbacks are built.
+    """
+    if isinstance(queryset, RankedResults):
+        return queryset.map(country_list_values)
+    capital = Coalesce(KT('capitals__0'), Value("N/A"), output_field=TextField())
+    return queryset.annotate(capital=capital).values(*COUNTRY_LIST_FIELDS)
+
+def add_localized_names(rows, language):
+    """Set 'localized_name' on country dicts to their name in an ISO 639-3 language, or their common name"""
+    names = CountryName.localized([row['id'] for row in rows], language)
+    for row in rows:
+        row['localized_name'] = names.get(row['id'], row['name'])
+    return rows
+
+
 class CountryCreateUpdateSerializer(serializers.ModelSerializer): 
     class Meta:
         model = Country
@@ -40,12 +106,16 @@ class CountryCreateUpdateSerializer(serializers.ModelSerializer):
         ]
     
     def create(self, validated_data):
-        return Country.objects.create(**validated_data)
+        country = Country.objects.create(**validated_data)
+        country.refresh_relations()
+        return country
     
     def update(self, instance, validated_data):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
+        if {'languages', 'currencies', 'borders'} & set(validated_data):
+            instance.refresh_relations()
         return instance
 
 class CountryPaginationSerializer(serializers.ModelSerializer):
@@ -58,3 +128,21 @@ class CountryPaginationSerializer(serializers.ModelSerializer):
     
     def get_capital(self, obj):
         return obj.get_capital()
+
+class RegionStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RegionStats
+        list_serializer_class = TimedListSerializer
+        fields = [
+            'region', 'country_count', 'total_population', 'average_population',
+            'language_count', 'currency_count', 'updated_at'
+        ]
+
+class SubregionStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SubregionStats
+        list_serializer_class = TimedListSerializer
+        fields = [
+            'region', 'subregion', 'country_count', 'total_population', 'average_population',
+            'language_count', 'currency_count', 'updated_at'
+        ]
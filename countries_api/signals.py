@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import token_cache
+from .cache import bump_dataset_version_on_commit
+from .catalog import invalidate_catalog
+from .models import APIToken, Country
+from .stats import refresh_region_stats_on_commit
+
+
+# Other processes rebuild theirs once the dataset version is bumped on commit
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def drop_catalog(sender, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def refresh_region_stats(sender, instance, **kwargs):
+    refresh_region_stats_on_commit([instance.region, getattr(instance, '_loaded_region', None)])
+
+
+# Connected last, so the version is bumped after the other receivers' on-commit work
+@receiver(post_save, sender=Country)
+@receiver(post_delete, sender=Country)
+def invalidate_cached_responses(sender, **kwargs):
+    bump_dataset_version_on_commit()
+
+
+@receiver(post_save, sender=APIToken)
+@receiver(post_delete, sender=APIToken)
+def evict_cached_token(sender, instance, **kwargs):
+    token_cache.evict(token_id=instance.pk)
+
+
+# A user who is deactivated or deleted loses their cached tokens at once in this process
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def evict_cached_user_tokens(sender, instance, **kwargs):
+    token_cache.evict(user_id=instance.pk)
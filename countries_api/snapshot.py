@@ -0,0 +1,310 @@
+"""
+Memory-mapped columnar snapshot of the country catalog.
+
+The sync command writes the catalog to COUNTRIES_SNAPSHOT_PATH in a compact
+binary format, and every worker maps that file read-only instead of building
+its own catalog from the database. All workers then share one page-cache copy
+of the data, and a new worker serves from it as soon as it has read the
+header. The file is replaced with an atomic rename, so a worker either maps
+the old snapshot or the new one, never a partial write; a mapping of the old
+file stays valid until its last reader lets go of it.
+
+Layout (native byte order, all sections 8-byte aligned):
+- header: magic, format version, byte order, dataset version, country count
+  and a directory of named sections;
+- columns, one row per country in (name, id) order: ids and populations as
+  64-bit integers, name, cca2, cca3, flag and region as UTF-8 strings behind
+  an offset table, and the remaining fields as one JSON document per row;
+- indexes: sorted ids with their rows, and for cca2, cca3, region, subregion,
+  language and currency a sorted key table with posting lists of rows.
+
+A snapshot is only used while its dataset version is current, so API writes
+made after the sync are never hidden by it.
+"""
+import array
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from datetime import datetime
+
+from .cache import get_dataset_version
+from .catalog import RECORD_FIELDS, CountryCatalog, CountryRecord
+
+MAGIC = b'CTRYSNAP'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHQII')  # magic, format, byte order, dataset version, count, sections
+SECTION = struct.Struct('<32sQQ')  # name, offset, length
+BYTE_ORDER = 1 if sys.byteorder == 'little' else 2
+
+# Indexes by string key, and the attribute of CountryCatalog each one stands in for
+INDEXES = {
+    'cca2': 'by_cca2', 'cca3': 'by_cca3', 'region': 'by_region', 'subregion': 'by_subregion',
+    'language': 'by_language', 'currency': 'by_currency',
+}
+STRING_COLUMNS = ('name', 'cca2', 'cca3', 'flag', 'region')
+# Fields kept in each row's JSON document
+DETAIL_FIELDS = (
+    'official_name', 'subregion', 'languages', 'timezones', 'capitals', 'currencies', 'borders', 'alt_spellings',
+    'spoken_languages', 'used_currencies', 'neighbours',
+)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _string_table(values):
+    """Return the offsets array and UTF-8 blob of a list of strings"""
+    offsets = array.array('I', [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode('utf-8')
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+def write_snapshot(path, catalog, version):
+    """
+    Write catalog as the snapshot of a dataset version to path, replacing any
+    previous file atomically, and return the size of the file.
+    """
+    records = catalog.records
+    row_of = {record.id: row for row, record in enumerate(records)}
+    sections = {
+        'id': array.array('q', (record.id for record in records)),
+        'population': array.array('q', (record.population for record in records)),
+    }
+    for column in STRING_COLUMNS:
+        sections[f"{column}.offsets"], sections[f"{column}.data"] = _string_table(
+            [getattr(record, column) for record in records]
+        )
+    sections['detail.offsets'], sections['detail.data'] = _string_table(
+        json.dumps(
+            dict(
+                {field: getattr(record, field) for field in DETAIL_FIELDS},
+                created_at=record.created_at.isoformat(), updated_at=record.updated_at.isoformat(),
+            ),
+            ensure_ascii=False, separators=(',', ':'),
+        )
+        for record in records
+    )
+
+    ids = sorted(row_of)
+    sections['index.id.keys'] = array.array('q', ids)
+    sections['index.id.rows'] = array.array('I', (row_of[country_id] for country_id in ids))
+    for name, attribute in INDEXES.items():
+        groups = getattr(catalog, attribute)
+        keys = sorted(groups)
+        postings = array.array('I', [0])
+        rows = array.array('I')
+        for key in keys:
+            group = groups[key]
+            rows.extend(row_of[record.id] for record in (group if isinstance(group, tuple) else (group,)))
+            postings.append(len(rows))
+        sections[f"index.{name}.keys.offsets"], sections[f"index.{name}.keys.data"] = _string_table(keys)
+        sections[f"index.{name}.postings"] = postings
+        sections[f"index.{name}.rows"] = rows
+
+    directory_size = HEADER.size + SECTION.size * len(sections)
+    layout = []
+    offset = _align(directory_size)
+    for name, data in sections.items():
+        data = data.tobytes() if isinstance(data, array.array) else data
+        layout.append((name, offset, data))
+        offset = _align(offset + len(data))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, BYTE_ORDER, version, len(records), len(sections)))
+            for name, section_offset, data in layout:
+                f.write(SECTION.pack(name.encode('ascii'), section_offset, len(data)))
+            for name, section_offset, data in layout:
+                f.write(b'\0' * (section_offset - f.tell()))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return offset
+
+
+def _align(offset):
+    return -(-offset // 8) * 8
+
+
+def write_current_snapshot(path):
+    """Write a snapshot of the countries in the database under the current dataset version"""
+    # Read first: a write landing during the build then only makes the snapshot look stale
+    version = get_dataset_version()
+    return write_snapshot(path, CountryCatalog.build(), version)
+
+
+def read_version(path):
+    """Return the dataset version of the snapshot at path, or None if there is no valid one"""
+    try:
+        with open(path, 'rb') as f:
+            magic, format_version, byte_order, version, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    if magic != MAGIC or format_version != FORMAT_VERSION or byte_order != BYTE_ORDER:
+        return None
+    return version
+
+
+class _Strings:
+    """Sequence of the strings of an offset table"""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return str(self.data[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+
+class _Rows:
+    """Sequence of the CountryRecords of a snapshot, built on access"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self.snapshot.record(row) for row in range(*index.indices(self.snapshot.count)))
+        if index < 0:
+            index += self.snapshot.count
+        if not 0 <= index < self.snapshot.count:
+            raise IndexError(index)
+        return self.snapshot.record(index)
+
+
+class _Keys:
+    """Sequence of the (name, id) keys of a snapshot's rows"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def __len__(self):
+        return self.snapshot.count
+
+    def __getitem__(self, row):
+        return self.snapshot.names[row], self.snapshot.ids[row]
+
+
+class _IdIndex:
+    def __init__(self, snapshot, keys, rows):
+        self.snapshot = snapshot
+        self.keys = keys
+        self.rows = rows
+
+    def get(self, country_id, default=None):
+        row = self.row(country_id)
+        return default if row is None else self.snapshot.record(row)
+
+    def row(self, country_id):
+        """Return the row of a country id, or None"""
+        position = bisect.bisect_left(self.keys, country_id)
+        if position == len(self.keys) or self.keys[position] != country_id:
+            return None
+        return self.rows[position]
+
+
+class _KeyIndex:
+    """Mapping of a string key to the records of its posting list"""
+
+    def __init__(self, snapshot, keys, postings, rows, unique=False):
+        self.snapshot = snapshot
+        self.keys = keys
+        self.postings = postings
+        self.rows = rows
+        self.unique = unique
+
+    def get(self, key, default=None):
+        position = bisect.bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return default
+        rows = self.rows[self.postings[position]:self.postings[position + 1]]
+        if self.unique:
+            return self.snapshot.record(rows[0])
+        return tuple(self.snapshot.record(row) for row in rows)
+
+
+class CountrySnapshot(CountryCatalog):
+    """A CountryCatalog read from a memory-mapped snapshot file"""
+    mapped = True
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f"{path} is empty")
+        view = memoryview(self.buffer)
+        try:
+            magic, format_version, byte_order, self.version, self.count, section_count = HEADER.unpack_from(view)
+        except struct.error:
+            raise SnapshotError(f"{path} is not a country snapshot")
+        if magic != MAGIC or format_version != FORMAT_VERSION or byte_order != BYTE_ORDER:
+            raise SnapshotError(f"{path} is not a country snapshot of format {FORMAT_VERSION} in this byte order")
+        sections = {}
+        for index in range(section_count):
+            name, offset, length = SECTION.unpack_from(view, HEADER.size + index * SECTION.size)
+            sections[name.rstrip(b'\0').decode('ascii')] = view[offset:offset + length]
+
+        def integers(name, code):
+            return sections[name].cast(code)
+
+        def strings(name):
+            return _Strings(integers(f"{name}.offsets", 'I'), sections[f"{name}.data"])
+
+        self.ids = integers('id', 'q')
+        self.populations = integers('population', 'q')
+        self.columns = {column: strings(column) for column in STRING_COLUMNS}
+        self.names = self.columns['name']
+        self.details = strings('detail')
+
+        self.records = _Rows(self)
+        self.keys = _Keys(self)
+        self.by_id = _IdIndex(self, integers('index.id.keys', 'q'), integers('index.id.rows', 'I'))
+        for name, attribute in INDEXES.items():
+            setattr(self, attribute, _KeyIndex(
+                self, strings(f"index.{name}.keys"), integers(f"index.{name}.postings", 'I'),
+                integers(f"index.{name}.rows", 'I'), unique=name in ('cca2', 'cca3'),
+            ))
+
+    def __iter__(self):
+        return (self.record(row) for row in range(self.count))
+
+    def position(self, country_id):
+        return self.by_id.row(country_id)
+
+    def record(self, row):
+        """Return the CountryRecord of a row"""
+        detail = json.loads(self.details[row])
+        values = {
+            'id': self.ids[row], 'population': self.populations[row],
+            **{column: strings[row] for column, strings in self.columns.items()},
+            'created_at': datetime.fromisoformat(detail['created_at']),
+            'updated_at': datetime.fromisoformat(detail['updated_at']),
+        }
+        return CountryRecord(
+            [values[field] if field in values else detail[field] for field in RECORD_FIELDS],
+            spoken_languages=tuple(detail['spoken_languages']),
+            used_currencies=tuple(detail['used_currencies']),
+            neighbours=tuple(detail['neighbours']),
+        )
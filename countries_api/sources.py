@@ -0,0 +1,127 @@
+"""
+Incremental readers for country payloads.
+
+The REST Countries payload is one large JSON array. These readers yield one
+country record at a time from a file, an NDJSON dump or a downloaded body, so
+the sync never holds the whole document in memory.
+"""
+import codecs
+import json
+
+# Bytes read from a file or socket at a time
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_json_array(chunks):
+    """Yield the elements of a top-level JSON array from an iterable of byte or text chunks"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    exhausted = False
+    started = False
+
+    def read_more():
+        nonlocal buffer, pos, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer = buffer[pos:] + utf8.decode(b'', final=True)
+        else:
+            if isinstance(chunk, bytes):
+                chunk = utf8.decode(chunk)
+            buffer = buffer[pos:] + chunk
+        pos = 0
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buffer):
+            if exhausted:
+                raise ValueError("Unexpected end of JSON payload")
+            read_more()
+            continue
+
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise ValueError("Expected the payload to be a JSON array")
+            started = True
+            pos += 1
+            continue
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            read_more()
+            continue
+        if end >= len(buffer) and not exhausted:
+            # A scalar may continue in the next chunk, so only accept it once more data is known
+            read_more()
+            continue
+        pos = end
+        yield item
+
+
+def iter_json_fileobj(f, chunk_size=CHUNK_SIZE):
+    """Yield the country records of a JSON array read from a binary file object"""
+    yield from iter_json_array(iter(lambda: f.read(chunk_size), b''))
+
+
+def iter_json_file(path, chunk_size=CHUNK_SIZE):
+    """Yield the country records of a JSON array file"""
+    with open(path, 'rb') as f:
+        yield from iter_json_fileobj(f, chunk_size=chunk_size)
+
+
+def iter_ndjson_file(path):
+    """Yield the country records of a newline-delimited JSON file"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def ndjson_ranges(path, parts):
+    """Split an NDJSON file into at most parts (start, end) byte ranges that begin and end on line boundaries"""
+    with open(path, 'rb') as f:
+        size = f.seek(0, 2)
+        boundaries = [0]
+        for part in range(1, parts):
+            offset = size * part // parts
+            if offset <= boundaries[-1]:
+                continue
+            # Align on the first line that starts at or after offset
+            f.seek(offset - 1)
+            f.readline()
+            boundary = f.tell()
+            if boundary >= size:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+        boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def iter_ndjson_range(path, start, end):
+    """Yield the country records of the lines of an NDJSON file between two byte offsets"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
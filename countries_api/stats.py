@@ -0,0 +1,110 @@
+"""
+Materialized per-region and per-subregion statistics.
+
+RegionStats and SubregionStats hold country counts, total and average
+population and the number of distinct languages and currencies of each region
+and subregion. They are recomputed one region at a time, once the write
+commits: a sync refreshes the regions whose countries it created, changed or
+removed, and a single country write refreshes the regions the country left
+and joined.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Country, RegionStats, SubregionStats
+
+_pending = threading.local()
+
+
+def refresh_region_stats(regions=None):
+    """Recompute the statistics of the given regions (all regions when None) and their subregions"""
+    if regions is None:
+        regions = set(Country.objects.values_list('region', flat=True).distinct().order_by())
+        regions |= set(RegionStats.objects.values_list('region', flat=True))
+    regions = set(regions)
+    if not regions:
+        return
+
+    countries = Country.objects.filter(region__in=regions).annotate(sub=Coalesce('subregion', Value('')))
+    language_links = Country.spoken_languages.through.objects.filter(country__region__in=regions).annotate(
+        region=F('country__region'), sub=Coalesce('country__subregion', Value('')), item=F('language_id'),
+    )
+    currency_links = Country.used_currencies.through.objects.filter(country__region__in=regions).annotate(
+        region=F('country__region'), sub=Coalesce('country__subregion', Value('')), item=F('currency_id'),
+    )
+
+    region_rows = _aggregate(countries, language_links, currency_links, ('region',))
+    subregion_rows = _aggregate(countries, language_links, currency_links, ('region', 'sub'))
+
+    _upsert(RegionStats, [RegionStats(region=key[0], **values) for key, values in region_rows.items()], ['region'])
+    _upsert(
+        SubregionStats,
+        [SubregionStats(region=key[0], subregion=key[1], **values) for key, values in subregion_rows.items()],
+        ['region', 'subregion'],
+    )
+
+    RegionStats.objects.filter(region__in=regions).exclude(region__in=[key[0] for key in region_rows]).delete()
+    stale = [
+        pk for pk, region, subregion in
+        SubregionStats.objects.filter(region__in=regions).values_list('pk', 'region', 'subregion')
+        if (region, subregion) not in subregion_rows
+    ]
+    if stale:
+        SubregionStats.objects.filter(pk__in=stale).delete()
+
+
+def _aggregate(countries, language_links, currency_links, group_by):
+    """Return {group key: field values} for countries grouped by the given annotations"""
+    rows = {}
+    for row in countries.values(*group_by).annotate(
+        country_count=Count('id'), total_population=Coalesce(Sum('population'), 0),
+    ).order_by():
+        key = tuple(row[field] for field in group_by)
+        rows[key] = {
+            'country_count': row['country_count'],
+            'total_population': row['total_population'],
+            'average_population': row['total_population'] / row['country_count'],
+            'language_count': 0,
+            'currency_count': 0,
+        }
+    for links, field in ((language_links, 'language_count'), (currency_links, 'currency_count')):
+        for row in links.values(*group_by).annotate(count=Count('item', distinct=True)).order_by():
+            key = tuple(row[name] for name in group_by)
+            if key in rows:
+                rows[key][field] = row['count']
+    return rows
+
+
+def _upsert(model, objects, unique_fields):
+    if objects:
+        model.objects.bulk_create(
+            objects,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=[
+                'country_count', 'total_population', 'average_population',
+                'language_count', 'currency_count', 'updated_at',
+            ],
+        )
+
+
+def refresh_region_stats_on_commit(regions):
+    """
+    Refresh the given regions once the current transaction commits. Regions
+    queued by several writes in one transaction are refreshed only once.
+    """
+    pending = getattr(_pending, 'regions', None)
+    if pending is None:
+        pending = _pending.regions = set()
+    pending.update(region for region in regions if region is not None)
+    transaction.on_commit(_refresh_pending)
+
+
+def _refresh_pending():
+    regions = getattr(_pending, 'regions', None)
+    _pending.regions = None
+    if regions:
+        refresh_region_stats(regions)
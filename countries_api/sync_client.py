@@ -0,0 +1,105 @@
+"""
+HTTP client used by the country sync.
+
+Downloads go through a pooled requests session with timeouts, bounded retries
+with exponential backoff and gzip negotiation. Requests are made conditional
+on the ETag and Last-Modified of the last successful sync, and the body is
+spooled to a temporary file while it is hashed, so an unchanged payload can be
+detected before any of it is parsed.
+"""
+import hashlib
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (5, 60)
+# Retries for connection errors and 429/5XX responses
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Bodies larger than this are spooled to disk instead of memory
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class Download:
+    """Result of a conditional download"""
+
+    def __init__(self, not_modified=False, etag='', last_modified='', body_hash='', body=None):
+        self.not_modified = not_modified
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.body = body
+
+    def close(self):
+        if self.body is not None:
+            self.body.close()
+
+
+class SyncClient:
+    """Pooled, retrying HTTP client for upstream country payloads"""
+
+    def __init__(self, timeout=TIMEOUT, retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=10):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=['GET'],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def download(self, url, etag='', last_modified=''):
+        """
+        Download url, sending the given validators as conditional headers.
+        Returns a Download whose body is a rewound file object, or which is
+        flagged not_modified when upstream answered 304.
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            if response.status_code == 304:
+                return Download(not_modified=True, etag=etag, last_modified=last_modified)
+            response.raise_for_status()  # Raise exception for 4XX/5XX responses
+
+            digest = hashlib.sha256()
+            body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            try:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    digest.update(chunk)
+                    body.write(chunk)
+            except Exception:
+                body.close()
+                raise
+            body.seek(0)
+            return Download(
+                etag=response.headers.get('ETag', ''),
+                last_modified=response.headers.get('Last-Modified', ''),
+                body_hash=digest.hexdigest(),
+                body=body,
+            )
@@ -0,0 +1,12 @@
+"""Model factories shared by the tests."""
+from countries_api.models import Country
+
+
+def create_country(name, cca2, cca3, region='Test Region', **fields):
+    """Create a country with its language, currency and border relations"""
+    country = Country.objects.create(
+        name=name, official_name=f"Republic of {name}", cca2=cca2, cca3=cca3, region=region,
+        flag=f"https://example.com/{cca2}.png", population=len(name), capitals=[f"{name} City"], **fields,
+    )
+    country.refresh_relations()
+    return country
@@ -0,0 +1,134 @@
+import base64
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from countries_api import cache
+from countries_api.authentication import token_cache
+from countries_api.models import APIToken, Country
+
+
+class APITokenAuthenticationTest(TestCase):
+    """Tests for API token authentication and its per-process cache"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(username='client', password='testpassword123')
+        self.token, self.key = APIToken.create_token(self.user, name='ci')
+        Country.objects.create(
+            name='Alpha', official_name='Alpha', cca2='AA', cca3='AAA', region='Test Region',
+            flag='https://example.com/AA.png', population=10,
+        )
+    
+    def get(self, key=None, path='/api/countries/'):
+        return self.client.get(path, HTTP_AUTHORIZATION=f"Token {key or self.key}")
+    
+    def token_queries(self, key=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(key)
+        return response, [query['sql'] for query in queries if 'countries_api_apitoken' in query['sql']]
+    
+    def test_key_is_stored_hashed(self):
+        """Test that only the digest and a short prefix of the key are stored"""
+        self.assertEqual(self.token.key_hash, APIToken.hash_key(self.key))
+        self.assertEqual(self.token.prefix, self.key[:8])
+        self.assertFalse(APIToken.objects.filter(key_hash=self.key).exists())
+    
+    def test_token_authenticates_and_is_cached(self):
+        """Test that the first request looks the token up and later ones use the cache"""
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)  # The lookup and the last_used_at update
+        self.token.refresh_from_db()
+        self.assertIsNotNone(self.token.last_used_at)
+        
+        response, queries = self.token_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+    
+    @override_settings(COUNTRIES_TOKEN_CACHE_TTL=0)
+    def test_ttl(self):
+        """Test that the token is looked up again once its cache entry expires"""
+        self.get()
+        _, queries = self.token_queries()
+        self.assertEqual(len(queries), 2)
+    
+    def test_invalid_and_malformed_tokens(self):
+        """Test that unknown keys and malformed headers are rejected"""
+        response = self.get('not-a-key')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['detail'], 'Invalid token.')
+        response = self.client.get('/api/countries/', HTTP_AUTHORIZATION='Token')
+        self.assertEqual(response.status_code, 403)
+    
+    def test_revocation_evicts_cached_token(self):
+        """Test that revoking a cached token takes effect on the next request"""
+        self.assertEqual(self.get().status_code, 200)
+        self.token.revoke()
+        response = self.get()
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['detail'], 'Token has been revoked.')
+    
+    def test_deactivated_user_evicts_cached_token(self):
+        """Test that a deactivated user's cached tokens stop working"""
+        self.assertEqual(self.get().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get().status_code, 403)
+    
+    def test_expired_token(self):
+        """Test that a cached token stops working when it expires"""
+        token, key = APIToken.create_token(self.user, expires_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.get(key).status_code, 200)
+        APIToken.objects.filter(pk=token.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        token_cache.get(APIToken.hash_key(key))[0].expires_at = timezone.now() - timedelta(seconds=1)
+        response = self.get(key)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['detail'], 'Token has expired.')
+    
+    def test_basic_authentication_still_accepted(self):
+        """Test that clients using HTTP Basic authentication keep working"""
+        credentials = base64.b64encode(b'client:testpassword123').decode()
+        response = self.client.get('/api/countries/', HTTP_AUTHORIZATION=f"Basic {credentials}")
+        self.assertEqual(response.status_code, 200)
+    
+    def test_api_token_command(self):
+        """Test creating, listing and revoking tokens from the command line"""
+        out = StringIO()
+        call_command('api_token', 'create', 'client', '--name', 'deploy', '--days', '30', stdout=out)
+        key = out.getvalue().splitlines()[-1]
+        self.assertEqual(self.get(key).status_code, 200)
+        token = APIToken.objects.get(key_hash=APIToken.hash_key(key))
+        self.assertEqual(token.name, 'deploy')
+        self.assertIsNotNone(token.expires_at)
+        
+        out = StringIO()
+        call_command('api_token', 'list', 'client', stdout=out)
+        self.assertIn(f"{token.prefix}  client  deploy  active", out.getvalue())
+        
+        call_command('api_token', 'revoke', token.prefix, stdout=StringIO())
+        self.assertEqual(self.get(key).status_code, 403)
+    
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_cached_sessions_outlive_the_response_cache(self):
+        """Test that cache sessions live apart from cached responses, so clearing those keeps users logged in"""
+        self.client.post('/accounts/login/', {'username': 'client', 'password': 'testpassword123'})
+        cache.get_cache().clear()
+        self.assertEqual(self.client.get('/countries/').status_code, 200)
+    
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions(self):
+        """Test that the HTML views work with sessions kept in a signed cookie"""
+        response = self.client.post('/accounts/login/', {'username': 'client', 'password': 'testpassword123'})
+        self.assertEqual(response.status_code, 302)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/countries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('django_session' in query['sql'] for query in queries))
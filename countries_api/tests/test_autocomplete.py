@@ -0,0 +1,99 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from rest_framework.test import APITestCase
+
+from countries_api import cache
+from countries_api.autocomplete import get_autocomplete_index
+from countries_api.models import Country, DatasetVersion
+
+
+class AutocompleteTest(APITestCase):
+    """Tests for the prefix index behind the autocomplete action"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.germany = self._create(
+            'Germany', 'Federal Republic of Germany', 'DE', 'DEU', 83_000_000,
+            native={'deu': 'Deutschland'}, translations={'fra': 'Allemagne', 'spa': 'Alemania'},
+        )
+        self._create('United Kingdom', 'United Kingdom of Great Britain', 'GB', 'GBR', 67_000_000)
+        self._create('United States', 'United States of America', 'US', 'USA', 331_000_000)
+        self._create('Åland Islands', 'Åland Islands', 'AX', 'ALA', 29_000, native={'swe': 'Åland'})
+        self._create('Albania', 'Republic of Albania', 'AL', 'ALB', 2_800_000)
+    
+    def _create(self, name, official_name, cca2, cca3, population, native=None, translations=None):
+        country = Country(
+            name=name, official_name=official_name, cca2=cca2, cca3=cca3, population=population,
+            region='Europe', flag=f"https://example.com/{cca2}.png", alt_spellings=[cca2],
+        )
+        country.raw_data = {
+            'name': {
+                'common': name,
+                'nativeName': {code: {'common': text, 'official': text} for code, text in (native or {}).items()},
+            },
+            'translations': {code: {'common': text, 'official': text} for code, text in (translations or {}).items()},
+        }
+        country.save()
+        # Native and translated names are extracted with the other relations
+        country.refresh_relations()
+        return country
+    
+    def suggest(self, query, **params):
+        response = self.client.get('/api/countries/autocomplete/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(country['name'], country['match']) for country in response.data['results']]
+    
+    def test_ranks_prefix_matches_by_population(self):
+        """Test that every country with a matching term is returned, most populous first"""
+        self.assertEqual(self.suggest('united'), [
+            ('United States', 'United States'), ('United Kingdom', 'United Kingdom'),
+        ])
+        self.assertEqual(self.suggest('AL'), [
+            ('Germany', 'Alemania'), ('Albania', 'Albania'), ('Åland Islands', 'Åland Islands'),
+        ])
+        self.assertEqual(self.suggest('all', limit=1), [('Germany', 'Allemagne')])
+        self.assertEqual(self.suggest('zz'), [])
+    
+    def test_matches_codes_words_and_native_names(self):
+        """Test code, later word, accent-folded and native or translated name matches"""
+        self.assertEqual(self.suggest('deu'), [('Germany', 'DEU')])
+        self.assertEqual(self.suggest('deuts'), [('Germany', 'Deutschland')])
+        self.assertEqual(self.suggest('kingd'), [('United Kingdom', 'Kingdom')])
+        self.assertEqual(self.suggest('america'), [('United States', 'America')])
+        self.assertEqual(self.suggest('aland'), [('Åland Islands', 'Åland Islands')])
+        result = self.client.get('/api/countries/autocomplete/?q=germ').data['results'][0]
+        self.assertEqual(result, {
+            'id': self.germany.id, 'name': 'Germany', 'cca2': 'DE', 'cca3': 'DEU',
+            'flag': 'https://example.com/DE.png', 'population': 83_000_000, 'match': 'Germany',
+        })
+    
+    def test_cache_headers_and_validation(self):
+        """Test that answers can be cached by the browser and revalidated, and that bad input is rejected"""
+        response = self.client.get('/api/countries/autocomplete/?q=ger')
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(
+            self.client.get('/api/countries/autocomplete/?q=ger', HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            304,
+        )
+        self.assertEqual(self.client.get('/api/countries/autocomplete/?q=').status_code, 400)
+        self.assertEqual(self.client.get('/api/countries/autocomplete/?q=a&limit=0').status_code, 400)
+        self.assertEqual(self.client.get('/api/countries/autocomplete/?q=a&limit=x').status_code, 400)
+    
+    def test_index_follows_dataset_version(self):
+        """Test that the index is reused until the dataset version changes"""
+        index = get_autocomplete_index()
+        self.assertIs(get_autocomplete_index(), index)
+        self._create('Germania', 'Germania', 'GX', 'GMX', 1)
+        cache.bump_dataset_version()
+        self.assertEqual([name for name, _ in self.suggest('germ')], ['Germany', 'Germania'])
+    
+    def test_index_follows_writes_of_other_processes(self):
+        """Test that a version bumped elsewhere, without signals in this process, rebuilds the index"""
+        index = get_autocomplete_index()
+        Country.objects.filter(cca3='GBR').update(name='Britain')
+        DatasetVersion.objects.update(version=F('version') + 1)
+        self.assertIsNot(get_autocomplete_index(), index)
+        self.assertEqual([name for name, _ in self.suggest('brit')], ['Britain'])
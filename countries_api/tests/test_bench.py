@@ -0,0 +1,37 @@
+from django.test import SimpleTestCase
+
+from countries_api.bench.compare import compare, direction
+from countries_api.bench.synthetic import generate_countries
+
+
+class BenchCompareTest(SimpleTestCase):
+    """Tests for the comparison of bench result files"""
+    
+    def test_direction(self):
+        """Test which metrics are compared and which way is better"""
+        self.assertEqual(direction('endpoints.list.cold_ms'), -1)
+        self.assertEqual(direction('endpoints.list.cold_queries'), -1)
+        self.assertEqual(direction('ingest.cold.seconds'), -1)
+        self.assertEqual(direction('concurrency.fast_clients.asgi.requests_per_second'), 1)
+        self.assertEqual(direction('graph.nodes'), 0)
+    
+    def test_regressions_beyond_threshold(self):
+        """Test that only changes for the worse beyond the threshold are flagged"""
+        baseline = {'meta': {'rows': 10}, 'results': {'a': {'x_ms': 10, 'y_ms': 10, 'queries': 1, 'rows': 5}}}
+        current = {'results': {'a': {'x_ms': 10.5, 'y_ms': 20, 'queries': 1, 'rows': 50, 'new_ms': 1}, 'speedup': 2}}
+        rows = {row['metric']: row for row in compare(baseline, current, threshold=0.1)}
+        
+        self.assertEqual(set(rows), {'a.x_ms', 'a.y_ms'})
+        self.assertFalse(rows['a.x_ms']['regression'])
+        self.assertTrue(rows['a.y_ms']['regression'])
+        self.assertEqual(rows['a.y_ms']['change'], 1.0)
+    
+    def test_zero_baseline(self):
+        """Test that a metric growing from zero is a regression"""
+        rows = compare({'warm_queries': 0, 'fast_us': 0}, {'warm_queries': 2, 'fast_us': 0})
+        self.assertEqual([row['regression'] for row in rows], [True, False])
+    
+    def test_generator_is_deterministic(self):
+        """Test that the same seed yields the same countries"""
+        self.assertEqual(list(generate_countries(50, seed=3)), list(generate_countries(50, seed=3)))
+        self.assertNotEqual(list(generate_countries(50, seed=3)), list(generate_countries(50, seed=4)))
@@ -0,0 +1,129 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from countries_api import cache
+from countries_api.models import Country, DatasetVersion
+from countries_api.tests.test_utils import make_country_data
+from countries_api.utils import store_countries
+
+
+class DatasetVersionTest(TestCase):
+    """Tests for the global dataset version"""
+    
+    def test_bump_changes_version(self):
+        """Test that bumping yields a new version"""
+        version = cache.get_dataset_version()
+        self.assertEqual(cache.get_dataset_version(), version)
+        self.assertNotEqual(cache.bump_dataset_version(), version)
+    
+    def test_missing_version_row_is_recreated(self):
+        """Test that a deleted version row is recreated instead of failing"""
+        DatasetVersion.objects.all().delete()
+        self.assertIsNotNone(cache.get_dataset_version())
+        DatasetVersion.objects.all().delete()
+        self.assertIsNotNone(cache.bump_dataset_version())
+    
+    def test_version_does_not_live_in_the_response_cache(self):
+        """Test that clearing the per-process response cache keeps the shared version"""
+        version = cache.get_dataset_version()
+        cache.get_cache().clear()
+        self.assertEqual(cache.get_dataset_version(), version)
+    
+    def test_rolled_back_version_is_not_reused(self):
+        """Test that a bump undone by a rollback is followed by a different version"""
+        try:
+            with transaction.atomic():
+                rolled_back = cache.bump_dataset_version()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertNotEqual(cache.get_dataset_version(), rolled_back)
+        self.assertNotEqual(cache.bump_dataset_version(), rolled_back)
+    
+    def test_sync_and_saves_bump_version(self):
+        """Test that the sync and model signals invalidate cached responses"""
+        version = cache.get_dataset_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            store_countries([make_country_data('AAA', 'AA', 'Alpha')])
+        synced_version = cache.get_dataset_version()
+        self.assertNotEqual(synced_version, version)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Country.objects.filter(cca3='AAA').delete()
+        self.assertNotEqual(cache.get_dataset_version(), synced_version)
+
+
+class ResponseCacheTest(APITestCase):
+    """Tests for the cached list and retrieve endpoints"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.stats.reset()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.country = Country.objects.create(
+            name='Alpha', official_name='Alpha', cca2='AA', cca3='AAA',
+            flag='https://example.com/aa.png', region='Test Region', population=10,
+        )
+    
+    def test_repeated_reads_skip_the_database(self):
+        """Test that a second identical request is answered from the cache"""
+        response = self.client.get('/api/countries/')
+        self.assertEqual(response.status_code, 200)
+        
+        with self.assertNumQueries(1):  # The dataset version
+            cached = self.client.get('/api/countries/')
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(cache.stats.snapshot()['hits'], 1)
+        self.assertEqual(cache.stats.snapshot()['misses'], 1)
+        
+        self.client.get('/api/countries/', {'page': 1})
+        self.assertEqual(cache.stats.snapshot()['misses'], 2)
+    
+    async def test_async_requests_read_the_version_once(self):
+        """Test that a request handled in async mode reads the dataset version once"""
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get('/api/countries/')
+        with mock.patch.object(DatasetVersion.objects, 'filter', wraps=DatasetVersion.objects.filter) as read:
+            response = await self.async_client.get('/api/countries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(read.call_count, 1)
+    
+    def test_api_writes_invalidate(self):
+        """Test that updates through the API are visible on the next read"""
+        self.client.get(f'/api/countries/{self.country.id}/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/countries/{self.country.id}/', {'population': 20}, format='json')
+        self.assertEqual(response.status_code, 200)
+        
+        response = self.client.get(f'/api/countries/{self.country.id}/')
+        self.assertEqual(response.json()['population'], 20)
+    
+    def test_unauthenticated_requests_are_not_served_from_cache(self):
+        """Test that permissions are checked before the cache is consulted"""
+        self.client.get('/api/countries/')
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/countries/').status_code, 403)
+
+
+class FileBackendTest(TestCase):
+    """Tests for the file-based cache backend"""
+    
+    def test_responses_shared_through_files(self):
+        """Test that cached responses are stored in the file cache under the shared version"""
+        with tempfile.TemporaryDirectory() as location:
+            caches_setting = {
+                'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+                'countries': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+            }
+            with override_settings(CACHES=caches_setting):
+                version = cache.get_dataset_version()
+                cache.get_cache().set(f'countries:response:{version}:list:key', {'count': 1})
+                self.assertTrue(os.listdir(location))
+                self.assertGreater(cache.bump_dataset_version(), version)
@@ -0,0 +1,215 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from countries_api import cache
+from countries_api.catalog import CountryCatalog, get_catalog, invalidate_catalog
+from countries_api.models import Country
+from countries_api.pagination import keyset_page
+from countries_api.search import normalize
+from countries_api.tests.factories import create_country
+
+
+# Runs code in a fresh interpreter connected to the test database
+CHILD_PROCESS = """
+import sys
+import django
+django.setup()
+from django.db import connection
+connection.settings_dict['NAME'] = sys.argv[1]
+exec(sys.argv[2])
+"""
+
+
+def run_in_other_process(code):
+    """Run code in a separate Django process sharing the test database"""
+    subprocess.run(
+        [sys.executable, '-c', CHILD_PROCESS, connection.settings_dict['NAME'], code],
+        cwd=settings.BASE_DIR, env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE), check=True,
+    )
+
+
+skip_without_shared_database = unittest.skipIf(
+    connection.vendor == 'sqlite' and connection.is_in_memory_db(), 'an in-memory test database is not shared'
+)
+
+
+class CountryCatalogTest(APITestCase):
+    """Tests that the catalog answers like the database, without queries"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        invalidate_catalog()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.alpha = create_country(
+            'Alpha', 'AA', 'AAA', subregion='North', languages={'eng': 'English', 'fra': 'French'},
+            currencies={'EUR': {'name': 'Euro', 'symbol': '€'}}, borders=['BBB'], timezones=['UTC'],
+        )
+        self.bravo = create_country(
+            'Bravo', 'BB', 'BBB', languages={'eng': 'English'}, borders=['AAA'],
+            currencies={'USD': {'name': 'United States dollar', 'symbol': '$'}},
+        )
+        # Duplicate names make the id tie-breaker matter
+        for index in range(12):
+            create_country('Charlie' if index % 3 else f"Delta {index:02d}", f"C{index:x}", f"C{index:02d}")
+        create_country('Echo', 'EE', 'EEE', region='Other Region', languages={'spa': 'Spanish'})
+    
+    def assertSameAsDatabase(self, url):
+        response = self.client.get(url)
+        with override_settings(COUNTRIES_CATALOG=False):
+            cache.get_cache().clear()
+            expected = self.client.get(url)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.json(), expected.json(), url)
+    
+    def test_api_matches_database(self):
+        """Test that list, retrieve and lookups answer the same JSON as the database path"""
+        for url in [
+            '/api/countries/', '/api/countries/?page=2', '/api/countries/?page=9',
+            f"/api/countries/{self.alpha.id}/", f"/api/countries/{self.bravo.id}/", '/api/countries/0/',
+            '/api/countries/by_language/?language=english&format=json',
+            '/api/countries/by_language/?language=FRA&format=json',
+            '/api/countries/by_currency/?currency=eur&format=json',
+            '/api/countries/by_currency/?currency=united states dollar&format=json',
+            '/api/countries/by_currency/?currency=xxx&format=json',
+        ]:
+            self.assertSameAsDatabase(url)
+    
+    def test_cursor_pages_match_database(self):
+        """Test that keyset pages of the catalog visit the same rows as those of the database"""
+        def walk(source):
+            pages = [keyset_page(source, None, 4, with_count=True)]
+            while pages[-1].has_next():
+                pages.append(keyset_page(source, pages[-1].next_cursor, 4))
+            pages.append(keyset_page(source, pages[-1].previous_cursor, 4))
+            return [page.count for page in pages], [[country.id for country in page] for page in pages]
+        
+        self.assertEqual(walk(get_catalog()), walk(Country.objects.all()))
+        self.assertEqual(walk(get_catalog())[0][0], 15)
+        
+        self.assertSameAsDatabase('/api/countries/?pagination=cursor')
+        cursor = self.client.get('/api/countries/?pagination=cursor').json()['next'].split('cursor=')[1]
+        self.assertSameAsDatabase(f"/api/countries/?cursor={cursor}")
+    
+    def test_accented_names_follow_the_database_order(self):
+        """Test that accented names are listed and paged in the order of the database collation"""
+        for name, cca2, cca3 in [('Åland Islands', 'AX', 'ALA'), ('Curaçao', 'CW', 'CUW'), ('Czechia', 'CZ', 'CZE')]:
+            create_country(name, cca2, cca3)
+        catalog = get_catalog()
+        self.assertEqual(
+            [record.id for record in catalog], list(Country.objects.order_by('name', 'id').values_list('id', flat=True))
+        )
+        self.assertSameAsDatabase('/api/countries/?page=2')
+        self.assertSameAsDatabase('/api/countries/?pagination=cursor')
+        
+        # Under a locale collation Åland sorts among the A's and Curaçao before Czechia, unlike by code point
+        order = sorted(catalog, key=lambda record: (normalize(record.name), record.id))
+        collated = CountryCatalog(order)
+        pages = [keyset_page(collated, None, 4)]
+        while pages[-1].has_next():
+            pages.append(keyset_page(collated, pages[-1].next_cursor, 4))
+        self.assertEqual([record.name for record in pages[0]][:3], ['Åland Islands', 'Alpha', 'Bravo'])
+        self.assertEqual([record.id for page in pages for record in page], [record.id for record in order])
+        back = keyset_page(collated, pages[1].previous_cursor, 4)
+        self.assertEqual(list(back), list(pages[0]))
+    
+    def test_cursor_of_a_deleted_country(self):
+        """Test that a cursor whose row has gone continues where the database would"""
+        first = keyset_page(get_catalog(), None, 4)
+        last = list(first)[-1]
+        Country.objects.filter(pk=last.id).delete()
+        catalog = CountryCatalog(record for record in get_catalog() if record.id != last.id)
+        for cursor in (first.next_cursor, keyset_page(catalog, first.next_cursor, 4).previous_cursor):
+            expected = keyset_page(Country.objects.all(), cursor, 4)
+            self.assertEqual([record.id for record in keyset_page(catalog, cursor, 4)], [c.id for c in expected])
+    
+    def test_reads_without_queries(self):
+        """Test that a built catalog answers detail, list and lookups without SQL"""
+        get_catalog()
+        urls = [
+            f"/api/countries/{self.alpha.id}/",
+            '/api/countries/?page=2',
+            '/api/countries/by_language/?language=english&format=json',
+            f"/api/countries/{self.alpha.id}/same_region/",
+        ]
+        for url in urls:
+            with self.assertNumQueries(1):  # The dataset version
+                self.assertEqual(self.client.get(url).status_code, 200, url)
+    
+    def test_writes_replace_catalog(self):
+        """Test that saving, relating and deleting countries is seen by the next read"""
+        catalog = get_catalog()
+        self.assertIs(get_catalog(), catalog)
+        
+        self.alpha.population = 99
+        self.alpha.save()
+        self.assertEqual(get_catalog().get(self.alpha.id).population, 99)
+        self.assertEqual(catalog.get(self.alpha.id).population, 5)  # The old snapshot is unchanged
+        
+        self.bravo.languages = {'spa': 'Spanish'}
+        self.bravo.save()
+        self.bravo.refresh_relations()
+        self.assertEqual([c.name for c in get_catalog().speaking('spanish')], ['Bravo', 'Echo'])
+        
+        self.bravo.delete()
+        self.assertIsNone(get_catalog().get(self.bravo.id))
+        self.assertEqual([c['cca3'] for c in get_catalog().get(self.alpha.id).neighbours], [])
+        self.assertNotIn(self.bravo.id, [c.id for c in get_catalog().speaking('english')])
+    
+    def test_indexes_and_read_only_records(self):
+        """Test code, region and subregion lookups and that records cannot be changed"""
+        catalog = get_catalog()
+        self.assertIs(catalog.get_by_code('aa'), catalog.get(self.alpha.id))
+        self.assertIs(catalog.get_by_code('BBB'), catalog.get(str(self.bravo.id)))
+        self.assertIsNone(catalog.get('abc'))
+        self.assertEqual([c.name for c in catalog.in_region('Other Region')], ['Echo'])
+        self.assertEqual([c.name for c in catalog.in_subregion('North')], ['Alpha'])
+        with self.assertRaises(AttributeError):
+            catalog.get(self.alpha.id).name = 'Changed'
+    
+    def test_html_views(self):
+        """Test the detail and same-region pages rendered from catalog records"""
+        self.client.force_login(self.user)
+        response = self.client.get(f"/countries/{self.alpha.id}/")
+        self.assertContains(response, 'Republic of Alpha')
+        self.assertContains(response, 'Bravo City')
+        self.assertNotContains(response, 'Echo')
+        response = self.client.get(f"/api/countries/{self.bravo.id}/same_region/")
+        self.assertContains(response, 'Alpha City')
+        self.assertEqual(self.client.get('/countries/0/').status_code, 404)
+        response = self.client.get('/countries/?page=2')
+        self.assertContains(response, 'Delta 09')
+
+
+@skip_without_shared_database
+class CrossProcessCatalogTest(APITransactionTestCase):
+    """Tests that writes made by other processes reach this process's catalog"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        invalidate_catalog()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.alpha = create_country('Alpha', 'AA', 'AAA')
+    
+    def test_write_from_other_process_is_served(self):
+        """Test that a country saved by another process is served at once, not from the old catalog"""
+        url = f"/api/countries/{self.alpha.id}/"
+        self.assertEqual(self.client.get(url).json()['population'], 5)
+        
+        run_in_other_process(
+            "from countries_api.models import Country\n"
+            "country = Country.objects.get(cca3='AAA')\n"
+            "country.population = 999\n"
+            "country.save()\n"
+        )
+        self.assertEqual(get_catalog().get(self.alpha.id).population, 999)
+        self.assertEqual(self.client.get(url).json()['population'], 999)
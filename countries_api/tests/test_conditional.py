@@ -0,0 +1,103 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from countries_api import cache
+from countries_api.models import DatasetVersion
+from countries_api.tests.factories import create_country
+
+
+class ConditionalApiTest(APITestCase):
+    """Tests for ETag / Last-Modified handling of the country API"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.country = create_country('Alpha', 'AA', 'AAA')
+        create_country('Beta', 'BB', 'BBB')
+    
+    def test_revalidation_returns_304_without_queries(self):
+        """Test that a matching If-None-Match short-circuits every endpoint"""
+        urls = [
+            '/api/countries/',
+            f'/api/countries/{self.country.id}/',
+            f'/api/countries/{self.country.id}/same_region/',
+            '/api/countries/by_language/?language=english&format=json',
+            '/api/countries/search/?q=alpha',
+        ]
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('Last-Modified', response)
+            with self.assertNumQueries(1):  # The dataset version
+                revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304, url)
+    
+    def test_if_modified_since(self):
+        """Test that If-Modified-Since is honoured"""
+        response = self.client.get('/api/countries/')
+        revalidated = self.client.get('/api/countries/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+    
+    def test_writes_change_the_etag(self):
+        """Test that a write makes old validators stale"""
+        etag = self.client.get('/api/countries/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/countries/{self.country.id}/', {'population': 20}, format='json')
+        
+        response = self.client.get('/api/countries/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_other_process_writes_change_the_etag(self):
+        """Test that a version bumped by another process, which leaves this process's cache alone, is seen"""
+        response = self.client.get('/api/countries/')
+        DatasetVersion.objects.update(version=F('version') + 1, modified=timezone.now() + timedelta(seconds=1))
+        
+        revalidated = self.client.get(
+            '/api/countries/', HTTP_IF_NONE_MATCH=response['ETag'], HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertNotEqual(revalidated['ETag'], response['ETag'])
+        self.assertNotEqual(revalidated['Last-Modified'], response['Last-Modified'])
+    
+    def test_errors_carry_no_validators(self):
+        """Test that 4xx answers are sent without ETag or Last-Modified"""
+        for url in ['/api/countries/999999/', '/api/countries/by_language/?format=json']:
+            response = self.client.get(url)
+            self.assertGreaterEqual(response.status_code, 400, url)
+            self.assertNotIn('ETag', response)
+            self.assertNotIn('Last-Modified', response)
+    
+    def test_etag_depends_on_representation(self):
+        """Test that JSON and HTML variants do not share validators"""
+        url = '/api/countries/by_language/?language=english'
+        html = self.client.get(url)
+        json_response = self.client.get(url, HTTP_ACCEPT='application/json')
+        self.assertNotEqual(html['ETag'], json_response['ETag'])
+        self.assertIn('Accept', html['Vary'])
+
+
+class ConditionalDetailViewTest(TestCase):
+    """Tests for ETag handling of the HTML detail page"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_login(self.user)
+        self.country = create_country('Alpha', 'AA', 'AAA')
+    
+    def test_detail_page_revalidation(self):
+        """Test that the detail page is not rendered again for a matching ETag"""
+        url = f'/countries/{self.country.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        
+        with self.assertNumQueries(3):  # Session, user and dataset version lookups only
+            revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
@@ -0,0 +1,90 @@
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from countries_api import cache, search
+from countries_api.models import Country, CountryName
+from countries_api.tests.test_utils import make_country_data
+from countries_api.utils import store_countries
+
+
+def names(common, official=None, **languages):
+    return {code: {'common': name, 'official': official or name} for code, name in languages.items()}
+
+
+class CountryNameTest(APITestCase):
+    """Tests for the native and translated names extracted at ingest"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        search.invalidate_index()
+        self.addCleanup(search.invalidate_index)
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        germany = make_country_data('DEU', 'DE', 'Germany', population=83_000_000, translations=names(
+            'Germany', fra='Allemagne', spa='Alemania', jpn='ドイツ',
+        ))
+        germany['name']['nativeName'] = names('Deutschland', deu='Deutschland')
+        self.payload = [
+            germany,
+            make_country_data('AUT', 'AT', 'Austria', translations=names('Austria', fra='Autriche', deu='Österreich')),
+            make_country_data('BEL', 'BE', 'Belgium'),
+        ]
+        store_countries(self.payload)
+        self.germany = Country.objects.get(cca3='DEU')
+    
+    def test_names_extracted_at_ingest(self):
+        """Test that a sync stores native and translated names, and replaces them on change"""
+        self.assertEqual(
+            sorted(self.germany.names.values_list('language', 'kind', 'common')),
+            [
+                ('deu', 'native', 'Deutschland'),
+                ('fra', 'translation', 'Allemagne'),
+                ('jpn', 'translation', 'ドイツ'),
+                ('spa', 'translation', 'Alemania'),
+            ],
+        )
+        self.assertEqual(CountryName.objects.get(country__cca3='AUT', language='deu').common, 'Österreich')
+        
+        self.payload[1]['translations'] = names('Austria', ita='Austria')
+        store_countries(self.payload)
+        self.assertEqual(
+            list(CountryName.objects.filter(country__cca3='AUT').values_list('language', 'common')), [('ita', 'Austria')]
+        )
+    
+    def test_search_matches_any_language(self):
+        """Test that search, the list filter, the HTML list and autocomplete match translated names"""
+        self.assertEqual(list(Country.search_countries('deutschland')), [self.germany])
+        self.assertEqual(list(Country.search_countries('ALLEMAGNE')), [self.germany])
+        self.assertEqual(list(Country.search_countries('ドイツ')), [self.germany])
+        self.assertEqual(list(Country.search_countries('osterreich')), [Country.objects.get(cca3='AUT')])
+        
+        response = self.client.get('/api/countries/', {'search': 'alemania'})
+        self.assertEqual([country['cca2'] for country in response.json()['results']], ['DE'])
+        response = self.client.get('/api/countries/autocomplete/', {'q': 'autr'})
+        self.assertEqual([(c['cca3'], c['match']) for c in response.json()['results']], [('AUT', 'Autriche')])
+        self.client.force_login(self.user)
+        response = self.client.get('/countries/', {'q': 'Allemagne'})
+        self.assertEqual([country.cca3 for country in response.context['countries']], ['DEU'])
+    
+    def test_lang_returns_localized_name(self):
+        """Test that ?lang= adds the name in that language, falling back to the common name"""
+        response = self.client.get('/api/countries/', {'lang': 'fra'})
+        self.assertEqual(
+            [(country['name'], country['localized_name']) for country in response.json()['results']],
+            [('Austria', 'Autriche'), ('Belgium', 'Belgium'), ('Germany', 'Allemagne')],
+        )
+        self.assertNotIn('localized_name', self.client.get('/api/countries/').json()['results'][0])
+        
+        response = self.client.get(f"/api/countries/{self.germany.id}/", {'lang': 'DEU'})
+        self.assertEqual(response.json()['localized_name'], 'Deutschland')
+        response = self.client.get('/api/countries/autocomplete/', {'q': 'germ', 'lang': 'spa'})
+        self.assertEqual(response.json()['results'][0]['localized_name'], 'Alemania')
+        response = self.client.get('/api/countries/autocomplete/', {'q': 'germ'})
+        self.assertNotIn('localized_name', response.json()['results'][0])
+        
+        self.client.force_login(self.user)
+        response = self.client.get('/countries/', {'lang': 'deu'})
+        self.assertContains(response, '<td>Österreich</td>', html=True)
+        self.assertContains(response, '<td>Belgium</td>', html=True)
+        response = self.client.get('/api/countries/search/', {'q': 'germany', 'lang': 'jpn'})
+        self.assertContains(response, '<td>ドイツ</td>', html=True)
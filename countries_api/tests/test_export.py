@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+
+from django.contrib.auth.models import User
+from rest_framework.test import APITestCase
+
+from countries_api import export
+from countries_api.models import Country, Language
+
+
+class CountryExportTest(APITestCase):
+    """Tests for the streaming NDJSON/CSV export"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        for index in range(7):
+            Country.objects.create(
+                name=f"Country {index}", official_name=f"Republic {index}", cca2=f"C{index}", cca3=f"CC{index}",
+                region='Europe' if index % 2 else 'Asia', flag=f"https://example.com/{index}.png",
+                population=index, capitals=[f"City {index}"] if index else [], borders=['CC1', 'CC2'],
+            )
+        french = Language.objects.create(code='fra', name='French', name_key='french')
+        french.countries.add(*Country.objects.filter(cca3__in=['CC1', 'CC4']))
+    
+    def export(self, query=''):
+        response = self.client.get(f"/api/countries/export/{query}")
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8')
+    
+    def test_ndjson_export(self):
+        """Test that every country is streamed as one JSON line, in id order"""
+        response, body = self.export()
+        rows = [json.loads(line) for line in body.splitlines()]
+        
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual([row['cca3'] for row in rows], [f"CC{index}" for index in range(7)])
+        self.assertEqual(list(rows[0]), list(export.EXPORT_FIELDS))
+        self.assertEqual((rows[0]['capital'], rows[1]['capital']), ('N/A', 'City 1'))
+        self.assertEqual(rows[0]['borders'], ['CC1', 'CC2'])
+    
+    def test_csv_export_with_fields(self):
+        """Test CSV output with a field selection, JSON-encoding list columns"""
+        response, body = self.export('?format=csv&fields=cca3,population,borders')
+        rows = list(csv.reader(io.StringIO(body)))
+        
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('countries.csv', response['Content-Disposition'])
+        self.assertEqual(rows[0], ['cca3', 'population', 'borders'])
+        self.assertEqual(rows[3], ['CC2', '2', '["CC1","CC2"]'])
+        self.assertEqual(len(rows), 8)
+    
+    def test_filters(self):
+        """Test the region, language and search filters"""
+        _, body = self.export('?fields=cca3&region=europe')
+        self.assertEqual(body.splitlines(), ['{"cca3": "CC1"}', '{"cca3": "CC3"}', '{"cca3": "CC5"}'])
+        
+        _, body = self.export('?fields=cca3&language=french&region=Asia')
+        self.assertEqual(body.splitlines(), ['{"cca3": "CC4"}'])
+        
+        _, body = self.export('?fields=cca3&search=republic 6')
+        self.assertEqual(body.splitlines(), ['{"cca3": "CC6"}'])
+    
+    def test_streams_in_chunks_from_one_query(self):
+        """Test that the body is produced in chunks from a single query"""
+        export.ROWS_PER_WRITE, previous = 3, export.ROWS_PER_WRITE
+        self.addCleanup(setattr, export, 'ROWS_PER_WRITE', previous)
+        response = self.client.get('/api/countries/export/?fields=id')
+        with self.assertNumQueries(1):
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 3)
+    
+    def test_invalid_field_and_authentication(self):
+        """Test that unknown fields are rejected and anonymous users refused"""
+        response = self.client.get('/api/countries/export/?fields=name,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', json.loads(response.content)['error'])
+        
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/countries/export/').status_code, 403)
@@ -0,0 +1,113 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from countries_api import cache
+from countries_api.graph import BorderGraph, get_graph
+from countries_api.models import Country, DatasetVersion
+
+# A triangle A - B - C with D hanging off C, a pair E - F and an island G.
+# Borders are deliberately one-sided in places: the graph is undirected.
+ROWS = [
+    (1, 'Alpha', 'AAA', ['BBB', 'CCC']),
+    (2, 'Bravo', 'BBB', ['AAA']),
+    (3, 'Charlie', 'CCC', ['BBB', 'DDD', 'XXX']),
+    (4, 'Delta', 'DDD', []),
+    (5, 'Echo', 'EEE', ['FFF']),
+    (6, 'Foxtrot', 'FFF', ['EEE']),
+    (7, 'Golf', 'GGG', None),
+]
+
+
+class BorderGraphTest(TestCase):
+    """Tests for the in-memory border graph"""
+    
+    def setUp(self):
+        self.graph = BorderGraph.build(ROWS)
+    
+    def test_neighbours_by_depth(self):
+        """Test that neighbourhoods grow one crossing at a time"""
+        self.assertEqual(self.graph.neighbours(4), {3: 1})
+        self.assertEqual(self.graph.neighbours(4, depth=2), {3: 1, 1: 2, 2: 2})
+        self.assertEqual(self.graph.neighbours(4, depth=10), {3: 1, 1: 2, 2: 2})
+        self.assertEqual(self.graph.neighbours(7, depth=3), {})
+    
+    def test_shortest_path(self):
+        """Test that paths take the fewest crossings and that islands have none"""
+        self.assertEqual(self.graph.path(2, 4), [2, 3, 4])
+        self.assertEqual(self.graph.path(1, 4), [1, 3, 4])
+        self.assertEqual(self.graph.path(1, 1), [1])
+        self.assertIsNone(self.graph.path(1, 5))
+        self.assertIsNone(self.graph.path(7, 1))
+    
+    def test_components(self):
+        """Test that landmasses are listed largest first"""
+        self.assertEqual(self.graph.components, [[1, 2, 3, 4], [5, 6], [7]])
+        self.assertEqual(self.graph.component(6), [5, 6])
+
+
+class BorderGraphApiTest(APITestCase):
+    """Tests for the neighbours, path and components actions"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.countries = {}
+        for _, name, cca3, borders in ROWS:
+            self.countries[cca3] = Country.objects.create(
+                name=name, official_name=name, cca2=cca3[:2], cca3=cca3, region='Test Region',
+                flag='https://example.com/flag.png', population=1, borders=borders or [],
+            )
+    
+    def test_neighbours(self):
+        """Test the N-hop neighbours action"""
+        delta = self.countries['DDD']
+        response = self.client.get(f'/api/countries/{delta.id}/neighbours/', {'depth': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['cca3'], row['distance']) for row in response.data['results']],
+                         [('CCC', 1), ('AAA', 2), ('BBB', 2)])
+        
+        self.assertEqual(self.client.get(f'/api/countries/{delta.id}/neighbours/', {'depth': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/countries/999999/neighbours/').status_code, 404)
+    
+    def test_path(self):
+        """Test the shortest path action"""
+        response = self.client.get('/api/countries/path/', {'from': 'aaa', 'to': 'DDD'})
+        self.assertEqual(response.data['crossings'], 2)
+        self.assertEqual([node['cca3'] for node in response.data['path']], ['AAA', 'CCC', 'DDD'])
+        
+        response = self.client.get('/api/countries/path/', {'from': 'AAA', 'to': 'GGG'})
+        self.assertIsNone(response.data['crossings'])
+        self.assertEqual(self.client.get('/api/countries/path/', {'from': 'AAA'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/countries/path/', {'from': 'AAA', 'to': 'ZZZ'}).status_code, 404)
+    
+    def test_components(self):
+        """Test the landmass action"""
+        response = self.client.get('/api/countries/components/', {'min_size': 2})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual([component['size'] for component in response.data['results']], [4, 2])
+    
+    def test_graph_cached_until_dataset_changes(self):
+        """Test that queries are answered from memory until a write bumps the dataset version"""
+        graph = get_graph()
+        with self.assertNumQueries(1):  # The dataset version
+            self.client.get('/api/countries/path/', {'from': 'AAA', 'to': 'DDD'})
+        self.assertIs(get_graph(), graph)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            golf = self.countries['GGG']
+            golf.borders = ['DDD']
+            golf.save()
+        response = self.client.get('/api/countries/path/', {'from': 'AAA', 'to': 'GGG'})
+        self.assertEqual(response.data['crossings'], 3)
+    
+    def test_graph_follows_writes_of_other_processes(self):
+        """Test that a version bumped elsewhere, without signals in this process, rebuilds the graph"""
+        graph = get_graph()
+        Country.objects.filter(cca3='GGG').update(borders=['AAA'])
+        DatasetVersion.objects.update(version=F('version') + 1)
+        self.assertIsNot(get_graph(), graph)
+        response = self.client.get('/api/countries/path/', {'from': 'DDD', 'to': 'GGG'})
+        self.assertEqual(response.data['crossings'], 3)
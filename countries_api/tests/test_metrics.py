@@ -0,0 +1,138 @@
+import re
+import threading
+from unittest import mock
+
+from asgiref.sync import SyncToAsync
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.test import TestCase, override_settings
+
+from countries_api import cache, metrics
+from countries_api.models import Country
+
+
+def sample(text, name, **labels):
+    """Return the value of a sample from a Prometheus text exposition, or None"""
+    for line in text.splitlines():
+        match = re.fullmatch(r'(\w+)(?:\{(.*)\})? (\S+)', line)
+        if match and match.group(1) == name:
+            found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ''))
+            if found == {key: str(value) for key, value in labels.items()}:
+                return float(match.group(3))
+    return None
+
+
+class MetricsTest(TestCase):
+    """Tests for the request metrics middleware and the /metrics endpoint"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        metrics.registry.reset()
+        self.user = User.objects.create_user(username='staff', password='testpassword123', is_staff=True)
+        self.client.force_login(self.user)
+        self.country = Country.objects.create(
+            name='Alpha', official_name='Alpha', cca2='AA', cca3='AAA', region='Test Region',
+            flag='https://example.com/AA.png', population=10,
+        )
+    
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+    
+    def test_request_counts_latency_and_queries(self):
+        """Test per-route request counters and latency and query histograms"""
+        self.client.get('/api/countries/')
+        self.client.get('/api/countries/')
+        self.client.get('/no/such/page/')
+        text = self.scrape()
+        
+        self.assertEqual(sample(text, 'countries_requests_total', route='country-list', method='GET', status=200), 2)
+        self.assertEqual(sample(text, 'countries_requests_total', route='unmatched', method='GET', status=404), 1)
+        self.assertEqual(sample(text, 'countries_request_duration_seconds_count', route='country-list'), 2)
+        self.assertEqual(sample(text, 'countries_request_duration_seconds_bucket', route='country-list', le='+Inf'), 2)
+        # The first request queries for the session, user and page; the second is served from the cache
+        self.assertGreaterEqual(sample(text, 'countries_request_queries_sum', route='country-list'), 4)
+        self.assertEqual(sample(text, 'countries_request_queries_bucket', route='country-list', le=0), 0)
+        self.assertGreater(sample(text, 'countries_request_query_seconds_total', route='country-list'), 0)
+    
+    def test_cache_and_phases(self):
+        """Test cache hit/miss counters and serialize, render and template timings"""
+        url = f"/api/countries/{self.country.id}/"
+        self.client.get(url)
+        self.client.get(url)
+        self.client.get('/countries/')
+        text = self.scrape()
+        
+        self.assertEqual(sample(text, 'countries_response_cache_requests_total', route='country-detail', result='hit'), 1)
+        self.assertEqual(sample(text, 'countries_response_cache_requests_total', route='country-detail', result='miss'), 1)
+        self.assertEqual(sample(text, 'countries_response_cache_hit_ratio'), 0.5)
+        for phase in ('serialize', 'render'):
+            self.assertGreater(sample(text, 'countries_request_phase_seconds_total', route='country-detail', phase=phase), 0)
+        self.assertGreater(sample(text, 'countries_request_phase_seconds_total', route='country_list', phase='template'), 0)
+    
+    def test_threads_record_into_their_own_shards(self):
+        """Test that a scrape sums what every thread recorded"""
+        def record():
+            for _ in range(10):
+                metrics.registry.record('route', 'GET', 200, 0.001, metrics.RequestRecord())
+        
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(metrics.registry.collect().requests[('route', 'GET', 200)], 40)
+    
+    def test_exited_threads_are_folded(self):
+        """Test that a thread per request does not grow the registry, and nothing it recorded is lost"""
+        for _ in range(20):
+            thread = threading.Thread(
+                target=metrics.registry.record, args=('route', 'GET', 200, 0.001, metrics.RequestRecord()),
+            )
+            thread.start()
+            thread.join()
+            self.assertLessEqual(len(metrics.registry._shards), 1)
+        self.assertEqual(metrics.registry.collect().requests[('route', 'GET', 200)], 20)
+        self.assertEqual(len(metrics.registry._shards), 0)
+    
+    def test_asgi_chain_stays_async(self):
+        """Test that an ASGI handler does not run the middleware through sync_to_async"""
+        middleware = ['countries_api.metrics.MetricsMiddleware', 'django.middleware.common.CommonMiddleware']
+        with override_settings(DEBUG=True, MIDDLEWARE=middleware):
+            with mock.patch('django.core.handlers.base.logger') as logger:
+                handler = ASGIHandler()
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+        adapted = [
+            call.args[1] for call in logger.debug.call_args_list
+            if call.args[0].startswith('Asynchronous handler adapted')
+        ]
+        self.assertNotIn('middleware countries_api.metrics.MetricsMiddleware', adapted)
+    
+    async def test_records_async_requests(self):
+        """Test that requests handled in async mode are recorded, with the queries their views run in threads"""
+        response = await self.async_client.get('/no/such/page/')
+        self.assertEqual(response.status_code, 404)
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get('/api/countries/')
+        self.assertEqual(response.status_code, 200)
+        
+        total = metrics.registry.collect()
+        self.assertEqual(total.requests[('unmatched', 'GET', 404)], 1)
+        self.assertEqual(total.requests[('country-list', 'GET', 200)], 1)
+        self.assertGreaterEqual(total.queries['country-list'].sum, 3)
+        self.assertGreater(total.query_seconds['country-list'], 0)
+    
+    def test_access(self):
+        """Test that only staff users, or scrapers with the token when one is set, read the metrics"""
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        
+        self.client.logout()
+        with override_settings(COUNTRIES_METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
@@ -0,0 +1,125 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from countries_api import cache
+from countries_api.models import Country
+from countries_api.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page
+
+
+def create_countries(names):
+    return [
+        Country.objects.create(
+            name=name, official_name=name, cca2=f"{index:02d}", cca3=f"{index:03d}",
+            region='Test Region', flag='https://example.com/flag.png', population=index,
+        )
+        for index, name in enumerate(names)
+    ]
+
+
+class KeysetPageTest(TestCase):
+    """Tests for keyset pagination of querysets"""
+
+    def setUp(self):
+        # Duplicate names make the id tie-breaker matter
+        create_countries(['Delta', 'Alpha', 'Charlie', 'Bravo', 'Bravo', 'Echo', 'Alpha'])
+        self.expected = list(Country.objects.order_by('name', 'id').values_list('id', flat=True))
+
+    def test_walks_forwards_and_backwards(self):
+        """Test that next and previous cursors visit every row once, in order"""
+        pages = [keyset_page(Country.objects.all(), None, 3)]
+        while pages[-1].has_next():
+            pages.append(keyset_page(Country.objects.all(), pages[-1].next_cursor, 3))
+        self.assertEqual([country.id for page in pages for country in page], self.expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(keyset_page(Country.objects.all(), back[-1].previous_cursor, 3))
+        self.assertEqual([[c.id for c in page] for page in back], [[c.id for c in page] for page in reversed(pages)])
+        self.assertTrue(back[-1].has_next())
+
+    def test_deep_pages_do_not_count(self):
+        """Test that a page costs one query unless the count is requested"""
+        first = keyset_page(Country.objects.all(), None, 3)
+        with self.assertNumQueries(1):
+            keyset_page(Country.objects.all(), first.next_cursor, 3)
+        with self.assertNumQueries(2):
+            page = keyset_page(Country.objects.all(), first.next_cursor, 3, with_count=True)
+        self.assertEqual(page.count, 7)
+
+    def test_cursor_round_trip(self):
+        """Test that cursors decode to what was encoded and reject garbage"""
+        self.assertEqual(decode_cursor(encode_cursor('Côte d’Ivoire', 5, reverse=True)), ('Côte d’Ivoire', 5, True))
+        for cursor in ['', 'not a cursor', encode_cursor('Alpha', 1)[:-3]]:
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+
+class CursorPaginationApiTest(APITestCase):
+    """Tests for the opt-in cursor mode of the country API"""
+
+    def setUp(self):
+        cache.get_cache().clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        create_countries([f"Country {index:02d}" for index in range(25)])
+
+    def test_cursor_links(self):
+        """Test that the API pages through every country by cursor without counting"""
+        response = self.client.get('/api/countries/?pagination=cursor')
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data['previous'])
+        names = [country['name'] for country in response.data['results']]
+
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertIsNotNone(response.data['previous'])
+            names.extend(country['name'] for country in response.data['results'])
+            next_url = response.data['next']
+        self.assertEqual(names, [f"Country {index:02d}" for index in range(25)])
+
+    def test_optional_count(self):
+        """Test that ?count=true adds the total"""
+        response = self.client.get('/api/countries/?pagination=cursor&count=true')
+        self.assertEqual(response.data['count'], 25)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor is a 404"""
+        response = self.client.get('/api/countries/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers_remain_the_default(self):
+        """Test that page numbers are used unless cursors are asked for"""
+        response = self.client.get('/api/countries/?page=2')
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(response.data['results'][0]['name'], 'Country 10')
+
+    @override_settings(COUNTRIES_PAGINATION='cursor')
+    def test_setting_enables_cursors(self):
+        """Test that COUNTRIES_PAGINATION switches the default mode"""
+        response = self.client.get('/api/countries/')
+        self.assertIn('cursor=', response.data['next'])
+
+
+class CursorPaginationHtmlTest(TestCase):
+    """Tests for the cursor mode of the HTML country list"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_login(self.user)
+        create_countries([f"Country {index:02d}" for index in range(15)])
+
+    def test_cursor_navigation(self):
+        """Test that the list renders next/previous cursor links"""
+        response = self.client.get('/countries/?pagination=cursor')
+        page = response.context['countries']
+        self.assertEqual(len(page), 10)
+        self.assertContains(response, f"cursor={page.next_cursor}")
+
+        response = self.client.get(f"/countries/?cursor={page.next_cursor}")
+        self.assertEqual([country.name for country in response.context['countries']],
+                         [f"Country {index:02d}" for index in range(10, 15)])
+        self.assertContains(response, 'Previous</a>')
@@ -0,0 +1,138 @@
+from unittest import mock
+
+from asgiref.sync import SyncToAsync
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from countries_api import cache
+from countries_api.models import APIToken, Country, RequestProfile
+from countries_api.profiling import ProfilingMiddleware
+
+
+class ProfilingTest(TestCase):
+    """Tests for the on-demand request profiling middleware and its admin"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        self.staff = User.objects.create_user(
+            username='staff', password='testpassword123', is_staff=True, is_superuser=True,
+        )
+        self.user = User.objects.create_user(username='user', password='testpassword123')
+        self.country = Country.objects.create(
+            name='Alpha', official_name='Alpha', cca2='AA', cca3='AAA', region='Test Region',
+            flag='https://example.com/AA.png', population=10,
+        )
+    
+    def test_staff_header_profiles_request(self):
+        """Test that a staff user's X-Profile header stores a profile with stats and SQL"""
+        self.client.force_login(self.staff)
+        response = self.client.get(f"/api/countries/{self.country.id}/", HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        
+        profile = RequestProfile.objects.get(request_id=response['X-Profile-Id'])
+        self.assertEqual(profile.trigger, 'header')
+        self.assertEqual(profile.route, 'country-detail')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.user, self.staff)
+        self.assertIn('cumulative', profile.stats)
+        self.assertEqual(profile.query_count, len(profile.queries))
+        self.assertTrue(any('countries_api_country' in query['sql'] for query in profile.queries))
+        self.assertGreater(profile.duration_ms, 0)
+    
+    def test_query_flag(self):
+        """Test that the _profile query flag triggers a profile"""
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/countries/?_profile=1')
+        self.assertEqual(RequestProfile.objects.get(request_id=response['X-Profile-Id']).trigger, 'query')
+    
+    def test_non_staff_flag_ignored(self):
+        """Test that users who are not staff, and requests without a flag, are not profiled"""
+        self.client.force_login(self.user)
+        response = self.client.get('/api/countries/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.client.force_login(self.staff)
+        self.client.get('/api/countries/')
+        self.assertFalse(RequestProfile.objects.exists())
+    
+    @override_settings(COUNTRIES_PROFILE_SAMPLE_RATE=3, COUNTRIES_PROFILE_KEEP=2)
+    def test_sampling_and_pruning(self):
+        """Test that one request in every N is profiled and only the latest profiles are kept"""
+        self.client.force_login(self.user)
+        responses = [self.client.get('/api/countries/') for _ in range(9)]
+        profiled = [index for index, response in enumerate(responses) if 'X-Profile-Id' in response]
+        self.assertEqual(profiled, [2, 5, 8])
+        self.assertEqual(
+            [str(request_id) for request_id in RequestProfile.objects.values_list('request_id', flat=True)],
+            [responses[8]['X-Profile-Id'], responses[5]['X-Profile-Id']],
+        )
+        self.assertEqual(RequestProfile.objects.first().trigger, 'sample')
+    
+    def test_staff_token_profiles_request(self):
+        """Test that staff authenticated by an API token can profile, and a bad token cannot"""
+        _, key = APIToken.create_token(self.staff)
+        response = self.client.get('/api/countries/', HTTP_AUTHORIZATION=f"Token {key}", HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(RequestProfile.objects.get(request_id=response['X-Profile-Id']).user, self.staff)
+        
+        response = self.client.get('/api/countries/', HTTP_AUTHORIZATION='Token wrong', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn('X-Profile-Id', response)
+    
+    def test_profile_stored_after_response(self):
+        """Test that the profile is written once the response is finished, not in the request path"""
+        request = RequestFactory().get('/api/countries/', HTTP_X_PROFILE='1')
+        request.user = self.staff
+        response = ProfilingMiddleware(lambda request: HttpResponse())(request)
+        self.assertIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+        
+        response.close()
+        self.assertEqual(RequestProfile.objects.get().request_id.hex, response['X-Profile-Id'].replace('-', ''))
+    
+    def test_asgi_chain_stays_async(self):
+        """Test that an ASGI handler runs no middleware through sync_to_async"""
+        with override_settings(DEBUG=True), mock.patch('django.core.handlers.base.logger') as logger:
+            handler = ASGIHandler()
+        self.assertNotIsInstance(handler._middleware_chain, SyncToAsync)
+        adapted = [
+            call.args[1] for call in logger.debug.call_args_list
+            if call.args[0].startswith('Asynchronous handler adapted')
+        ]
+        self.assertEqual(adapted, [])
+    
+    def test_admin(self):
+        """Test the profile changelist and read-only detail pages"""
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/countries/', HTTP_X_PROFILE='1')
+        profile_id = RequestProfile.objects.get(request_id=response['X-Profile-Id']).pk
+        
+        response = self.client.get('/admin/countries_api/requestprofile/')
+        self.assertContains(response, '/api/countries/')
+        response = self.client.get(f"/admin/countries_api/requestprofile/{profile_id}/change/")
+        self.assertContains(response, 'cumulative')
+        self.assertContains(response, 'SELECT')
+        response = self.client.get('/admin/countries_api/requestprofile/add/')
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncProfilingTest(TransactionTestCase):
+    """Tests for profiling in async mode, where the profile is stored from another thread"""
+    
+    async def test_profiles_async_requests(self):
+        """Test that a request profiled in async mode holds its view's frames and queries"""
+        staff = await User.objects.acreate_user(username='staff', password='testpassword123', is_staff=True)
+        await self.async_client.aforce_login(staff)
+        with override_settings(COUNTRIES_CATALOG=False):
+            response = await self.async_client.get('/api/countries/', headers={'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        profile = await RequestProfile.objects.select_related('user').aget(request_id=response['X-Profile-Id'])
+        self.assertEqual(profile.user, staff)
+        self.assertEqual(profile.route, 'country-list')
+        # The view ran in a worker thread; its frames and queries are still in the profile
+        self.assertIn('countries_api/views.py', profile.stats)
+        self.assertIn('rest_framework/views.py', profile.stats)
+        self.assertGreater(profile.query_count, 0)
+        self.assertIn('countries_api_country', ' '.join(query['sql'] for query in profile.queries))
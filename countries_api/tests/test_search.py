@@ -0,0 +1,179 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+
+from countries_api import cache, search
+from countries_api.models import Country
+from countries_api.search import SearchIndex, edit_distance, normalize
+from countries_api.views import CountryViewSet
+
+
+class SearchIndexTest(SimpleTestCase):
+    """Tests for the in-memory ranked search index"""
+    
+    def setUp(self):
+        self.index = SearchIndex.build([
+            (1, 'United States', 'United States of America', 'US', 'USA', ['America'], 'Americas', 'North America'),
+            (2, 'United Kingdom', 'United Kingdom of Great Britain', 'GB', 'GBR', ['UK', 'Britain'], 'Europe', ''),
+            (3, 'Côte d\'Ivoire', 'Republic of Côte d\'Ivoire', 'CI', 'CIV', ['Ivory Coast'], 'Africa', ''),
+            (4, 'Australia', 'Commonwealth of Australia', 'AU', 'AUS', [], 'Oceania', ''),
+            (5, 'Austria', 'Republic of Austria', 'AT', 'AUT', ['Österreich'], 'Europe', ''),
+        ])
+    
+    def test_normalize_folds_case_and_accents(self):
+        """Test that accents, case and punctuation are folded"""
+        self.assertEqual(normalize("Côte d'Ivoire"), 'cote d ivoire')
+        self.assertEqual(normalize('  ÖSTERREICH '), 'osterreich')
+    
+    def test_ranking_prefers_codes_and_exact_names(self):
+        """Test that exact and prefix matches outrank substring matches"""
+        self.assertEqual(self.index.search('usa'), [1])
+        self.assertEqual(self.index.search('austr'), [4, 5])
+        self.assertEqual(self.index.search('austria'), [5])
+        self.assertEqual(self.index.search('of austr'), [4, 5])
+        self.assertEqual(self.index.search('united'), [2, 1])
+        self.assertEqual(self.index.search('kingdom'), [2])
+    
+    def test_matches_alternate_spellings_and_accents(self):
+        """Test that alternate spellings and unaccented queries match"""
+        self.assertEqual(self.index.search('ivory'), [3])
+        self.assertEqual(self.index.search('cote'), [3])
+        self.assertEqual(self.index.search('osterreich'), [5])
+        self.assertEqual(self.index.search('uk'), [2])
+    
+    def test_remove_and_replace(self):
+        """Test incremental updates"""
+        self.index.remove(5)
+        self.assertEqual(self.index.search('austr'), [4])
+        self.index.add(4, 'Oz', 'Commonwealth of Australia', 'AU', 'AUS')
+        self.assertEqual(self.index.search('oz'), [4])
+        self.assertEqual(self.index.search('europe', search.ALL_FIELDS), [2])
+    
+    def test_edit_distance(self):
+        """Test the bounded Damerau-Levenshtein distance"""
+        self.assertEqual(edit_distance('bangaldesh', 'bangladesh', 2), 1)
+        self.assertEqual(edit_distance('columbia', 'colombia', 2), 1)
+        self.assertEqual(edit_distance('austria', 'australia', 2), 2)
+        self.assertEqual(edit_distance('austria', 'australia', 1), 2)
+        self.assertEqual(edit_distance('peru', 'chile', 2), 3)
+        self.assertEqual(edit_distance('oman', 'oman', 1), 0)
+    
+    def test_fuzzy_search_tolerates_typos(self):
+        """Test that names, name words and alternate spellings match within a few edits, closest first"""
+        self.assertEqual(self.index.search('austrlia'), [])
+        self.assertEqual(self.index.fuzzy_search('austrlia'), [4, 5])
+        self.assertEqual(self.index.fuzzy_search('austira'), [5])
+        self.assertEqual(self.index.fuzzy_search('Kingdm'), [2])
+        self.assertEqual(self.index.fuzzy_search('osterriech'), [5])
+        self.assertEqual(self.index.fuzzy_search('untied sates'), [1])
+        # Short queries are not fuzzed, and far-off ones do not match
+        self.assertEqual(self.index.fuzzy_search('uk'), [])
+        self.assertEqual(self.index.fuzzy_search('zimbabwe'), [])
+        
+        self.index.remove(5)
+        self.assertEqual(self.index.fuzzy_search('austrlia'), [4])
+        self.assertNotIn('austria', self.index.fuzzy_term_ids)
+        self.index.add(5, 'Austria', 'Republic of Austria', 'AT', 'AUT')
+        self.assertEqual(self.index.fuzzy_search('austrlia'), [4, 5])
+    
+    def test_region_only_matches_with_all_fields(self):
+        """Test that region fields are only searched by the API filter"""
+        self.assertEqual(self.index.search('oceania'), [])
+        self.assertEqual(self.index.search('oceania', search.ALL_FIELDS), [4])
+
+
+class SearchIntegrationTest(APITestCase):
+    """Tests for the search action, SearchFilter and index maintenance"""
+    
+    def setUp(self):
+        search.invalidate_index()
+        self.addCleanup(search.invalidate_index)
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.austria = self._create('Austria', 'Republic of Austria', 'AT', 'AUT', 'Europe')
+        self.australia = self._create('Australia', 'Commonwealth of Australia', 'AU', 'AUS', 'Oceania')
+    
+    def _create(self, name, official_name, cca2, cca3, region):
+        return Country.objects.create(
+            name=name, official_name=official_name, cca2=cca2, cca3=cca3, region=region,
+            flag='https://example.com/flag.png', population=1000,
+        )
+    
+    def test_search_countries_ranks_results(self):
+        """Test that the ranked queryset follows relevance order"""
+        self.assertEqual(list(Country.search_countries('austria')), [self.austria])
+        self.assertEqual(list(Country.search_countries('republic')), [self.austria])
+        self.assertEqual(list(Country.search_countries('aus')), [self.australia, self.austria])
+    
+    def test_index_follows_saves_and_deletes(self):
+        """Test that the index is rebuilt once a save or delete bumps the dataset version"""
+        self.assertEqual(list(Country.search_countries('oz')), [])
+        self.australia.name = 'Oz'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.australia.save()
+        self.assertEqual(list(Country.search_countries('oz')), [self.australia])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.austria.delete()
+        self.assertEqual(list(Country.search_countries('aus')), [self.australia])
+
+    def test_index_follows_writes_of_other_processes(self):
+        """Test that a write without signals shows up once the dataset version is bumped"""
+        index = search.get_index()
+        Country.objects.filter(pk=self.australia.pk).update(name='Oz')
+        self.assertIs(search.get_index(), index)
+        cache.bump_dataset_version()
+        self.assertIsNot(search.get_index(), index)
+        self.assertEqual(list(Country.search_countries('oz')), [self.australia])
+    
+    def test_ranked_results_query_a_window_at_a_time(self):
+        """Test that ranked results send at most RANK_WINDOW ids per query and page in Python"""
+        results = Country.search_countries('aus')
+        with self.assertNumQueries(0):
+            self.assertEqual((len(results), results.count()), (2, 2))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(results[1:]), [self.austria])
+        results = Country.search_countries('aus')
+        with mock.patch.object(search, 'RANK_WINDOW', 1), self.assertNumQueries(2):
+            self.assertEqual(list(results), [self.australia, self.austria])
+    
+    def test_api_search_filter_honours_search_fields(self):
+        """Test that the view's search_fields select the index fields ?search= matches"""
+        with mock.patch.object(CountryViewSet, 'search_fields', ['codes', 'name']):
+            response = self.client.get('/api/countries/', {'search': 'europe'})
+            self.assertEqual(response.json()['results'], [])
+            response = self.client.get('/api/countries/', {'search': 'aut'})
+            self.assertEqual([c['cca2'] for c in response.json()['results']], ['AT'])
+        with mock.patch.object(CountryViewSet, 'search_fields', ['capitals']):
+            with self.assertRaises(ImproperlyConfigured):
+                self.client.get('/api/countries/', {'search': 'oceania'})
+    
+    def test_api_search_filter(self):
+        """Test that ?search= uses the ranked index"""
+        response = self.client.get('/api/countries/', {'search': 'europe'})
+        self.assertEqual([c['cca2'] for c in response.json()['results']], ['AT'])
+        
+        response = self.client.get('/api/countries/', {'search': 'aus'})
+        self.assertEqual([c['cca2'] for c in response.json()['results']], ['AU', 'AT'])
+    
+    def test_search_action_renders_results(self):
+        """Test the HTML search action"""
+        response = self.client.get('/api/countries/search/', {'q': 'austr'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Australia')
+    
+    def test_fuzzy_mode(self):
+        """Test that ?fuzzy=1 appends near misses after the regular matches"""
+        self.assertEqual(list(Country.search_countries('autsralia')), [])
+        self.assertEqual(list(Country.search_countries('autsralia', fuzzy=True)), [self.australia])
+        self.assertEqual(list(Country.search_countries('austr', fuzzy=True)), [self.australia, self.austria])
+        
+        response = self.client.get('/api/countries/search/', {'q': 'Austira', 'fuzzy': '1'})
+        self.assertContains(response, '<td>Austria</td>')
+        self.client.force_login(self.user)
+        response = self.client.get('/countries/', {'q': 'Austira'})
+        self.assertContains(response, 'Allow for typos')
+        response = self.client.get('/countries/', {'q': 'Austrlia', 'fuzzy': '1'})
+        self.assertEqual([country.name for country in response.context['countries']], ['Australia', 'Austria'])
@@ -0,0 +1,34 @@
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from countries_api.models import Country
+from countries_api.serializers import CountryListSerializer, country_list_values
+
+
+class CountryListValuesTest(TestCase):
+    """Tests that the values() fast path matches CountryListSerializer"""
+    
+    def setUp(self):
+        for index, capitals in enumerate([['Testville', 'Second City'], [], None, ['Ciudad de México'], ['']]):
+            Country.objects.create(
+                name=f"Country {index}", official_name=f"Republic {index}", cca2=f"C{index}", cca3=f"CC{index}",
+                region='Test Region', flag=f"https://example.com/{index}.png", population=10 ** index,
+                capitals=capitals, raw_data={'large': 'x' * 1000},
+            )
+    
+    def test_identical_output(self):
+        """Test that both paths render byte-for-byte the same JSON"""
+        queryset = Country.objects.all()
+        expected = JSONRenderer().render(CountryListSerializer(queryset, many=True).data)
+        self.assertEqual(JSONRenderer().render(list(country_list_values(queryset))), expected)
+    
+    def test_derived_capital(self):
+        """Test that the capital falls back to N/A like Country.get_capital"""
+        capitals = [row['capital'] for row in country_list_values(Country.objects.order_by('id'))]
+        self.assertEqual(capitals, ['Testville', 'N/A', 'N/A', 'Ciudad de México', ''])
+    
+    def test_single_query_without_raw_data(self):
+        """Test that the fast path runs one query and never selects raw_data"""
+        with self.assertNumQueries(1) as context:
+            list(country_list_values(Country.objects.all()))
+        self.assertNotIn('raw_data', context.captured_queries[0]['sql'])
@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from countries_api import cache, catalog
+from countries_api.catalog import CountryCatalog, get_catalog, invalidate_catalog
+from countries_api.pagination import keyset_page
+from countries_api.snapshot import CountrySnapshot, SnapshotError, read_version, write_current_snapshot, write_snapshot
+from countries_api.tests.factories import create_country
+
+
+class CountrySnapshotTest(APITestCase):
+    """Tests that a memory-mapped snapshot answers like the catalog it was written from"""
+    
+    def setUp(self):
+        cache.get_cache().clear()
+        invalidate_catalog()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'countries.snapshot')
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.alpha = create_country(
+            'Ålpha', 'AA', 'AAA', subregion='North', languages={'eng': 'English', 'fra': 'French'},
+            currencies={'EUR': {'name': 'Euro', 'symbol': '€'}}, borders=['BBB'], timezones=['UTC'],
+        )
+        self.bravo = create_country(
+            'Bravo', 'BB', 'BBB', languages={'eng': 'English'}, borders=['AAA'],
+            currencies={'USD': {'name': 'United States dollar', 'symbol': '$'}},
+        )
+        for index in range(6):
+            create_country('Charlie' if index % 2 else f"Delta {index}", f"C{index}", f"C{index:02d}")
+        # Start from a version that no write of this test has dropped
+        cache.bump_dataset_version()
+    
+    def test_matches_catalog(self):
+        """Test that records, lookups and keyset pages are the same as the catalog's"""
+        built = CountryCatalog.build()
+        write_snapshot(self.path, built, 7)
+        self.assertEqual(read_version(self.path), 7)
+        snapshot = CountrySnapshot(self.path)
+        
+        self.assertEqual(len(snapshot), len(built))
+        self.assertEqual([r.detail_data() for r in snapshot], [r.detail_data() for r in built])
+        self.assertEqual([r.list_data() for r in snapshot[2:5]], [r.list_data() for r in built[2:5]])
+        self.assertEqual(snapshot[-1].id, built[-1].id)
+        self.assertEqual(snapshot.get(str(self.alpha.id)).name, 'Ålpha')
+        self.assertIsNone(snapshot.get(0))
+        self.assertEqual(snapshot.get_by_code('bbb').id, self.bravo.id)
+        self.assertIsNone(snapshot.get_by_code('ZZ'))
+        for lookup, term in [
+            ('speaking', 'english'), ('speaking', 'FRA'), ('using', 'eur'), ('using', 'United States Dollar'),
+            ('using', 'xxx'), ('in_region', 'Test Region'), ('in_subregion', 'North'),
+        ]:
+            self.assertEqual(
+                [r.id for r in getattr(snapshot, lookup)(term)], [r.id for r in getattr(built, lookup)(term)], term
+            )
+        
+        def walk(source):
+            pages = [keyset_page(source, None, 3, with_count=True)]
+            while pages[-1].has_next():
+                pages.append(keyset_page(source, pages[-1].next_cursor, 3))
+            return [[country.id for country in page] for page in pages]
+        
+        self.assertEqual(walk(snapshot), walk(built))
+        with self.assertRaises(AttributeError):
+            snapshot.get(self.alpha.id).name = 'Changed'
+    
+    def test_workers_map_current_snapshot(self):
+        """Test that the catalog is read from a snapshot of the current version, and a replaced one is picked up"""
+        with override_settings(COUNTRIES_SNAPSHOT_PATH=self.path):
+            write_current_snapshot(self.path)
+            self.assertIsInstance(get_catalog(), CountrySnapshot)
+            with self.assertNumQueries(1):  # The dataset version
+                response = self.client.get(f"/api/countries/{self.bravo.id}/")
+            self.assertEqual(response.json()['neighbours'][0]['cca3'], 'AAA')
+            
+            # A sync writes a snapshot of a newer version
+            cache.bump_dataset_version()
+            write_current_snapshot(self.path)
+            snapshot = get_catalog()
+            self.assertEqual(snapshot.version, cache.get_dataset_version())
+            self.assertIs(get_catalog(), snapshot)
+    
+    def test_stale_snapshot_falls_back_to_database(self):
+        """Test that a snapshot older than the dataset, or written before a local write, is not used"""
+        with override_settings(COUNTRIES_SNAPSHOT_PATH=self.path):
+            write_current_snapshot(self.path)
+            cache.bump_dataset_version()
+            self.assertNotIsInstance(get_catalog(), CountrySnapshot)
+            
+            write_current_snapshot(self.path)
+            self.bravo.population = 42
+            self.bravo.save()
+            self.assertEqual(get_catalog().get(self.bravo.id).population, 42)
+            
+            # A catalog built from the database looks for a newer snapshot now and then
+            cache.bump_dataset_version()
+            get_catalog()
+            write_current_snapshot(self.path)
+            self.assertNotIsInstance(get_catalog(), CountrySnapshot)
+            with mock.patch.object(catalog, 'SNAPSHOT_CHECK_INTERVAL', 0):
+                self.assertIsInstance(get_catalog(), CountrySnapshot)
+    
+    def test_invalid_files(self):
+        """Test that empty and foreign files are rejected"""
+        open(self.path, 'wb').close()
+        with self.assertRaises(SnapshotError):
+            CountrySnapshot(self.path)
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot' * 10)
+        with self.assertRaises(SnapshotError):
+            CountrySnapshot(self.path)
+        self.assertIsNone(read_version(self.path))
+        self.assertIsNone(read_version(os.path.join(self.directory, 'missing')))
+        with override_settings(COUNTRIES_SNAPSHOT_PATH=self.path):
+            self.assertEqual(len(get_catalog()), 8)
+    
+    def test_fetch_countries_writes_snapshot(self):
+        """Test that the sync command writes a snapshot, also when upstream is unchanged but the dataset is not"""
+        out = StringIO()
+        with mock.patch(
+            'countries_api.management.commands.fetch_countries.fetch_and_store_countries',
+            return_value={'status': 'not_modified'},
+        ):
+            call_command('fetch_countries', snapshot=self.path, stdout=out)
+            self.assertIn('Wrote country snapshot', out.getvalue())
+            self.assertEqual(read_version(self.path), cache.get_dataset_version())
+            
+            out = StringIO()
+            call_command('fetch_countries', snapshot=self.path, stdout=out)
+            self.assertNotIn('Wrote country snapshot', out.getvalue())
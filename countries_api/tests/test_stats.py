@@ -0,0 +1,101 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APITestCase
+
+from countries_api.models import Country, RegionStats, SubregionStats
+from countries_api.tests.test_utils import make_country_data
+from countries_api.utils import store_countries
+
+
+class RegionStatsSyncTest(TestCase):
+    """Tests that the sync keeps the summary tables current"""
+    
+    def setUp(self):
+        self.payload = [
+            make_country_data('AAA', 'AA', 'Alpha', region='Europe', subregion='Western Europe', population=100,
+                              languages={'fra': 'French'}, currencies={'EUR': {'name': 'Euro', 'symbol': '€'}}),
+            make_country_data('BBB', 'BB', 'Beta', region='Europe', subregion='Western Europe', population=300,
+                              languages={'fra': 'French', 'deu': 'German'}),
+            make_country_data('CCC', 'CC', 'Gamma', region='Europe', subregion='Northern Europe', population=50),
+            make_country_data('DDD', 'DD', 'Delta', region='Asia', population=10),
+        ]
+    
+    def sync(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return store_countries(payload)
+    
+    def test_sync_builds_stats(self):
+        """Test region and subregion figures after a first sync"""
+        self.sync(self.payload)
+        
+        europe = RegionStats.objects.get(region='Europe')
+        self.assertEqual((europe.country_count, europe.total_population), (3, 450))
+        self.assertEqual(europe.average_population, 150)
+        self.assertEqual((europe.language_count, europe.currency_count), (3, 1))
+        
+        western = SubregionStats.objects.get(region='Europe', subregion='Western Europe')
+        self.assertEqual((western.country_count, western.language_count), (2, 2))
+        self.assertTrue(SubregionStats.objects.filter(region='Asia', subregion='').exists())
+    
+    def test_resync_refreshes_touched_regions_only(self):
+        """Test that changed, moved and removed countries update their regions"""
+        self.sync(self.payload)
+        europe_updated_at = RegionStats.objects.get(region='Europe').updated_at
+        
+        moved = make_country_data('CCC', 'CC', 'Gamma', region='Africa', subregion='Northern Africa', population=50)
+        self.sync(self.payload[:2] + [moved])
+        
+        self.assertEqual(RegionStats.objects.get(region='Europe').country_count, 2)
+        self.assertEqual(RegionStats.objects.get(region='Africa').total_population, 50)
+        self.assertFalse(RegionStats.objects.filter(region='Asia').exists())
+        self.assertFalse(SubregionStats.objects.filter(subregion='Northern Europe').exists())
+        self.assertNotEqual(RegionStats.objects.get(region='Europe').updated_at, europe_updated_at)
+        
+        with self.assertNumQueries(3):  # Savepoint, existing hashes, release: no region is refreshed
+            self.sync(self.payload[:2] + [moved])
+
+
+class RegionStatsApiTest(APITestCase):
+    """Tests for the read-only summary endpoints"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+    
+    def create_country(self, **fields):
+        data = {
+            'name': 'Test Country', 'official_name': 'Test Country', 'cca2': 'TC', 'cca3': 'TCY',
+            'flag': 'https://example.com/flag.png', 'region': 'Europe', 'subregion': 'Western Europe',
+            'population': 1000, 'languages': {'eng': 'English'},
+        }
+        data.update(fields)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/countries/', data, format='json')
+    
+    def test_api_writes_refresh_stats(self):
+        """Test that creating, moving and deleting countries through the API refreshes both regions"""
+        self.create_country()
+        country_id = Country.objects.get(cca3='TCY').id
+        self.create_country(cca2='TD', cca3='TDD', population=3000, languages={'fra': 'French'})
+        europe = self.client.get('/api/regions/Europe/').data
+        self.assertEqual((europe['country_count'], europe['total_population'], europe['language_count']), (2, 4000, 2))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/countries/{country_id}/', {'region': 'Asia', 'subregion': ''}, format='json')
+        self.assertEqual(self.client.get('/api/regions/Europe/').data['country_count'], 1)
+        self.assertEqual(self.client.get('/api/regions/Asia/').data['country_count'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/countries/{country_id}/')
+        self.assertEqual(self.client.get('/api/regions/Asia/').status_code, 404)
+    
+    def test_single_query(self):
+        """Test that the endpoints read the summary table with one query"""
+        self.create_country()
+        self.create_country(cca2='TD', cca3='TDD', region='Asia', subregion='Eastern Asia')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/regions/')
+        self.assertEqual([row['region'] for row in response.data], ['Asia', 'Europe'])
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/subregions/', {'region': 'Asia'})
+        self.assertEqual([row['subregion'] for row in response.data], ['Eastern Asia'])
@@ -0,0 +1,442 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import requests
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from countries_api.models import Country, CountryName, CountryRawData, SyncState
+from countries_api.sources import iter_json_array, iter_ndjson_range, ndjson_ranges
+from countries_api.sync_client import SyncClient
+from countries_api.tests.upstream import StubUpstream
+from countries_api.utils import (
+    PARTITION_QUEUE_BATCHES,
+    CountryBatchWriter,
+    compute_content_hash,
+    fetch_and_store_countries,
+    fetch_and_store_regions,
+    store_countries,
+    store_partitions,
+)
+
+
+def make_country_data(cca3, cca2, name, **extra):
+    """Return a minimal REST Countries record"""
+    data = {
+        'name': {'common': name, 'official': f"Republic of {name}"},
+        'cca2': cca2,
+        'cca3': cca3,
+        'flags': {'png': f"https://example.com/{cca2}.png"},
+        'region': 'Test Region',
+        'population': 1000,
+        'languages': {'eng': 'English'},
+        'capital': [f"{name} City"],
+    }
+    data.update(extra)
+    return data
+
+
+class StoreCountriesTest(TestCase):
+    """Tests for the batched sync pipeline"""
+    
+    def setUp(self):
+        self.payload = [
+            make_country_data('AAA', 'AA', 'Alpha'),
+            make_country_data('BBB', 'BB', 'Beta'),
+            make_country_data('CCC', 'CC', 'Gamma'),
+        ]
+    
+    def test_initial_sync_creates_countries(self):
+        """Test a sync into an empty table"""
+        result = store_countries(self.payload, batch_size=2)
+        
+        self.assertEqual(result, {'created': 3, 'updated': 0, 'unchanged': 0, 'removed': 0, 'total': 3})
+        alpha = Country.objects.get(cca3='AAA')
+        self.assertEqual(alpha.name, 'Alpha')
+        self.assertEqual(alpha.capitals, ['Alpha City'])
+        self.assertEqual(alpha.content_hash, compute_content_hash(self.payload[0]))
+        self.assertEqual(list(Country.get_countries_by_language('english').order_by('cca3')),
+                         list(Country.objects.order_by('cca3')))
+    
+    def test_resync_skips_unchanged_and_removes_missing(self):
+        """Test that only changed rows are rewritten and missing rows are deleted"""
+        store_countries(self.payload)
+        beta_updated_at = Country.objects.get(cca3='BBB').updated_at
+        
+        changed = make_country_data('AAA', 'AA', 'Alpha', population=2000, languages={'fra': 'French'})
+        result = store_countries([changed, self.payload[1]])
+        
+        self.assertEqual(result, {'created': 0, 'updated': 1, 'unchanged': 1, 'removed': 1, 'total': 2})
+        self.assertEqual(Country.objects.get(cca3='AAA').population, 2000)
+        self.assertEqual(Country.objects.get(cca3='BBB').updated_at, beta_updated_at)
+        self.assertFalse(Country.objects.filter(cca3='CCC').exists())
+        self.assertEqual([c.cca3 for c in Country.get_countries_by_language('french')], ['AAA'])
+    
+    def test_raw_data_is_stored_compressed_on_the_side(self):
+        """Test that the upstream document lives in CountryRawData and is only read on access"""
+        store_countries(self.payload)
+        changed = make_country_data('AAA', 'AA', 'Alpha', population=2000)
+        store_countries([changed] + self.payload[1:])
+        
+        self.assertEqual(CountryRawData.objects.count(), 3)
+        stored = CountryRawData.objects.get(country__cca3='AAA')
+        self.assertLess(len(stored.compressed), len(json.dumps(changed)))
+        with self.assertNumQueries(1):
+            alpha = Country.objects.get(cca3='AAA')
+        with self.assertNumQueries(1):
+            self.assertEqual(alpha.raw_data, changed)
+            self.assertEqual(alpha.raw_data, changed)
+        
+        store_countries(self.payload[1:])
+        self.assertFalse(CountryRawData.objects.filter(country__cca3='AAA').exists())
+    
+    def test_raw_data_saved_with_the_model(self):
+        """Test that assigning raw_data on a Country writes the side table on save"""
+        country = Country.objects.create(
+            name='Delta', official_name='Delta', cca2='DD', cca3='DDD', flag='https://example.com/dd.png',
+            region='Test Region', population=1, raw_data={'name': {'common': 'Delta'}},
+        )
+        self.assertEqual(Country.objects.get(pk=country.pk).raw_data, {'name': {'common': 'Delta'}})
+        
+        country.raw_data = {'name': {'common': 'Delta 2'}}
+        country.save()
+        self.assertEqual(Country.objects.get(pk=country.pk).raw_data, {'name': {'common': 'Delta 2'}})
+        self.assertEqual(Country.objects.create(
+            name='Echo', official_name='Echo', cca2='EE', cca3='EEE', flag='https://example.com/ee.png',
+            region='Test Region', population=1,
+        ).raw_data, {})
+    
+    def test_sync_links_neighbours_across_batches(self):
+        """Test that borders resolve even when the neighbour arrives in a later batch"""
+        self.payload[0]['borders'] = ['CCC']
+        self.payload[2]['borders'] = ['AAA', 'XXX']
+        store_countries(self.payload, batch_size=1)
+        
+        alpha = Country.objects.get(cca3='AAA')
+        self.assertEqual([c.cca3 for c in alpha.neighbours.all()], ['CCC'])
+        self.assertEqual([c.cca3 for c in Country.objects.get(cca3='CCC').neighbours.all()], ['AAA'])
+        
+        changed = make_country_data('AAA', 'AA', 'Alpha', borders=['BBB'])
+        store_countries([changed] + self.payload[1:])
+        self.assertEqual([c.cca3 for c in alpha.neighbours.all()], ['BBB'])
+    
+    def test_resync_writes_only_changed_relations(self):
+        """Test that a changed country keeps its unchanged language, currency, name and border rows"""
+        self.payload[0].update(borders=['BBB'], currencies={'EUR': {'name': 'Euro', 'symbol': '€'}})
+        self.payload[0]['translations'] = {'fra': {'common': 'Alpha', 'official': 'Alpha'}}
+        store_countries(self.payload)
+        
+        self.payload[0]['population'] = 2000
+        with CaptureQueriesContext(connection) as context:
+            result = store_countries(self.payload)
+        self.assertEqual(result['updated'], 1)
+        tables = ('_spoken_languages"', '_used_currencies"', '_neighbours"', '_countryname"', '_language"', '_currency"')
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if not query['sql'].startswith('SELECT') and any(table in query['sql'] for table in tables)
+        ]
+        self.assertEqual(writes, [])
+        
+        self.payload[0]['translations']['fra']['common'] = 'Alpha (fr)'
+        self.payload[0]['languages']['fra'] = 'French'
+        name = CountryName.objects.get(country__cca3='AAA')
+        english = Country.spoken_languages.through.objects.get(country__cca3='AAA')
+        store_countries(self.payload)
+        self.assertEqual(CountryName.objects.get(pk=name.pk).common, 'Alpha (fr)')
+        self.assertTrue(Country.spoken_languages.through.objects.filter(pk=english.pk).exists())
+        self.assertEqual(
+            sorted(Country.objects.get(cca3='AAA').spoken_languages.values_list('code', flat=True)), ['eng', 'fra']
+        )
+    
+    def test_partial_sync_keeps_missing_countries(self):
+        """Test that remove_missing=False leaves unseen countries alone"""
+        store_countries(self.payload)
+        
+        result = store_countries(self.payload[:1], remove_missing=False)
+        
+        self.assertEqual(result['removed'], 0)
+        self.assertEqual(Country.objects.count(), 3)
+
+
+class StorePartitionsTest(TestCase):
+    """Tests for the bounded, streaming load of partitions"""
+    
+    def test_partitions_stream_with_bounded_work(self):
+        """Test that only workers partitions load at a time, each a few batches ahead of the writer"""
+        workers, batch_size, size = 2, 2, 20
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0, 'produced': 0, 'written': 0, 'lag': 0}
+        
+        def partition(number):
+            def records():
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                try:
+                    for index in range(size):
+                        with lock:
+                            state['produced'] += 1
+                        yield make_country_data(
+                            f"P{number}{index:02d}", f"{number}{index}", f"Country {number} {index}"
+                        )
+                finally:
+                    with lock:
+                        state['active'] -= 1
+            return f"p{number}", records
+        
+        write_batch = CountryBatchWriter.write_batch
+        
+        def counting_write_batch(writer, batch):
+            with lock:
+                state['lag'] = max(state['lag'], state['produced'] - state['written'])
+                state['written'] += len(batch)
+            write_batch(writer, batch)
+        
+        with mock.patch.object(CountryBatchWriter, 'write_batch', counting_write_batch):
+            result = store_partitions((partition(number) for number in range(6)), workers, batch_size=batch_size)
+        
+        self.assertEqual((result['created'], result['partitions'], result['skipped']), (6 * size, 6, []))
+        self.assertEqual(Country.objects.count(), 6 * size)
+        self.assertLessEqual(state['peak'], workers)
+        # Per loader: the queued batches and one waiting to be queued, plus the batch being written
+        self.assertLessEqual(state['lag'], workers * (PARTITION_QUEUE_BATCHES + 1) * batch_size + batch_size)
+    
+    def test_writer_error_releases_loaders(self):
+        """Test that loaders blocked on a full queue stop when the writer fails"""
+        def load():
+            return (make_country_data(f"E{index:03d}", f"{index}", f"Country {index}") for index in range(100))
+        
+        with mock.patch.object(CountryBatchWriter, 'write_batch', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                store_partitions([('a', load), ('b', load)], 2, batch_size=1)
+        self.assertEqual(Country.objects.count(), 0)
+
+
+    def test_failed_partition_rolls_back_its_batches(self):
+        """Test that a partition failing after some batches were written leaves neither rows nor counts"""
+        store_countries([make_country_data('KEP', 'KE', 'Kept')])
+        
+        def good():
+            return [make_country_data('GOO', 'GO', 'Good')]
+        
+        def failing():
+            yield make_country_data('KEP', 'KE', 'Renamed')
+            yield make_country_data('NEW', 'NE', 'New')
+            raise RuntimeError('connection reset')
+        
+        write_batch = CountryBatchWriter.write_batch
+        with mock.patch.object(CountryBatchWriter, 'write_batch', autospec=True, side_effect=write_batch) as written:
+            with self.assertLogs('countries_api.utils', 'ERROR'):
+                result = store_partitions([('bad', failing), ('good', good)], 1, batch_size=1)
+        
+        self.assertEqual(written.call_count, 3)
+        self.assertEqual(list(result['failed']), ['bad'])
+        self.assertEqual((result['created'], result['updated'], result['removed'], result['total']), (1, 0, 0, 1))
+        self.assertEqual(Country.objects.get(cca3='KEP').name, 'Kept')
+        self.assertEqual(sorted(Country.objects.values_list('cca3', flat=True)), ['GOO', 'KEP'])
+
+
+class StreamingSourcesTest(TestCase):
+    """Tests for the incremental payload readers and the fetch_countries sources"""
+    
+    def setUp(self):
+        self.payload = [
+            make_country_data('AAA', 'AA', 'Ålpha'),
+            make_country_data('BBB', 'BB', 'Beta', population=12345),
+        ]
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+    
+    def test_iter_json_array_across_chunk_boundaries(self):
+        """Test that records split across tiny chunks are decoded intact"""
+        data = json.dumps(self.payload, ensure_ascii=False).encode('utf-8')
+        chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+        
+        self.assertEqual(list(iter_json_array(chunks)), self.payload)
+        self.assertEqual(list(iter_json_array([b' [ ] '])), [])
+    
+    def test_iter_json_array_rejects_truncated_payload(self):
+        """Test that a truncated payload raises instead of silently stopping"""
+        data = json.dumps(self.payload).encode('utf-8')[:-10]
+        with self.assertRaises(ValueError):
+            list(iter_json_array([data]))
+    
+    def test_fetch_countries_from_file(self):
+        """Test the --file source of the fetch_countries command"""
+        path = os.path.join(self.tmpdir.name, 'countries.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.payload, f)
+        
+        call_command('fetch_countries', file=path, batch_size=1, stdout=io.StringIO())
+        
+        self.assertEqual(Country.objects.get(cca3='AAA').name, 'Ålpha')
+        self.assertEqual(Country.objects.get(cca3='BBB').population, 12345)
+    
+    def test_fetch_countries_from_ndjson(self):
+        """Test the --ndjson source of the fetch_countries command"""
+        path = os.path.join(self.tmpdir.name, 'countries.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.payload:
+                f.write(json.dumps(record) + '\n')
+        
+        out = io.StringIO()
+        call_command('fetch_countries', ndjson=path, stdout=out)
+        
+        self.assertIn('2 created', out.getvalue())
+        self.assertEqual(Country.objects.count(), 2)
+    
+    def test_ndjson_ranges_cover_every_line_once(self):
+        """Test that the chunks of an NDJSON file split on line boundaries"""
+        path = os.path.join(self.tmpdir.name, 'countries.ndjson')
+        records = [make_country_data(f"C{index:02d}", f"{index:02d}", f"Country {index}") for index in range(25)]
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n\n')
+        
+        for parts in (1, 3, 7, 100):
+            ranges = ndjson_ranges(path, parts)
+            self.assertLessEqual(len(ranges), parts)
+            loaded = [record for start, end in ranges for record in iter_ndjson_range(path, start, end)]
+            self.assertEqual(loaded, records, parts)
+    
+    def test_fetch_countries_from_ndjson_in_parallel(self):
+        """Test that --workers parses an NDJSON file in chunks"""
+        path = os.path.join(self.tmpdir.name, 'countries.ndjson')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in self.payload:
+                f.write(json.dumps(record) + '\n')
+        
+        out = io.StringIO()
+        call_command('fetch_countries', ndjson=path, workers=2, stdout=out)
+        
+        self.assertIn('2 created', out.getvalue())
+        self.assertEqual(Country.objects.get(cca3='AAA').name, 'Ålpha')
+
+
+class ConditionalFetchTest(TestCase):
+    """Tests for the conditional, retrying HTTP sync against a local stand-in server"""
+    
+    def setUp(self):
+        self.payload = [
+            make_country_data('AAA', 'AA', 'Alpha'),
+            make_country_data('BBB', 'BB', 'Beta'),
+        ]
+    
+    def test_etag_short_circuits_with_not_modified(self):
+        """Test that the second sync sends If-None-Match and skips on 304"""
+        with StubUpstream({'/all': self.payload}) as upstream:
+            first = fetch_and_store_countries(upstream.url('/all'))
+            second = fetch_and_store_countries(upstream.url('/all'))
+            
+            self.assertEqual(first['status'], 'synced')
+            self.assertEqual(first['created'], 2)
+            self.assertEqual(second['status'], 'not_modified')
+            headers = upstream.requests[-1][1]
+            self.assertEqual(headers['If-None-Match'], SyncState.objects.get().etag)
+            self.assertIn('gzip', headers['Accept-Encoding'])
+    
+    def test_identical_body_short_circuits_without_etag(self):
+        """Test that an unchanged body is detected by its hash when upstream has no validators"""
+        with StubUpstream({'/all': self.payload}, etags=False) as upstream:
+            fetch_and_store_countries(upstream.url('/all'))
+            second = fetch_and_store_countries(upstream.url('/all'))
+            
+            upstream.set_payload('/all', self.payload[:1])
+            third = fetch_and_store_countries(upstream.url('/all'))
+        
+        self.assertEqual(second['status'], 'unchanged')
+        self.assertEqual(third['status'], 'synced')
+        self.assertEqual(third['removed'], 1)
+    
+    def test_retries_transient_errors(self):
+        """Test that 503 responses are retried before giving up"""
+        client = SyncClient(backoff_factor=0)
+        with StubUpstream({'/all': self.payload}) as upstream:
+            upstream.failures['/all'] = [503, 503]
+            result = fetch_and_store_countries(upstream.url('/all'), client=client)
+            
+            upstream.failures['/all'] = [500] * 10
+            with self.assertRaises(requests.RequestException), self.assertLogs('countries_api.utils', 'ERROR'):
+                fetch_and_store_countries(upstream.url('/all'), force=True, client=client)
+        
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(len(upstream.requests), 3 + 4)
+
+
+class ParallelRegionFetchTest(TestCase):
+    """Tests for the partitioned sync against region endpoints served with latency"""
+    
+    def setUp(self):
+        self.routes = {
+            f"/region/{region}": [
+                make_country_data(f"R{number}{index}", f"{number}{index}", f"{region.title()} {index}",
+                                  region=region.title())
+                for index in range(3)
+            ]
+            for number, region in enumerate(['africa', 'asia', 'europe', 'oceania'])
+        }
+        self.regions = [path.split('/')[-1] for path in self.routes]
+    
+    def test_regions_are_fetched_concurrently(self):
+        """Test that region downloads overlap and every partition is stored"""
+        delay = 0.3
+        with StubUpstream(self.routes, delay=delay) as upstream:
+            start = time.perf_counter()
+            result = fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), workers=4)
+            elapsed = time.perf_counter() - start
+        
+        self.assertLess(elapsed, delay * len(self.regions) / 2)
+        self.assertEqual(result['created'], 12)
+        self.assertEqual((result['partitions'], result['failed']), (4, {}))
+        self.assertEqual(Country.objects.filter(region='Asia').count(), 3)
+    
+    def test_unchanged_regions_are_skipped(self):
+        """Test that each region is fetched conditionally on its own validators"""
+        with StubUpstream(self.routes) as upstream:
+            fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), workers=2)
+            second = fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), workers=2)
+            conditional = [headers.get('If-None-Match') for path, headers in upstream.requests[len(self.regions):]]
+            
+            upstream.set_payload('/region/asia', self.routes['/region/asia'][:1] + [
+                make_country_data('R1X', '1X', 'Asia X', region='Asia'),
+            ])
+            third = fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), workers=2)
+            forced = fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), workers=2, force=True)
+        
+        self.assertEqual(second['status'], 'not_modified')
+        self.assertTrue(all(conditional))
+        self.assertEqual(third['status'], 'synced')
+        self.assertEqual(sorted(third['skipped']), ['africa', 'europe', 'oceania'])
+        self.assertEqual((third['created'], third['removed']), (1, 0))
+        self.assertEqual((forced['skipped'], forced['removed']), ([], 2))
+        self.assertEqual(SyncState.objects.count(), len(self.regions))
+        self.assertEqual(Country.objects.filter(region='Asia').count(), 2)
+    
+    def test_failed_partition_is_isolated(self):
+        """Test that a failing region neither aborts the sync nor removes its countries"""
+        client = SyncClient(backoff_factor=0)
+        with StubUpstream(self.routes) as upstream:
+            fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), client=client)
+            upstream.failures['/region/asia'] = [500] * 10
+            upstream.set_payload('/region/europe', self.routes['/region/europe'][:1])
+            
+            with self.assertLogs('countries_api.utils', 'ERROR'):
+                result = fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), client=client)
+            
+            upstream.failures['/region/asia'] = []
+            for path in self.routes:
+                upstream.failures[path] = [500] * 10
+            with self.assertRaises(requests.RequestException), self.assertLogs('countries_api.utils', 'ERROR'):
+                fetch_and_store_regions(self.regions, upstream.url('/region/{region}'), client=client)
+        
+        self.assertEqual(list(result['failed']), ['asia'])
+        self.assertEqual(result['removed'], 0)
+        self.assertEqual(Country.objects.filter(region='Asia').count(), 3)
+        self.assertEqual(Country.objects.count(), 12)
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client, RequestFactory
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 from django.contrib.auth.models import User
 from django.contrib.messages.storage.fallback import FallbackStorage
@@ -14,6 +14,7 @@ from unittest.mock import patch, MagicMock
 from rest_framework.test import APITestCase, force_authenticate
 
 from countries_api.models import Country
+from countries_api.serializers import CountryCreateUpdateSerializer
 from countries_api.views import (
     CountryViewSet, 
     country_list_view, 
@@ -91,6 +92,7 @@ class CountryViewSetTest(APITestCase):
         # Set up the viewset
         self.viewset = CountryViewSet()
     
+    @override_settings(COUNTRIES_CATALOG=False)
     @patch('countries_api.views.render')
     @patch('countries_api.views.Country.objects.all')
     @patch('countries_api.views.Country.objects.filter')
@@ -125,17 +127,14 @@ class CountryViewSetTest(APITestCase):
         mock_render.assert_called_once()  # confirm render was called
         self.assertEqual(response.status_code, 200)
     
+    @override_settings(COUNTRIES_CATALOG=False)
     @patch('countries_api.views.render')
-    @patch('countries_api.views.Country.objects.all')
-    def test_by_language(self, mock_all, mock_render):
+    @patch('countries_api.views.Country.get_countries_by_language')
+    def test_by_language(self, mock_by_language, mock_render):
         """Test the by_language action"""
-        # Setup mock countries
-        mock_country1 = MagicMock()
-        mock_country1.languages = {'en': 'English', 'fr': 'French'}
-        mock_country2 = MagicMock()
-        mock_country2.languages = {'es': 'Spanish'}
-
-        mock_all.return_value = [mock_country1, mock_country2]
+        # Setup mock queryset
+        mock_queryset = MagicMock()
+        mock_by_language.return_value = mock_queryset
 
         # Mock render to avoid loading template
         mock_render.return_value = HttpResponse('Mocked HTML')
@@ -152,17 +151,17 @@ class CountryViewSetTest(APITestCase):
         response = self.viewset.by_language(request)
 
         # Assertions
-        mock_all.assert_called_once()
+        mock_by_language.assert_called_once_with('english')
         mock_render.assert_called_once()  # confirm render was called
         self.assertEqual(response.status_code, 200)
         
     @patch('countries_api.views.render')
-    @patch('countries_api.views.Country.objects.filter')
-    def test_search_with_query(self, mock_filter, mock_render):
+    @patch('countries_api.views.search_countries')
+    def test_search_with_query(self, mock_search, mock_render):
         """Test the search action with query parameter"""
         # Setup mock queryset
         mock_queryset = MagicMock()
-        mock_filter.return_value = mock_queryset
+        mock_search.return_value = mock_queryset
 
         # Mock render to avoid loading actual template
         mock_render.return_value = HttpResponse('Mocked HTML')
@@ -182,10 +181,7 @@ class CountryViewSetTest(APITestCase):
 
         # Assertions
         self.assertEqual(response.status_code, 200)
-
-        expected_query = Q(name__icontains='test') | Q(official_name__icontains='test')
-        mock_filter.assert_called_once_with(expected_query)
-
+        mock_search.assert_called_once_with('test', fuzzy=False)
         mock_render.assert_called_once()
     
     @patch('countries_api.views.render')
@@ -233,9 +229,88 @@ class CountryViewSetTest(APITestCase):
         self.assertEqual(self.viewset.get_serializer_class().__name__, 'CountrySerializer')
 
 
+class CountryRelationsTest(APITestCase):
+    """Tests for the normalized language, currency and border relations"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword123')
+        self.client.force_authenticate(user=self.user)
+        self.serializer_data = {
+            'name': 'Test Country',
+            'official_name': 'The Republic of Test',
+            'cca2': 'TC',
+            'cca3': 'TCY',
+            'region': 'Test Region',
+            'population': 1000000,
+            'flag': 'https://example.com/flag.png',
+            'languages': {'eng': 'English', 'tst': 'Testish'},
+            'currencies': {'TST': {'name': 'Test Dollar', 'symbol': 'T$'}},
+            'borders': ['NBR'],
+        }
+        self.neighbour = Country.objects.create(
+            name='Neighbour', official_name='Neighbour', cca2='NB', cca3='NBR',
+            flag='https://example.com/nb.png', region='Test Region', population=10,
+            borders=['TCY'],
+        )
+    
+    def _create_country(self):
+        serializer = CountryCreateUpdateSerializer(data=self.serializer_data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+    
+    def test_serializer_builds_relations(self):
+        """Test that creating and updating a country keeps the relations in sync"""
+        country = self._create_country()
+        self.assertEqual(set(country.spoken_languages.values_list('code', flat=True)), {'eng', 'tst'})
+        self.assertEqual(list(country.used_currencies.values_list('code', flat=True)), ['TST'])
+        self.assertEqual(list(country.neighbours.all()), [self.neighbour])
+        
+        serializer = CountryCreateUpdateSerializer(
+            country, data={'languages': {'fra': 'French'}, 'borders': []}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(list(country.spoken_languages.values_list('code', flat=True)), ['fra'])
+        self.assertEqual(list(country.neighbours.all()), [])
+    
+    def test_lookups_match_name_and_code(self):
+        """Test language and currency lookups by name or code, case-insensitively"""
+        country = self._create_country()
+        self.neighbour.refresh_relations()
+        
+        self.assertEqual(list(Country.get_countries_by_language('ENGLISH')), [country])
+        self.assertEqual(list(Country.get_countries_by_language('eng')), [country])
+        self.assertEqual(list(Country.get_countries_by_language('French')), [])
+        self.assertEqual(list(Country.get_countries_by_currency('tst')), [country])
+        self.assertEqual(list(Country.get_countries_by_currency('test dollar')), [country])
+        self.assertEqual(list(Country.get_countries_with_borders(['TCY'])), [self.neighbour])
+    
+    def test_by_language_json_response(self):
+        """Test the JSON variant of the by_language action"""
+        self._create_country()
+        
+        response = self.client.get('/api/countries/by_language/', {'language': 'English', 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['cca2'] for c in response.json()['results']], ['TC'])
+        
+        response = self.client.get('/api/countries/by_language/', {'format': 'json'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_retrieve_includes_relations(self):
+        """Test that the detail endpoint exposes the prefetched relations"""
+        country = self._create_country()
+        
+        response = self.client.get(f'/api/countries/{country.id}/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['used_currencies'], [{'code': 'TST', 'name': 'Test Dollar', 'symbol': 'T$'}])
+        self.assertEqual(data['neighbours'], [{'id': self.neighbour.id, 'name': 'Neighbour', 'cca3': 'NBR'}])
+
+
 class CountryViewsTest(TestViewSetup):
     """Tests for the country_list_view and country_detail_view functions"""
     
+    @override_settings(COUNTRIES_CATALOG=False)
     @patch('countries_api.views.Country.objects.all')
     @patch('countries_api.views.Country.objects.filter')
     def test_country_list_view_no_search(self, mock_filter, mock_all):
@@ -256,12 +331,12 @@ class CountryViewsTest(TestViewSetup):
         mock_all.assert_called_once()
         mock_filter.assert_not_called()
     
-    @patch('countries_api.views.Country.objects.filter')
-    def test_country_list_view_with_search(self, mock_filter):
+    @patch('countries_api.views.search_countries')
+    def test_country_list_view_with_search(self, mock_search):
         """Test country_list_view with search query"""
         # Setup mock queryset
         mock_queryset = MagicMock()
-        mock_filter.return_value = mock_queryset
+        mock_search.return_value = mock_queryset
         
         # Create request
         request = self.factory.get('/countries/', {'q': 'test'})
@@ -272,8 +347,9 @@ class CountryViewsTest(TestViewSetup):
         
         # Assertions
         self.assertEqual(response.status_code, 200)
-        mock_filter.assert_called_once()
+        mock_search.assert_called_once_with('test', fuzzy=False)
     
+    @override_settings(COUNTRIES_CATALOG=False)
     @patch('countries_api.views.get_object_or_404')
     @patch('countries_api.views.Country.objects.filter')
     def test_country_detail_view(self, mock_filter, mock_get_object):
@@ -455,16 +531,17 @@ class IntegrationTests(TestCase):
             'currencies': {'TST': {'name': 'Test Dollar', 'symbol': 'T$'}}
         }
     
+    @override_settings(COUNTRIES_CATALOG=False)
     @patch('countries_api.views.Country.objects.all')
-    @patch('countries_api.views.Country.objects.filter')
-    def test_country_list_view_integration(self, mock_filter, mock_all):
+    @patch('countries_api.views.search_countries')
+    def test_country_list_view_integration(self, mock_search, mock_all):
         """Integration test for country_list_view"""
         # Setup mock queryset
         mock_queryset = MagicMock()
         # Make the mock behave like a queryset
         mock_queryset.__iter__.return_value = []
         mock_all.return_value = mock_queryset
-        mock_filter.return_value = mock_queryset
+        mock_search.return_value = mock_queryset
         
         # Login
         self.client.login(username=self.username, password=self.password)
@@ -477,8 +554,9 @@ class IntegrationTests(TestCase):
         # Test with search query
         response = self.client.get(reverse('country_list') + '?q=test')
         self.assertEqual(response.status_code, 200)
-        mock_filter.assert_called()
+        mock_search.assert_called()
     
+    @override_settings(COUNTRIES_CATALOG=False)
     @patch('countries_api.views.get_object_or_404')
     @patch('countries_api.views.Country.objects.filter')
     def test_country_detail_view_integration(self, mock_filter, mock_get_object):
@@ -0,0 +1,87 @@
+"""Local stand-in for the REST Countries API used by the sync tests."""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubUpstream:
+    """
+    Serve JSON payloads from a background thread.
+
+    routes maps request paths to payloads. Responses carry an ETag and honour
+    If-None-Match when etags is True, are gzipped when the client accepts it,
+    and can be delayed or preceded by error statuses queued in failures[path].
+    """
+
+    def __init__(self, routes, etags=True, delay=0):
+        self.routes = {path: json.dumps(payload).encode('utf-8') for path, payload in routes.items()}
+        self.etags = etags
+        self.delay = delay
+        self.failures = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+
+    def set_payload(self, path, payload):
+        self.routes[path] = json.dumps(payload).encode('utf-8')
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with upstream.lock:
+                    upstream.requests.append((self.path, dict(self.headers)))
+                    failures = upstream.failures.get(self.path)
+                    status = failures.pop(0) if failures else None
+                if upstream.delay:
+                    time.sleep(upstream.delay)
+                if status:
+                    self.send_response(status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = upstream.routes.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if upstream.etags and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if upstream.etags:
+                    self.send_header('ETag', etag)
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
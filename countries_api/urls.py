@@ -1,16 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
+from .metrics import metrics_view
 from .views import CustomLogoutView
 
 router = DefaultRouter()
 router.register(r'countries', views.CountryViewSet)
+router.register(r'regions', views.RegionStatsViewSet)
+router.register(r'subregions', views.SubregionStatsViewSet)
 
 
 urlpatterns = [
     # API endpoints using the router
     path('api/', include(router.urls)),
-    
+
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+
     # Authentication URLs
     path('accounts/login/', views.login_view, name='login'),
     path('accounts/register/', views.register_view, name='register'),
@@ -1,77 +1,503 @@
-import requests
-from .models import Country
+import hashlib
+import json
 import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.db import transaction
+
+from .cache import bump_dataset_version_on_commit
+from .models import (
+    Country,
+    CountryRawData,
+    SyncState,
+    compress_document,
+    link_borders,
+    refresh_country_relations,
+)
+from .sources import iter_json_file, iter_json_fileobj, iter_ndjson_file, iter_ndjson_range, ndjson_ranges
+from .stats import refresh_region_stats_on_commit
+from .sync_client import SyncClient
 
 logger = logging.getLogger(__name__)
 
 API_URL = "https://restcountries.com/v3.1/all"
+# Per-region endpoint, and the regions fetched as partitions by a parallel sync
+REGION_URL = "https://restcountries.com/v3.1/region/{region}"
+REGIONS = ('africa', 'americas', 'antarctic', 'asia', 'europe', 'oceania')
+
+# Number of countries written per bulk statement
+BATCH_SIZE = 1000
+# Batches a partition may load ahead of the writer before its loader waits
+PARTITION_QUEUE_BATCHES = 2
+
+# Country columns rewritten when an existing row has changed upstream
+UPDATE_FIELDS = [
+    'name', 'official_name', 'cca2', 'flag', 'region', 'subregion', 'population',
+    'languages', 'timezones', 'capitals', 'currencies', 'borders', 'alt_spellings',
+    'content_hash', 'updated_at',
+]
+
+
+def compute_content_hash(country_data):
+    """Return a stable SHA-256 digest of a country record from the API"""
+    payload = json.dumps(country_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def country_fields_from_data(country_data):
+    """Map a REST Countries record onto Country model field values"""
+    return {
+        'name': country_data.get('name', {}).get('common', ''),
+        'official_name': country_data.get('name', {}).get('official', ''),
+        'cca2': country_data.get('cca2', ''),
+        'cca3': country_data.get('cca3', ''),
+        'flag': country_data.get('flags', {}).get('png', ''),
+        'region': country_data.get('region', ''),
+        'subregion': country_data.get('subregion', ''),
+        'population': country_data.get('population', 0),
+        'languages': country_data.get('languages', {}),
+        'timezones': country_data.get('timezones', []),
+        'capitals': country_data.get('capital', []),
+        'currencies': country_data.get('currencies', {}),
+        'borders': country_data.get('borders', []),
+        'alt_spellings': country_data.get('altSpellings', []),
+        'raw_data': country_data,
+    }
+
 
-def fetch_and_store_countries():
+class CountryBatchWriter:
     """
-    Fetch country data from the REST Countries API and store it in the database.
+    Upsert country records into the database in fixed-size batches.
+
+    Existing content hashes are loaded once, so unchanged countries are skipped
+    without touching their rows. New and changed countries are written with
+    bulk_create using conflict handling on cca3, and their language and currency
+    relations are rebuilt. Call finish() once every batch has been written to
+    delete countries that were not seen, link neighbours and get the counts.
     """
-    try:
-        logger.info("Fetching countries data from API...")
-        response = requests.get(API_URL)
-        response.raise_for_status()  # Raise exception for 4XX/5XX responses
-        countries_data = response.json()
-        
-        count_created = 0
-        count_updated = 0
-        
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.existing = {}
+        self.existing_regions = {}
+        for cca3, content_hash, region in Country.objects.values_list('cca3', 'content_hash', 'region'):
+            self.existing[cca3] = content_hash
+            self.existing_regions[cca3] = region
+        # Regions whose countries were created, changed, moved or removed
+        self.touched_regions = set()
+        self.seen = set()
+        self.written_borders = {}
+        self.stats = {'created': 0, 'updated': 0, 'unchanged': 0, 'removed': 0}
+
+    def write(self, countries_data):
+        """Write an iterable of country records, one batch at a time"""
+        batch = []
         for country_data in countries_data:
-            # Extract required data
-            name = country_data.get('name', {}).get('common', '')
-            official_name = country_data.get('name', {}).get('official', '')
-            cca2 = country_data.get('cca2', '')
+            batch.append(country_data)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+
+    def write_batch(self, batch):
+        """Write a single batch of country records"""
+        pending = {}
+        for country_data in batch:
             cca3 = country_data.get('cca3', '')
-            flag = country_data.get('flags', {}).get('png', '')
-            region = country_data.get('region', '')
-            subregion = country_data.get('subregion', '')
-            population = country_data.get('population', 0)
-            
-            # Extract additional data
-            languages = country_data.get('languages', {})
-            timezones = country_data.get('timezones', [])
-            capitals = country_data.get('capital', [])
-            currencies = country_data.get('currencies', {})
-            borders = country_data.get('borders', [])
-            
-            # Update or create the country
-            country, created = Country.objects.update_or_create(
-                cca3=cca3,
-                defaults={
-                    'name': name,
-                    'official_name': official_name,
-                    'cca2': cca2,
-                    'flag': flag,
-                    'region': region,
-                    'subregion': subregion,
-                    'population': population,
-                    'languages': languages,
-                    'timezones': timezones,
-                    'capitals': capitals,
-                    'currencies': currencies,
-                    'borders': borders,
-                    'raw_data': country_data,
-                }
+            if not cca3:
+                continue
+            # The last occurrence of a country wins, matching update_or_create
+            pending[cca3] = country_data
+
+        objects = []
+        for cca3, country_data in pending.items():
+            content_hash = compute_content_hash(country_data)
+            previous = self.existing.get(cca3)
+            if cca3 not in self.seen:
+                self.seen.add(cca3)
+                if previous is None:
+                    self.stats['created'] += 1
+                elif previous == content_hash:
+                    self.stats['unchanged'] += 1
+                    continue
+                else:
+                    self.stats['updated'] += 1
+            elif previous == content_hash:
+                continue
+            self.existing[cca3] = content_hash
+            country = Country(content_hash=content_hash, **country_fields_from_data(country_data))
+            self.touched_regions.update([country.region, self.existing_regions.get(cca3)])
+            objects.append(country)
+
+        if not objects:
+            return
+
+        Country.objects.bulk_create(
+            objects,
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['cca3'],
+            update_fields=UPDATE_FIELDS,
+        )
+        if any(obj.pk is None for obj in objects):
+            # Backends that cannot return ids from an upsert need one extra lookup
+            ids = dict(
+                Country.objects.filter(cca3__in=[obj.cca3 for obj in objects]).values_list('cca3', 'id')
             )
-            
-            if created:
-                count_created += 1
-            else:
-                count_updated += 1
-        
-        logger.info(f"Successfully processed countries data: {count_created} created, {count_updated} updated")
-        return {
-            'created': count_created,
-            'updated': count_updated,
-            'total': count_created + count_updated
-        }
-        
+            for obj in objects:
+                obj.pk = ids[obj.cca3]
+        self._store_raw_data(objects)
+        self._refresh_relations(objects)
+
+    def checkpoint(self):
+        """Return a copy of the counts and seen countries, to restore() if the writes since are rolled back"""
+        return (
+            dict(self.existing), set(self.seen), set(self.touched_regions), dict(self.written_borders),
+            dict(self.stats),
+        )
+
+    def restore(self, checkpoint):
+        """Go back to the state of a checkpoint()"""
+        self.existing, self.seen, self.touched_regions, self.written_borders, self.stats = checkpoint
+
+    def _store_raw_data(self, objects):
+        """Upsert the compressed upstream documents of the countries that were just written"""
+        CountryRawData.objects.bulk_create(
+            [CountryRawData(country_id=obj.pk, compressed=compress_document(obj.raw_data)) for obj in objects],
+            batch_size=self.batch_size,
+            update_conflicts=True,
+            unique_fields=['country'],
+            update_fields=['compressed'],
+        )
+
+    def _refresh_relations(self, objects):
+        """Rebuild the language and currency relations of the countries that were just written"""
+        refresh_country_relations(objects, borders=False)
+        for obj in objects:
+            self.written_borders[obj.pk] = obj.borders
+
+    def _refresh_borders(self):
+        """Link neighbours once every country of the sync exists"""
+        if self.stats['created']:
+            # Unchanged countries may border a new one, so relink everything; only differences are written
+            code_to_id = dict(Country.objects.values_list('cca3', 'id'))
+            chunk = {}
+            for country_id, borders in Country.objects.values_list('id', 'borders').iterator(chunk_size=self.batch_size):
+                chunk[country_id] = borders
+                if len(chunk) >= self.batch_size:
+                    link_borders(chunk, code_to_id)
+                    chunk = {}
+            if chunk:
+                link_borders(chunk, code_to_id)
+        else:
+            items = list(self.written_borders.items())
+            for start in range(0, len(items), self.batch_size):
+                link_borders(dict(items[start:start + self.batch_size]))
+
+    def finish(self, remove_missing=True):
+        """Optionally delete countries that were not part of this sync and return the counts"""
+        if remove_missing:
+            missing = [cca3 for cca3 in self.existing if cca3 not in self.seen]
+            self.touched_regions.update(self.existing_regions[cca3] for cca3 in missing)
+            for start in range(0, len(missing), self.batch_size):
+                chunk = missing[start:start + self.batch_size]
+                Country.objects.filter(cca3__in=chunk).delete()
+            self.stats['removed'] = len(missing)
+        self._refresh_borders()
+        stats = dict(self.stats)
+        stats['total'] = stats['created'] + stats['updated'] + stats['unchanged']
+        return stats
+
+
+def store_countries(countries_data, batch_size=BATCH_SIZE, remove_missing=True):
+    """
+    Store an iterable of REST Countries records in a single transaction.
+    Returns the created, updated, unchanged and removed counts.
+    """
+    with transaction.atomic():
+        writer = CountryBatchWriter(batch_size=batch_size)
+        writer.write(countries_data)
+        result = writer.finish(remove_missing=remove_missing)
+        _invalidate_on_commit(writer)
+        return result
+
+
+def store_partitions(partitions, workers, batch_size=BATCH_SIZE):
+    """
+    Load partitions of country records concurrently and store them in a single transaction.
+
+    partitions is an iterable of (name, load) pairs, where load() returns an
+    iterable of the records of one partition, or None when the partition is
+    unchanged and is skipped. Up to workers partitions load at a time in a
+    thread pool, and the next one is only started when one has been written.
+    Each hands its records to the writer in batches through a queue of
+    PARTITION_QUEUE_BATCHES, so a partition is never held in memory whole, and
+    the batches are written in partition order, each partition in a savepoint.
+    A partition that fails to load is logged and its batches already written
+    are rolled back, counts included; the sync then keeps countries it did not
+    see instead of removing them, as it does when a partition is skipped.
+    Returns the counts with the number of partitions, the names of the skipped
+    ones and the errors of the failed ones; raises the first error if every
+    partition failed.
+    """
+    partitions = iter(partitions)
+    errors, skipped = {}, []
+    count = 0
+    in_flight = deque()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            with transaction.atomic():
+                writer = CountryBatchWriter(batch_size=batch_size)
+                while True:
+                    for name, load in partitions:
+                        batches = queue.Queue(maxsize=PARTITION_QUEUE_BATCHES)
+                        pool.submit(_load_partition, load, batches, batch_size, stop)
+                        in_flight.append((name, batches))
+                        if len(in_flight) >= workers:
+                            break
+                    if not in_flight:
+                        break
+                    name, batches = in_flight.popleft()
+                    count += 1
+                    checkpoint = writer.checkpoint()
+                    with transaction.atomic():
+                        item = batches.get()
+                        while isinstance(item, list):
+                            writer.write_batch(item)
+                            item = batches.get()
+                        if item is not _DONE and item is not _SKIPPED:
+                            transaction.set_rollback(True)
+                    if item is _SKIPPED:
+                        skipped.append(name)
+                    elif item is not _DONE:
+                        logger.error(f"Error loading partition {name}: {str(item)}")
+                        errors[name] = item
+                        writer.restore(checkpoint)
+                if count and len(errors) == count:
+                    raise next(iter(errors.values()))
+                result = writer.finish(remove_missing=not errors and not skipped)
+                _invalidate_on_commit(writer)
+        finally:
+            # Release loaders still waiting on a full queue if the writer stopped early
+            stop.set()
+    result['partitions'] = count
+    result['skipped'] = skipped
+    result['failed'] = {name: str(error) for name, error in errors.items()}
+    return result
+
+
+# Last items a partition loader puts on its queue, after its batches of records
+_DONE = object()
+_SKIPPED = object()
+
+
+def _load_partition(load, batches, batch_size, stop):
+    """Put the records of load() on batches, batch_size at a time, then _DONE, _SKIPPED or the error raised"""
+    def put(item):
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    records = None
+    try:
+        records = load()
+        if records is None:
+            put(_SKIPPED)
+            return
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                if not put(batch):
+                    return
+                batch = []
+        if not batch or put(batch):
+            put(_DONE)
+    except Exception as e:
+        put(e)
+    finally:
+        # Close a generator left part-way through, and the download it reads
+        if hasattr(records, 'close'):
+            records.close()
+
+
+def _invalidate_on_commit(writer):
+    # bulk_create sends no signals, so invalidate derived data once committed
+    if not any(writer.stats[count] for count in ('created', 'updated', 'removed')):
+        return
+    refresh_region_stats_on_commit(writer.touched_regions)
+    bump_dataset_version_on_commit()
+
+
+def fetch_and_store_countries(url=API_URL, batch_size=BATCH_SIZE, force=False, client=None):
+    """
+    Fetch country data from the REST Countries API and store it in the database.
+
+    The request is conditional on the ETag/Last-Modified of the last successful
+    sync, and the download is skipped when upstream answers 304 or returns a
+    body identical to the last one. Pass force=True to always reprocess.
+    """
+    state = SyncState.objects.filter(source=url).first()
+    owns_client = client is None
+    client = client or SyncClient()
+    try:
+        logger.info(f"Fetching countries data from {url}...")
+        download = client.download(
+            url,
+            etag='' if force or state is None else state.etag,
+            last_modified='' if force or state is None else state.last_modified,
+        )
+        try:
+            if download.not_modified:
+                logger.info("Countries data not modified upstream, skipping sync")
+                return _skipped_result('not_modified')
+            if not force and state is not None and download.body_hash == state.body_hash:
+                logger.info("Countries payload identical to the last sync, skipping sync")
+                _save_sync_state(url, download)
+                return _skipped_result('unchanged')
+
+            with transaction.atomic():
+                result = store_countries(iter_json_fileobj(download.body), batch_size=batch_size)
+                _save_sync_state(url, download)
+        finally:
+            download.close()
+
+        result['status'] = 'synced'
+        _log_result(result)
+        return result
+
     except requests.RequestException as e:
         logger.error(f"Error fetching countries data: {str(e)}")
         raise
     except Exception as e:
         logger.error(f"Error processing countries data: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        if owns_client:
+            client.close()
+
+
+def fetch_and_store_regions(regions=REGIONS, url_template=REGION_URL, workers=4, batch_size=BATCH_SIZE,
+                            force=False, client=None):
+    """
+    Fetch every region endpoint as its own partition, in parallel, and store the countries.
+
+    Downloads and parsing overlap in a pool of workers threads, so the sync
+    takes about as long as the slowest region instead of the sum of all of
+    them. Each region is requested conditionally on the ETag/Last-Modified of
+    its own last sync and skipped when upstream answers 304 or returns the
+    same body. Countries missing from the changed regions are then kept, so
+    pass force=True to reload every region and remove them.
+    """
+    urls = {region: url_template.format(region=region) for region in regions}
+    states = {} if force else {state.source: state for state in SyncState.objects.filter(source__in=urls.values())}
+    downloads = {}
+    owns_client = client is None
+    client = client or SyncClient(pool_size=max(workers, 10))
+
+    def partition(region):
+        url = urls[region]
+        state = states.get(url)
+
+        def load():
+            download = client.download(
+                url,
+                etag='' if state is None else state.etag,
+                last_modified='' if state is None else state.last_modified,
+            )
+            downloads[region] = download
+            if download.not_modified or (state is not None and download.body_hash == state.body_hash):
+                download.close()
+                return None
+            return _download_records(download)
+
+        return region, load
+
+    try:
+        logger.info(f"Fetching countries data from {len(regions)} regions with {workers} workers...")
+        with transaction.atomic():
+            result = store_partitions((partition(region) for region in regions), workers, batch_size=batch_size)
+            for region, download in downloads.items():
+                if region not in result['failed']:
+                    _save_sync_state(urls[region], download)
+        if result['skipped'] and len(result['skipped']) == result['partitions']:
+            logger.info("Region data not modified upstream, skipping sync")
+            return dict(result, status='not_modified')
+        result['status'] = 'synced'
+        _log_result(result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Error processing countries data: {str(e)}")
+        raise
+    finally:
+        if owns_client:
+            client.close()
+
+
+def _download_records(download):
+    """Yield the records of a downloaded JSON array, closing the download afterwards"""
+    try:
+        yield from iter_json_fileobj(download.body)
+    finally:
+        download.close()
+
+
+def _save_sync_state(url, download):
+    SyncState.objects.update_or_create(
+        source=url,
+        defaults={
+            'etag': download.etag,
+            'last_modified': download.last_modified,
+            'body_hash': download.body_hash,
+        },
+    )
+
+
+def _skipped_result(status):
+    return {'status': status, 'created': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'total': 0}
+
+
+def load_countries_from_file(path, ndjson=False, batch_size=BATCH_SIZE, workers=1):
+    """
+    Store country data from a local JSON array or NDJSON dump in the database.
+    With several workers, an NDJSON dump is split into line-aligned chunks that
+    are parsed in parallel.
+    """
+    if workers > 1 and not ndjson:
+        raise ValueError("Parallel loading needs an NDJSON file")
+    try:
+        logger.info(f"Loading countries data from {path}...")
+        if workers > 1:
+            partitions = [
+                (f"{start}-{end}", lambda start=start, end=end: iter_ndjson_range(path, start, end))
+                for start, end in ndjson_ranges(path, workers)
+            ]
+            result = store_partitions(partitions, workers, batch_size=batch_size)
+        else:
+            records = iter_ndjson_file(path) if ndjson else iter_json_file(path)
+            result = store_countries(records, batch_size=batch_size)
+        result['status'] = 'synced'
+        _log_result(result)
+        return result
+
+    except Exception as e:
+        logger.error(f"Error processing countries data: {str(e)}")
+        raise
+
+
+def _log_result(result):
+    logger.info(
+        f"Successfully processed countries data: {result['created']} created, "
+        f"{result['updated']} updated, {result['unchanged']} unchanged, {result['removed']} removed"
+    )
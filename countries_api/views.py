@@ -4,27 +4,143 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.views import LogoutView
 from django.contrib.messages.views import SuccessMessageMixin
+from django.conf import settings
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
 
-from rest_framework import filters, viewsets
+from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 
-from .models import Country
+from .autocomplete import DEFAULT_LIMIT, MAX_LIMIT, get_autocomplete_index
+from .cache import CachedResponseMixin
+from .catalog import active_catalog
+from .conditional import dataset_condition
+from .export import CSVRenderer, NDJSONRenderer, csv_stream, export_rows, ndjson_stream, parse_fields
+from .graph import MAX_DEPTH, get_graph
+from .metrics import phase
+from .models import Country, CountryName, RegionStats, SubregionStats
+from .pagination import CountryPagination, InvalidCursor, cursor_mode, keyset_page, wants_count
+from .search import RankedSearchFilter, search_countries, wants_fuzzy
 from .serializers import (
+    LANG_PARAM,
     CountryCreateUpdateSerializer,
     CountryListSerializer,
     CountrySerializer,
+    RegionStatsSerializer,
+    SubregionStatsSerializer,
+    add_localized_names,
+    country_list_values,
 )
 
 
-class CountryViewSet(viewsets.ModelViewSet):
+def _wants_json(request):
+    """Return True when the client asked for JSON instead of the HTML page"""
+    if request.query_params.get('format') == 'json':
+        return True
+    return 'application/json' in request.META.get('HTTP_ACCEPT', '')
+
+
+def _graph_node_id(graph, pk):
+    """Return the graph node of a country id from the URL, or raise Http404"""
+    try:
+        country_id = int(pk)
+    except (TypeError, ValueError):
+        raise Http404
+    if country_id not in graph:
+        raise Http404
+    return country_id
+
+
+def _catalog_country(catalog, pk):
+    """Return the catalog record of a country id from the URL, or raise Http404"""
+    country = catalog.get(pk)
+    if country is None:
+        raise Http404('No Country matches the given query.')
+    return country
+
+
+def _list_data(countries, catalog):
+    """Return the list representation of catalog records, or of a queryset when the catalog is off"""
+    if catalog is None:
+        return list(country_list_values(countries))
+    return [country.list_data() for country in countries]
+
+
+def _with_display_names(countries, language):
+    """Pair countries with their name in a language, or their own name when there is none or no language"""
+    countries = list(countries)
+    names = CountryName.localized([country.id for country in countries], language) if language else {}
+    return [(country, names.get(country.id, country.name)) for country in countries]
+
+
+class LocalizedNameMixin:
+    """Add each country's localized_name to list and retrieve responses when ?lang= names a language"""
+    
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        language = request.query_params.get(LANG_PARAM, '').strip()
+        if language and response.status_code == 200:
+            add_localized_names(response.data['results'], language)
+        return response
+    
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        language = request.query_params.get(LANG_PARAM, '').strip()
+        if language and response.status_code == 200:
+            add_localized_names([response.data], language)
+        return response
+
+
+class FastListMixin:
+    """List from values() rows instead of model instances run through CountryListSerializer"""
+    
+    def list(self, request, *args, **kwargs):
+        queryset = country_list_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(list(page))
+        return Response(list(queryset))
+
+
+class CatalogReadMixin:
+    """Answer list and retrieve from the country catalog, unless it is off or the list is searched"""
+    
+    def list(self, request, *args, **kwargs):
+        catalog = active_catalog()
+        if catalog is None or request.query_params.get(RankedSearchFilter.search_param):
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(catalog)
+        with phase('serialize'):
+            data = [country.list_data() for country in page]
+        return self.get_paginated_response(data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        catalog = active_catalog()
+        if catalog is None:
+            return super().retrieve(request, *args, **kwargs)
+        country = _catalog_country(catalog, kwargs[self.lookup_field])
+        with phase('serialize'):
+            return Response(country.detail_data())
+
+
+class CountryViewSet(CachedResponseMixin, LocalizedNameMixin, CatalogReadMixin, FastListMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     queryset = Country.objects.all()
-    filter_backends = [filters.SearchFilter]
-    search_fields = ['name', 'official_name', 'cca2', 'cca3', 'region', 'subregion']
+    filter_backends = [RankedSearchFilter]
+    pagination_class = CountryPagination
+    # Fields of the search index (countries_api.search) that ?search= matches
+    search_fields = ['codes', 'name', 'official_name', 'alt_spellings', 'translations', 'region', 'subregion']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('spoken_languages', 'used_currencies', 'neighbours')
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -33,12 +149,26 @@ class CountryViewSet(viewsets.ModelViewSet):
             return CountryCreateUpdateSerializer
         return CountrySerializer
     
+    @method_decorator(dataset_condition)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @method_decorator(dataset_condition)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     @action(detail=True, methods=['get'])
+    @method_decorator(dataset_condition)
     def same_region(self, request, pk=None):
-        country = self.get_object()
-        same_region_countries = Country.objects.filter(
-            region=country.region
-        ).exclude(id=country.id)
+        catalog = active_catalog()
+        if catalog is None:
+            country = self.get_object()
+            same_region_countries = Country.objects.filter(
+                region=country.region
+            ).exclude(id=country.id)
+        else:
+            country = _catalog_country(catalog, pk)
+            same_region_countries = [other for other in catalog.in_region(country.region) if other is not country]
         
         # Pass data to template
         return render(request, 'countries/same_region.html', {
@@ -47,17 +177,24 @@ class CountryViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    @method_decorator(dataset_condition)
     def by_language(self, request):
-        language = request.query_params.get('language', None)
+        language = request.query_params.get('language', '').strip()
         error = None
         countries = []
         
+        catalog = active_catalog()
         if not language:
             error = "Language parameter is required"
+        elif catalog is not None:
+            countries = catalog.speaking(language)
         else:
-            for country in Country.objects.all():
-                if language.lower() in map(str.lower, country.languages.values()):
-                    countries.append(country)
+            countries = Country.get_countries_by_language(language)
+        
+        if _wants_json(request):
+            if error:
+                return Response({'error': error}, status=400)
+            return Response({'language': language, 'results': _list_data(countries, catalog)})
         
         return render(request, 'countries/by_language.html', {
             'language': language,
@@ -66,6 +203,32 @@ class CountryViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'])
+    def by_currency(self, request):
+        currency = request.query_params.get('currency', '').strip()
+        error = None
+        countries = []
+        
+        catalog = active_catalog()
+        if not currency:
+            error = "Currency parameter is required"
+        elif catalog is not None:
+            countries = catalog.using(currency)
+        else:
+            countries = Country.get_countries_by_currency(currency)
+        
+        if _wants_json(request):
+            if error:
+                return Response({'error': error}, status=400)
+            return Response({'currency': currency, 'results': _list_data(countries, catalog)})
+        
+        return render(request, 'countries/by_currency.html', {
+            'currency': currency,
+            'countries': countries,
+            'error': error
+        })
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(dataset_condition)
     def search(self, request):
         query = request.query_params.get('q', '')
         error = None
@@ -74,46 +237,202 @@ class CountryViewSet(viewsets.ModelViewSet):
         if not query:
             error = "Search query parameter 'q' is required"
         else:
-            countries = Country.objects.filter(
-                Q(name__icontains=query) | 
-                Q(official_name__icontains=query)
-            )
+            countries = search_countries(query, fuzzy=wants_fuzzy(request.query_params))
         
+        language = request.query_params.get(LANG_PARAM, '').strip()
         return render(request, 'countries/search_results.html', {
             'query': query,
             'countries': countries,
+            'rows': _with_display_names(countries, language),
             'error': error
         })
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(dataset_condition)
+    def autocomplete(self, request):
+        """Countries whose name, code or a native or translated name starts with ?q=, most populous first"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': "Search query parameter 'q' is required"}, status=400)
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_LIMIT:
+            return Response({'error': f"limit must be an integer between 1 and {MAX_LIMIT}"}, status=400)
+        
+        # Suggestions are shared between requests, so localize copies
+        results = [dict(result) for result in get_autocomplete_index().suggest(query, limit)]
+        language = request.query_params.get(LANG_PARAM, '').strip()
+        if language:
+            add_localized_names(results, language)
+        response = Response({'query': query, 'results': results})
+        # Typeahead repeats the same prefixes; let the browser reuse answers for a while
+        patch_cache_control(response, private=True, max_age=settings.COUNTRIES_AUTOCOMPLETE_MAX_AGE)
+        return response
+    
+    @action(detail=False, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    @method_decorator(dataset_condition)
+    def export(self, request):
+        """Stream every matching country as NDJSON, or as CSV with ?format=csv, in one response"""
+        params = request.query_params
+        try:
+            fields = parse_fields(params.get('fields'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        if params.get('region'):
+            queryset = queryset.filter(region__iexact=params['region'])
+        if params.get('subregion'):
+            queryset = queryset.filter(subregion__iexact=params['subregion'])
+        if params.get('language'):
+            queryset = queryset.filter(id__in=Country.get_countries_by_language(params['language']).values('id'))
+        if params.get('currency'):
+            queryset = queryset.filter(id__in=Country.get_countries_by_currency(params['currency']).values('id'))
+        
+        rows = export_rows(queryset, fields)
+        renderer = request.accepted_renderer
+        stream = csv_stream(rows, fields) if renderer.format == 'csv' else ndjson_stream(rows, fields)
+        response = StreamingHttpResponse(stream, content_type=f"{renderer.media_type}; charset=utf-8")
+        response['Content-Disposition'] = f'attachment; filename="countries.{renderer.format}"'
+        return response
+    
+    @action(detail=True, methods=['get'])
+    @method_decorator(dataset_condition)
+    def neighbours(self, request, pk=None):
+        """Countries reachable within ?depth= land border crossings (default 1)"""
+        graph = get_graph()
+        country_id = _graph_node_id(graph, pk)
+        try:
+            depth = int(request.query_params.get('depth', 1))
+        except ValueError:
+            depth = 0
+        if not 1 <= depth <= MAX_DEPTH:
+            return Response({'error': f"depth must be an integer between 1 and {MAX_DEPTH}"}, status=400)
+        
+        distances = graph.neighbours(country_id, depth)
+        results = sorted(distances, key=lambda node: (distances[node], graph.nodes[node]['name']))
+        return Response({
+            'country': graph.nodes[country_id],
+            'depth': depth,
+            'results': [dict(graph.nodes[node], distance=distances[node]) for node in results],
+        })
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(dataset_condition)
+    def path(self, request):
+        """Route with the fewest land border crossings between ?from= and ?to= (cca3 codes)"""
+        source = request.query_params.get('from', '').strip().upper()
+        target = request.query_params.get('to', '').strip().upper()
+        if not source or not target:
+            return Response({'error': "Parameters 'from' and 'to' are required"}, status=400)
+        
+        graph = get_graph()
+        unknown = [code for code in (source, target) if code not in graph.ids_by_code]
+        if unknown:
+            return Response({'error': f"Unknown country code(s): {', '.join(unknown)}"}, status=404)
+        
+        route = graph.path(graph.ids_by_code[source], graph.ids_by_code[target])
+        if route is None:
+            return Response({'from': source, 'to': target, 'crossings': None, 'path': []})
+        return Response({
+            'from': source,
+            'to': target,
+            'crossings': len(route) - 1,
+            'path': [graph.nodes[node] for node in route],
+        })
+    
+    @action(detail=False, methods=['get'])
+    @method_decorator(dataset_condition)
+    def components(self, request):
+        """Landmasses connected by land borders, largest first (?min_size= filters islands out)"""
+        try:
+            min_size = int(request.query_params.get('min_size', 1))
+        except ValueError:
+            return Response({'error': "min_size must be an integer"}, status=400)
+        
+        graph = get_graph()
+        components = [component for component in graph.components if len(component) >= min_size]
+        return Response({
+            'count': len(components),
+            'results': [
+                {'size': len(component), 'countries': [graph.nodes[node] for node in component]}
+                for component in components
+            ],
+        })
+
+
+
+class RegionStatsViewSet(viewsets.ReadOnlyModelViewSet):
+    """Precomputed per-region figures, read from the summary table without aggregating countries"""
+    permission_classes = [IsAuthenticated]
+    queryset = RegionStats.objects.all()
+    serializer_class = RegionStatsSerializer
+    pagination_class = None
+    lookup_field = 'region'
+    lookup_value_regex = '[^/]+'
+
+
+class SubregionStatsViewSet(viewsets.ReadOnlyModelViewSet):
+    """Precomputed per-subregion figures, optionally filtered with ?region="""
+    permission_classes = [IsAuthenticated]
+    queryset = SubregionStats.objects.all()
+    serializer_class = SubregionStatsSerializer
+    pagination_class = None
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        region = self.request.query_params.get('region')
+        if region:
+            queryset = queryset.filter(region=region)
+        return queryset
 
 
 @login_required
 def country_list_view(request):
     search_query = request.GET.get('q', '')
+    fuzzy = wants_fuzzy(request.GET)
+    language = request.GET.get(LANG_PARAM, '').strip()
 
     if search_query:
-        countries = Country.objects.filter(
-            Q(name__icontains=search_query) | 
-            Q(official_name__icontains=search_query)
-        )
+        countries = search_countries(search_query, fuzzy=fuzzy)
     else:
-        countries = Country.objects.all()
+        countries = active_catalog()
+        if countries is None:
+            countries = Country.objects.all()
 
-    # Add pagination with 10 objects per page
-    paginator = Paginator(countries, 10)  
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if not search_query and cursor_mode(request.GET):
+        # Keyset pagination: every page costs the same, however deep
+        try:
+            page_obj = keyset_page(countries, request.GET.get('cursor'), 10, with_count=wants_count(request.GET))
+        except InvalidCursor:
+            page_obj = keyset_page(countries, None, 10, with_count=wants_count(request.GET))
+    else:
+        # Add pagination with 10 objects per page
+        paginator = Paginator(countries, 10)  
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
 
     return render(request, 'countries/country_list.html', {
         'search_query': search_query,
-        'countries': page_obj  
+        'fuzzy': fuzzy,
+        'lang': language,
+        'countries': page_obj,
+        'rows': _with_display_names(page_obj, language),
     })
 
 
 @login_required
+@dataset_condition
 def country_detail_view(request, country_id):
-    country = get_object_or_404(Country, id=country_id)
-
-    same_region_countries = Country.objects.filter(region=country.region).exclude(id=country.id)
+    catalog = active_catalog()
+    if catalog is None:
+        country = get_object_or_404(Country, id=country_id)
+        same_region_countries = Country.objects.filter(region=country.region).exclude(id=country.id)
+    else:
+        country = _catalog_country(catalog, country_id)
+        same_region_countries = [other for other in catalog.in_region(country.region) if other is not country]
 
     return render(request, 'countries/country_detail.html', {
         'country': country,
@@ -31,11 +31,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'countries_api.metrics.MetricsMiddleware',
+    'countries_api.cache.DatasetStateMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'countries_api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -44,7 +47,7 @@ ROOT_URLCONF = 'countries_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'countries_api.metrics.TimedTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -83,6 +86,55 @@ DATABASES = {
     }
 }
 
+# Cache
+# COUNTRIES_CACHE_BACKEND selects where API responses are cached: 'locmem' (per
+# process), or 'file' / 'redis' to share them between workers. The dataset version
+# they are keyed on is kept in the database, so every process sees each write.
+
+COUNTRIES_CACHE_BACKEND = os.environ.get('COUNTRIES_CACHE_BACKEND', 'locmem')
+
+COUNTRIES_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'countries',
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('COUNTRIES_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'countries')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('COUNTRIES_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'),
+    },
+}
+
+# Where the session cache of each backend lives, apart from the response cache so that
+# its churn never culls or evicts sessions
+COUNTRIES_SESSION_CACHE_LOCATIONS = {
+    'locmem': 'sessions',
+    'file': os.path.join(BASE_DIR, '.cache', 'sessions'),
+    'redis': 'redis://127.0.0.1:6379/2',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'countries': COUNTRIES_CACHE_BACKENDS[COUNTRIES_CACHE_BACKEND],
+    'sessions': {
+        **COUNTRIES_CACHE_BACKENDS[COUNTRIES_CACHE_BACKEND],
+        'LOCATION': os.environ.get(
+            'COUNTRIES_SESSION_CACHE_LOCATION', COUNTRIES_SESSION_CACHE_LOCATIONS[COUNTRIES_CACHE_BACKEND]
+        ),
+    },
+}
+
+COUNTRIES_CACHE_ALIAS = 'countries'
+COUNTRIES_CACHE_TIMEOUT = 300  # seconds
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -126,12 +178,19 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# API clients authenticate with `Authorization: Token <key>` (keys are issued by the
+# api_token command). A token's user is cached in process for COUNTRIES_TOKEN_CACHE_TTL
+# seconds. BasicAuthentication hashes the password on every request; set
+# COUNTRIES_BASIC_AUTH=false to turn it off.
+COUNTRIES_TOKEN_CACHE_TTL = int(os.environ.get('COUNTRIES_TOKEN_CACHE_TTL', '60'))
+COUNTRIES_BASIC_AUTH = os.environ.get('COUNTRIES_BASIC_AUTH', 'true').lower() in ('1', 'true', 'yes')
+
 # Rest Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-    ],
+        'countries_api.authentication.APITokenAuthentication',
+    ] + (['rest_framework.authentication.BasicAuthentication'] if COUNTRIES_BASIC_AUTH else []),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
@@ -139,6 +198,33 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,  
 }
 
+# Serve country detail, same-region, list and language/currency lookups from an in-process
+# snapshot of all countries (countries_api.catalog) instead of the database.
+COUNTRIES_CATALOG = os.environ.get('COUNTRIES_CATALOG', 'true').lower() in ('1', 'true', 'yes')
+
+# File the fetch_countries command writes the catalog to, and that workers memory-map
+# instead of each building the catalog from the database (countries_api.snapshot).
+# Empty to disable.
+COUNTRIES_SNAPSHOT_PATH = os.environ.get('COUNTRIES_SNAPSHOT_PATH', '')
+
+# Seconds browsers may reuse an autocomplete answer without revalidating it
+COUNTRIES_AUTOCOMPLETE_MAX_AGE = int(os.environ.get('COUNTRIES_AUTOCOMPLETE_MAX_AGE', '60'))
+
+# 'page' for page numbers, or 'cursor' for keyset pagination of the country list
+# (also selectable per request with ?pagination=cursor)
+COUNTRIES_PAGINATION = os.environ.get('COUNTRIES_PAGINATION', 'page')
+
+# Request metrics served at /metrics in the Prometheus text format. Scrapers present
+# COUNTRIES_METRICS_TOKEN as a bearer token; without one, only staff users may read them.
+COUNTRIES_METRICS = os.environ.get('COUNTRIES_METRICS', 'true').lower() in ('1', 'true', 'yes')
+COUNTRIES_METRICS_TOKEN = os.environ.get('COUNTRIES_METRICS_TOKEN', '')
+
+# Staff users profile a request by sending `X-Profile: 1` or adding `?_profile=1`.
+# COUNTRIES_PROFILE_SAMPLE_RATE also profiles one request in every N (0 turns sampling off);
+# only the latest COUNTRIES_PROFILE_KEEP profiles are kept.
+COUNTRIES_PROFILE_SAMPLE_RATE = int(os.environ.get('COUNTRIES_PROFILE_SAMPLE_RATE', '0'))
+COUNTRIES_PROFILE_KEEP = int(os.environ.get('COUNTRIES_PROFILE_KEEP', '500'))
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'country_list'
 LOGOUT_REDIRECT_URL = 'login'
@@ -152,6 +238,14 @@ MESSAGE_TAGS = {
 }
 
 # Session security settings
+# COUNTRIES_SESSION_ENGINE selects where sessions live: 'db', 'cached_db' (read from the
+# sessions cache, written through to the database), 'cache' (sessions cache only) or
+# 'signed_cookies' (in the cookie itself, no server-side lookup). Use the cache engines
+# with a shared COUNTRIES_CACHE_BACKEND, so a logout is seen by every worker.
+COUNTRIES_SESSION_ENGINE = os.environ.get('COUNTRIES_SESSION_ENGINE', 'db')
+SESSION_ENGINE = f"django.contrib.sessions.backends.{COUNTRIES_SESSION_ENGINE}"
+SESSION_CACHE_ALIAS = 'sessions'
+
 SESSION_COOKIE_SECURE = True  
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_AGE = 3600  # 1 hour in seconds